@@ -0,0 +1,74 @@
+"""Benchmark grouping the rows of one-to-many batch queries by key
+
+Compares the previous grouping of processing results and merging statistics,
+a dict built from itertools.groupby, with grouping.group_rows, over synthetic
+result sets in key order and shuffled (as MySQL may return them without an
+ORDER BY). For shuffled rows the previous grouping also drops rows, as each
+run of a key replaces the group of its previous run; the number of rows lost
+is reported.
+
+    python benchmarks/bench_grouping.py [--rows N] [--keys N] [--repeat N]
+"""
+
+from __future__ import annotations
+
+import argparse
+import collections
+import itertools
+import random
+import statistics
+import time
+
+from ispyb_graphql.grouping import group_rows
+
+Row = collections.namedtuple("Row", ["autoProcId", "scalingStatisticsType", "value"])
+
+
+def groupby_dict(keys, rows) -> list[tuple]:
+    grouped = {k: tuple(g) for k, g in itertools.groupby(rows, lambda r: r.autoProcId)}
+    return [grouped.get(key, ()) for key in keys]
+
+
+def single_pass(keys, rows) -> list[tuple]:
+    return group_rows(keys, rows, "autoProcId")
+
+
+def synthetic_rows(n_rows: int, n_keys: int) -> list[Row]:
+    return [
+        Row(i % n_keys + 1, ("overall", "innerShell", "outerShell")[i % 3], i)
+        for i in range(n_rows)
+    ]
+
+
+def measure(group, keys, rows, repeat: int) -> tuple[float, int]:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        groups = group(keys, rows)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings), sum(len(g) for g in groups)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--keys", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    keys = list(range(1, args.keys + 1))
+    ordered = sorted(synthetic_rows(args.rows, args.keys), key=lambda r: r.autoProcId)
+    shuffled = ordered[:]
+    random.Random(0).shuffle(shuffled)
+    print(f"{args.rows} rows over {args.keys} keys, median of {args.repeat}")
+    for order, rows in (("ordered", ordered), ("shuffled", shuffled)):
+        for name, group in (("groupby", groupby_dict), ("single-pass", single_pass)):
+            elapsed, grouped = measure(group, keys, rows, args.repeat)
+            print(
+                f"{order:<9} {name:<12} {elapsed * 1000:8.1f} ms "
+                f"{len(rows) - grouped:8d} rows lost"
+            )
+
+
+if __name__ == "__main__":
+    main()
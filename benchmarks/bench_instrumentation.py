@@ -0,0 +1,87 @@
+"""Benchmark the overhead of instrumenting query functions
+
+Times a query function that does no work, called undecorated, with the
+print() of its keys that crud used to trace queries (to /dev/null), and
+decorated with instrumentation.instrumented() with sampled logging off, at
+1% and at 100% (to a handler that discards records), reporting the time per
+call over that of the undecorated function.
+
+    python benchmarks/bench_instrumentation.py [--keys N] [--calls N] [--repeat N]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import sys
+import time
+
+from ispyb_graphql import instrumentation
+
+
+async def get_things(db, ids: list[int], columns=()) -> list:
+    return ids
+
+
+async def get_things_printed(db, ids: list[int], columns=()) -> list:
+    print(f"Getting things for {ids=}")
+    return ids
+
+
+get_things_instrumented = instrumentation.instrumented(batch="ids")(get_things)
+
+
+async def measure(query, ids, calls: int, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(calls):
+            await query(None, ids)
+        timings.append((time.perf_counter() - start) / calls)
+    return statistics.median(timings)
+
+
+async def run(args):
+    ids = list(range(1000000, 1000000 + args.keys))
+    logger = logging.getLogger("ispyb_graphql.queries")
+    logger.addHandler(logging.NullHandler())
+    logger.propagate = False
+    logger.setLevel(logging.DEBUG)
+
+    variants = [
+        ("print", get_things_printed, None),
+        ("instrumented", get_things_instrumented, 0),
+        ("sampled 1%", get_things_instrumented, 0.01),
+        ("sampled 100%", get_things_instrumented, 1),
+    ]
+    baseline = await measure(get_things, ids, args.calls, args.repeat)
+    print(f"{args.keys} keys, median of {args.repeat} x {args.calls} calls")
+    print(f"{'undecorated':<13} {baseline * 1e6:8.2f} us/call")
+    stdout = sys.stdout
+    for name, query, rate in variants:
+        instrumentation.set_log_sample_rate(rate)
+        with open(os.devnull, "w") as devnull:
+            sys.stdout = devnull
+            try:
+                elapsed = await measure(query, ids, args.calls, args.repeat)
+            finally:
+                sys.stdout = stdout
+        print(
+            f"{name:<13} {elapsed * 1e6:8.2f} us/call "
+            f"{(elapsed - baseline) * 1e6:+8.2f} us overhead"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--keys", type=int, default=100)
+    parser.add_argument("--calls", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""Benchmark reading pages of rows as ORM entities versus Core column rows
+
+Compares the previous read path for samples, containers and visits, which
+selected full ORM entities and copied a few attributes into the strawberry
+types, with selecting only the needed columns (crud.*_COLUMNS). Both run
+against an in-memory SQLite copy of the ISPyB tables, so the timings isolate
+row hydration rather than network or server time.
+
+    python benchmarks/bench_orm_vs_core.py [--rows N] [--repeat N]
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime
+import statistics
+import time
+import tracemalloc
+
+from sqlalchemy import Column, MetaData, Table, create_engine, insert, select
+from sqlalchemy.orm import Session, joinedload
+
+from ispyb_graphql import crud, models
+from ispyb_graphql.api.definitions import Container, Sample, Visit
+
+
+def sqlite_copy(metadata: MetaData, table: Table) -> Table:
+    """Copy a table with the MySQL-specific column types made generic"""
+    columns = []
+    for column in table.columns:
+        try:
+            type_ = column.type.as_generic()
+        except NotImplementedError:
+            type_ = None
+        columns.append(Column(column.name, type_, primary_key=column.primary_key))
+    return Table(table.name, metadata, *columns)
+
+
+def populate(engine, n: int) -> None:
+    metadata = MetaData()
+    tables = {
+        model: sqlite_copy(metadata, model.__table__)
+        for model in (
+            models.BLSample,
+            models.Container,
+            models.BLSession,
+            models.Proposal,
+        )
+    }
+    metadata.create_all(engine)
+    start = datetime.datetime(2021, 1, 1)
+    with engine.begin() as conn:
+        conn.execute(
+            insert(tables[models.Proposal]),
+            [
+                {"proposalId": i, "proposalCode": "cm", "proposalNumber": i}
+                for i in range(1, n // 100 + 2)
+            ],
+        )
+        conn.execute(
+            insert(tables[models.BLSession]),
+            [
+                {
+                    "sessionId": i,
+                    "proposalId": i // 100 + 1,
+                    "visit_number": i % 100,
+                    "beamLineName": "i03",
+                    "startDate": start + datetime.timedelta(hours=i),
+                    "endDate": start + datetime.timedelta(hours=i + 1),
+                }
+                for i in range(1, n + 1)
+            ],
+        )
+        conn.execute(
+            insert(tables[models.BLSample]),
+            [
+                {"blSampleId": i, "name": f"x{i}", "crystalId": i, "containerId": i}
+                for i in range(1, n + 1)
+            ],
+        )
+        conn.execute(
+            insert(tables[models.Container]),
+            [
+                {
+                    "containerId": i,
+                    "capacity": 16,
+                    "barcode": f"DLS-{i}",
+                    "code": f"puck{i}",
+                    "containerType": "Puck",
+                }
+                for i in range(1, n + 1)
+            ],
+        )
+
+
+def orm_visit(blsession: models.BLSession) -> Visit:
+    proposal = blsession.Proposal
+    return Visit(
+        session_id=blsession.sessionId,
+        name=f"{proposal.proposalCode}{proposal.proposalNumber}-{blsession.visit_number}",
+        start_time=blsession.startDate,
+        end_time=blsession.endDate,
+    )
+
+
+CASES = {
+    "samples": (
+        lambda s: s.execute(select(models.BLSample)).scalars().all(),
+        Sample.from_instance,
+        lambda s: s.execute(select(*crud.SAMPLE_COLUMNS)).all(),
+        Sample.from_instance,
+    ),
+    "containers": (
+        lambda s: s.execute(select(models.Container)).scalars().all(),
+        Container.from_instance,
+        lambda s: s.execute(select(*crud.CONTAINER_COLUMNS)).all(),
+        Container.from_instance,
+    ),
+    "visits": (
+        lambda s: s.execute(
+            select(models.BLSession).options(joinedload(models.BLSession.Proposal))
+        )
+        .scalars()
+        .all(),
+        orm_visit,
+        lambda s: s.execute(
+            select(*crud.BLSESSION_COLUMNS).join(
+                models.Proposal,
+                models.Proposal.proposalId == models.BLSession.proposalId,
+            )
+        ).all(),
+        Visit.from_instance,
+    ),
+}
+
+
+def read_page(engine, fetch, transform) -> list:
+    with Session(engine) as session:
+        return [transform(row) for row in fetch(session)]
+
+
+def measure(engine, fetch, transform, repeat: int) -> tuple[float, int]:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        read_page(engine, fetch, transform)
+        timings.append(time.perf_counter() - start)
+    tracemalloc.start()
+    read_page(engine, fetch, transform)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return statistics.median(timings), peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    engine = create_engine("sqlite://")
+    populate(engine, args.rows)
+    print(f"{args.rows} rows per page, median of {args.repeat}")
+    for name, (orm_fetch, orm_transform, core_fetch, core_transform) in CASES.items():
+        for path, fetch, transform in (
+            ("orm", orm_fetch, orm_transform),
+            ("core", core_fetch, core_transform),
+        ):
+            elapsed, peak = measure(engine, fetch, transform, args.repeat)
+            print(
+                f"{name:<11} {path:<5} {elapsed * 1000:8.1f} ms "
+                f"{peak / 1024 / 1024:8.1f} MiB peak"
+            )
+
+
+if __name__ == "__main__":
+    main()
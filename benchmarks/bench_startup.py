@@ -0,0 +1,71 @@
+"""Benchmark import and application startup time
+
+Each measurement runs in a fresh interpreter, as a newly forked worker or a
+command line tool would. Importing the schema should need neither database
+credentials nor a connection; application startup creates the engine (but
+does not connect) from the credentials file given by ISPYB_CREDENTIALS.
+
+    python benchmarks/bench_startup.py [--repeat N]
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+SNIPPETS = {
+    "import schema": "import ispyb_graphql.api.schema",
+    "import app": "import ispyb_graphql.main",
+    "app startup": (
+        "import asyncio, ispyb_graphql.main as m;" "asyncio.run(m.app.router.startup())"
+    ),
+}
+
+CREDENTIALS = """\
+[ispyb_sqlalchemy]
+username = user
+password = password
+host = localhost
+port = 3306
+database = ispyb
+"""
+
+
+def time_snippet(code: str, env: dict[str, str]) -> float:
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", code], env=env, check=True)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.NamedTemporaryFile("w", suffix=".cfg") as credentials:
+        credentials.write(CREDENTIALS)
+        credentials.flush()
+        env = dict(os.environ)
+        env.pop("ISPYB_CREDENTIALS", None)
+        env.setdefault("CAS_SERVER_URL", "https://cas.example.com/cas")
+        baseline = statistics.median(
+            time_snippet("pass", env) for _ in range(args.repeat)
+        )
+        print(f"{'interpreter':<16} {baseline * 1000:8.1f} ms")
+        for name, code in SNIPPETS.items():
+            if name == "app startup":
+                env["ISPYB_CREDENTIALS"] = credentials.name
+            timings = [time_snippet(code, env) for _ in range(args.repeat)]
+            print(
+                f"{name:<16} {statistics.median(timings) * 1000:8.1f} ms "
+                f"(+{(statistics.median(timings) - baseline) * 1000:.1f} ms)"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -15,13 +15,14 @@ setup(
         "fastapi",
         "ispyb",
         "itsdangerous",
+        "prometheus-client",
         "python-cas",
         "sqlalchemy[asyncio]",
         "starlette-prometheus",
         "strawberry-graphql[fastapi]",
         "uvicorn[standard]",
     ],
-    # extras_require={'plotting': ['matplotlib>=2.2.0', 'jupyter']},
+    extras_require={"arrow": ["pyarrow"], "opentelemetry": ["opentelemetry-api"]},
     setup_requires=["isort", "black", "flake8", "pre-commit"],
     test_requires=["pytest"],
     entry_points={},
@@ -0,0 +1,123 @@
+"""What each logged-in user may see, for authorization without queries
+
+A user's AccessIndex holds the proposals and sessions they are on, and the
+types of beamline they administer, so that permission checks are set lookups.
+The index is built when the user logs in, and rebuilt on the first request
+after it is older than the refresh interval, or after it was invalidated
+(e.g. on logout). Indexes are held in memory for the most recently active
+users; a user whose index was evicted, or who logged in on another worker,
+has theirs built on their next request.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import dataclasses
+import sys
+import time
+from typing import Callable, Optional
+
+from sqlalchemy.orm import Session
+
+from ispyb_graphql import config, crud, database
+from ispyb_graphql.cache import TTLCache
+
+
+@dataclasses.dataclass(frozen=True)
+class AccessIndex:
+    # (proposal code, number) of the proposals the user is on
+    proposals: frozenset[tuple[str, int]]
+    # (proposal code, number, visit number) of the sessions the user is on
+    sessions: frozenset[tuple[str, int, int]]
+    # Types of beamline (see crud.BL_TYPES) the user administers
+    admin_types: frozenset[str]
+
+    def is_on_proposal(self, proposal: tuple[str, int]) -> bool:
+        return proposal in self.proposals
+
+    def is_on_session(self, visit: tuple[str, int, int]) -> bool:
+        return visit in self.sessions
+
+    def is_beamline_admin(self, beamline: str) -> bool:
+        return crud.BL_TYPES.get(beamline) in self.admin_types
+
+
+async def build_access_index(db: Session, fedid: str) -> AccessIndex:
+    proposals, sessions, admin_types = await crud.get_user_access(db, fedid)
+    # Many users share the same handful of proposal codes
+    return AccessIndex(
+        proposals=frozenset((sys.intern(code), number) for code, number in proposals),
+        sessions=frozenset(
+            (sys.intern(code), number, visit_number)
+            for code, number, visit_number in sessions
+        ),
+        admin_types=frozenset(admin_types),
+    )
+
+
+class AccessIndexes:
+    """The access indexes of the most recently active users"""
+
+    def __init__(
+        self,
+        maxsize: int,
+        refresh_interval: float,
+        timer: Callable[[], float] = time.monotonic,
+    ):
+        self.indexes = TTLCache(maxsize=maxsize, ttl=refresh_interval, timer=timer)
+        self._building: dict[str, asyncio.Future] = {}
+
+    async def build(self, db: Session, fedid: str) -> AccessIndex:
+        """Build the user's index afresh, e.g. when they log in"""
+        index = await build_access_index(db, fedid)
+        self.indexes.set(fedid, index)
+        return index
+
+    async def get(self, fedid: str) -> AccessIndex:
+        """The user's index, built if missing or out of date
+
+        Concurrent requests of the same user wait for a single build, which
+        has its own session, as it may outlive the request that started it.
+        """
+        index = self.indexes.get(fedid)
+        if index is not None:
+            return index
+        building = self._building.get(fedid)
+        if building is None:
+            building = asyncio.ensure_future(self._build_in_own_session(fedid))
+            self._building[fedid] = building
+            building.add_done_callback(lambda _: self._building.pop(fedid, None))
+        return await asyncio.shield(building)
+
+    async def _build_in_own_session(self, fedid: str) -> AccessIndex:
+        db = database.RequestSession()
+        try:
+            return await self.build(db, fedid)
+        finally:
+            await db.close()
+
+    def invalidate(self, fedid: Optional[str] = None) -> None:
+        """Forget the index of fedid, or of all users"""
+        if fedid is None:
+            self.indexes.clear()
+        else:
+            self.indexes.invalidate(fedid)
+
+
+_indexes: Optional[AccessIndexes] = None
+
+
+def get_access_indexes() -> AccessIndexes:
+    global _indexes
+    if _indexes is None:
+        settings = config.get_cache_settings()
+        _indexes = AccessIndexes(
+            maxsize=settings.access_index_max_users,
+            refresh_interval=settings.access_index_refresh_interval,
+        )
+    return _indexes
+
+
+def set_access_indexes(indexes: Optional[AccessIndexes]) -> None:
+    global _indexes
+    _indexes = indexes
@@ -0,0 +1,170 @@
+"""An in-memory index of the unit cells of each proposal's processing results
+
+Cells are indexed on a grid over the logarithms of their a, b and c lengths,
+so that a relative tolerance on the lengths is the same width everywhere on
+the grid, and a search only visits the grid cells within tolerance of the
+target before comparing all six parameters. Cells are compared as reported,
+i.e. cells in different settings are not recognised as similar.
+
+The index of a proposal is built when it is first searched, and afterwards
+extended with the results whose autoProcId is above the highest indexed, at
+most once per refresh interval. The least recently searched proposals are
+dropped once more than the configured number are held.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import dataclasses
+import itertools
+import math
+import time
+from typing import Any, Callable, Iterable, Optional
+
+from sqlalchemy.orm import Session
+
+from ispyb_graphql import config, crud
+from ispyb_graphql.cache import TTLCache
+
+LENGTHS = ("refinedCell_a", "refinedCell_b", "refinedCell_c")
+ANGLES = ("refinedCell_alpha", "refinedCell_beta", "refinedCell_gamma")
+
+# Width of the grid in log(length), i.e. about 1% of each length
+GRID_WIDTH = math.log(1.01)
+
+
+@dataclasses.dataclass(frozen=True)
+class Match:
+    row: Any
+    # Largest difference in a length, relative to the target's
+    length_difference: float
+    # Largest difference in an angle, in degrees
+    angle_difference: float
+
+
+class CellIndex:
+    """The unit cells of a set of processing results, on a grid of log lengths"""
+
+    def __init__(self):
+        self.grid: dict[tuple[int, int, int], list[tuple[tuple, Any]]] = {}
+        self.last_auto_proc_id = 0
+        self.refreshed: Optional[float] = None
+        self.lock = asyncio.Lock()
+
+    def __len__(self) -> int:
+        return sum(len(entries) for entries in self.grid.values())
+
+    @staticmethod
+    def _grid_key(lengths: Iterable[float]) -> tuple[int, ...]:
+        return tuple(math.floor(math.log(length) / GRID_WIDTH) for length in lengths)
+
+    def add(self, rows: Iterable[Any]) -> None:
+        """Index the cells of rows, skipping any with missing parameters"""
+        for row in rows:
+            self.last_auto_proc_id = max(self.last_auto_proc_id, row.autoProcId)
+            cell = tuple(getattr(row, parameter) for parameter in LENGTHS + ANGLES)
+            if any(value is None for value in cell) or min(cell[:3]) <= 0:
+                continue
+            self.grid.setdefault(self._grid_key(cell[:3]), []).append((cell, row))
+
+    def _candidate_keys(self, lengths: tuple, tolerance: float) -> Iterable[tuple]:
+        ranges = [
+            range(
+                math.floor(math.log(length * (1 - tolerance)) / GRID_WIDTH),
+                math.floor(math.log(length * (1 + tolerance)) / GRID_WIDTH) + 1,
+            )
+            for length in lengths
+        ]
+        if math.prod(len(r) for r in ranges) > len(self.grid):
+            # A wide search: check the occupied grid cells instead
+            return [
+                key for key in self.grid if all(k in r for k, r in zip(key, ranges))
+            ]
+        return itertools.product(*ranges)
+
+    def search(
+        self,
+        cell: tuple[float, ...],
+        tolerance: float,
+        angle_tolerance: float,
+    ) -> list[Match]:
+        """The cells within tolerance of cell, most similar first
+
+        Lengths may differ by up to tolerance, relative to those of cell, and
+        angles by up to angle_tolerance degrees.
+        """
+        tolerance = min(tolerance, 0.99)
+        lengths, angles = cell[:3], cell[3:]
+        matches = []
+        for key in self._candidate_keys(lengths, tolerance):
+            for candidate, row in self.grid.get(key, ()):
+                length_difference = max(
+                    abs(c - t) / t for c, t in zip(candidate[:3], lengths)
+                )
+                angle_difference = max(
+                    abs(c - t) for c, t in zip(candidate[3:], angles)
+                )
+                if (
+                    length_difference <= tolerance
+                    and angle_difference <= angle_tolerance
+                ):
+                    matches.append(Match(row, length_difference, angle_difference))
+        matches.sort(
+            key=lambda match: max(
+                match.length_difference / tolerance if tolerance else 0,
+                match.angle_difference / angle_tolerance if angle_tolerance else 0,
+            )
+        )
+        return matches
+
+
+class CellIndexes:
+    """The cell indexes of the most recently searched proposals"""
+
+    def __init__(
+        self,
+        maxsize: int,
+        refresh_interval: float,
+        timer: Callable[[], float] = time.monotonic,
+    ):
+        self.indexes = TTLCache(maxsize=maxsize, ttl=None)
+        self.refresh_interval = refresh_interval
+        self.timer = timer
+
+    async def get(self, db: Session, proposal_id: int) -> CellIndex:
+        """The index for a proposal, built or brought up to date as needed"""
+        index = self.indexes.get(proposal_id)
+        if index is None:
+            index = CellIndex()
+            self.indexes.set(proposal_id, index)
+        async with index.lock:
+            now = self.timer()
+            if (
+                index.refreshed is None
+                or now - index.refreshed >= self.refresh_interval
+            ):
+                rows = await crud.get_unit_cells_for_proposal(
+                    db, proposal_id, after=index.last_auto_proc_id
+                )
+                index.add(rows)
+                index.refreshed = now
+        return index
+
+
+_indexes: Optional[CellIndexes] = None
+
+
+def get_cell_indexes() -> CellIndexes:
+    global _indexes
+    if _indexes is None:
+        settings = config.get_cache_settings()
+        _indexes = CellIndexes(
+            maxsize=settings.cell_index_max_proposals,
+            refresh_interval=settings.cell_index_refresh_interval,
+        )
+    return _indexes
+
+
+def set_cell_indexes(indexes: Optional[CellIndexes]) -> None:
+    global _indexes
+    _indexes = indexes
@@ -0,0 +1,331 @@
+from __future__ import annotations
+
+import asyncio
+from inspect import isawaitable
+from typing import Any, Optional
+
+from graphql import (
+    DocumentNode,
+    ExecutionResult,
+    FieldNode,
+    FragmentDefinitionNode,
+    FragmentSpreadNode,
+    GraphQLError,
+    GraphQLObjectType,
+    GraphQLSchema,
+    InlineFragmentNode,
+    IntValueNode,
+    OperationDefinitionNode,
+    SelectionSetNode,
+    VariableNode,
+    get_named_type,
+    is_list_type,
+    is_non_null_type,
+    is_object_type,
+)
+from strawberry.extensions import Extension
+
+from ispyb_graphql import config, metrics
+
+# Cost of resolving a field once, keyed on (type name, field name). Fields
+# returning objects otherwise cost DEFAULT_OBJECT_WEIGHT, and scalars nothing.
+FIELD_WEIGHTS = {
+    ("Query", "proposal"): 2,
+    ("Query", "visit"): 3,
+    ("Query", "beamline"): 1,
+    ("DataCollection", "autoProcessings"): 2,
+    ("DataCollection", "bestAutoProcessing"): 4,
+    ("Proposal", "similarCells"): 5,
+    ("DataCollection", "autoProcessingSummary"): 4,
+    ("AutoProcessingResult", "mergingStatistics"): 2,
+}
+DEFAULT_OBJECT_WEIGHT = 1
+
+# Expected number of items in list fields that are not paginated
+LIST_SIZES = {
+    ("Proposal", "samples"): 50,
+    ("Proposal", "similarCells"): 100,
+    ("Beamline", "visits"): 20,
+    ("DataCollection", "autoProcessings"): 10,
+    ("DataCollection", "autoProcessingSummary"): 3,
+}
+DEFAULT_LIST_SIZE = 10
+
+# Number of items assumed for paginated fields without first or last
+DEFAULT_PAGE_SIZE = 10
+
+
+def field_weight(parent_type: GraphQLObjectType, field_name: str, field_type) -> int:
+    weight = FIELD_WEIGHTS.get((parent_type.name, field_name))
+    if weight is not None:
+        return weight
+    return DEFAULT_OBJECT_WEIGHT if is_object_type(get_named_type(field_type)) else 0
+
+
+def estimate_query_cost(
+    schema: GraphQLSchema,
+    document: DocumentNode,
+    operation_name: Optional[str] = None,
+    variables: Optional[dict[str, Any]] = None,
+) -> int:
+    """Estimate the cost of executing an operation from its document alone"""
+    operation = next(
+        (
+            definition
+            for definition in document.definitions
+            if isinstance(definition, OperationDefinitionNode)
+            and (
+                operation_name is None
+                or (definition.name and definition.name.value == operation_name)
+            )
+        ),
+        None,
+    )
+    if operation is None:
+        return 0
+    fragments = {
+        definition.name.value: definition
+        for definition in document.definitions
+        if isinstance(definition, FragmentDefinitionNode)
+    }
+    estimator = QueryCostEstimator(schema, fragments, variables)
+    return estimator.selection_set_cost(
+        schema.get_root_type(operation.operation), operation.selection_set
+    )
+
+
+class QueryCostEstimator:
+    """Static cost model for the fields selected by an operation
+
+    The cost of a field is its weight plus the cost of its selections, times
+    the number of items it is expected to return. For a paginated field that
+    is its `first` or `last` argument, applied to the connection's edges; for
+    other lists it is a size hint. A paginated field costs at least its page
+    size, as that many rows are fetched whatever is selected. Subscriptions
+    are costed per message, i.e. per page of `chunkSize` edges.
+    """
+
+    def __init__(
+        self,
+        schema: GraphQLSchema,
+        fragments: dict[str, FragmentDefinitionNode],
+        variables: Optional[dict[str, Any]] = None,
+    ):
+        self.schema = schema
+        self.fragments = fragments
+        self.variables = variables or {}
+
+    def argument(self, node: FieldNode, name: str) -> Optional[int]:
+        for argument in node.arguments or ():
+            if argument.name.value != name:
+                continue
+            if isinstance(argument.value, IntValueNode):
+                return int(argument.value.value)
+            if isinstance(argument.value, VariableNode):
+                return self.variables.get(argument.value.name.value)
+        return None
+
+    def page_size(self, field, node: FieldNode) -> Optional[int]:
+        """The number of edges requested of a paginated field, else None"""
+        if "first" not in field.args and "last" not in field.args:
+            return None
+        sizes = {}
+        for name in ("chunkSize", "last", "first"):
+            if name not in field.args:
+                continue
+            size = self.argument(node, name)
+            if size is None:
+                size = field.args[name].default_value
+            if isinstance(size, int):
+                if size < 0:
+                    raise GraphQLError(f"{name} must not be negative", node)
+                sizes[name] = size
+        if "chunkSize" in sizes:
+            max_chunk_size = config.get_graphql_settings().max_subscription_chunk_size
+            return max(1, min(sizes["chunkSize"], max_chunk_size))
+        return sizes.get("last", sizes.get("first", DEFAULT_PAGE_SIZE))
+
+    def list_size(self, parent_type, name: str, field_type) -> int:
+        if is_non_null_type(field_type):
+            field_type = field_type.of_type
+        if not is_list_type(field_type):
+            return 1
+        return LIST_SIZES.get((parent_type.name, name), DEFAULT_LIST_SIZE)
+
+    def selection_set_cost(
+        self,
+        parent_type,
+        selection_set: Optional[SelectionSetNode],
+        page_size: Optional[int] = None,
+    ) -> int:
+        if selection_set is None:
+            return 0
+        cost = 0
+        for selection in selection_set.selections:
+            if isinstance(selection, FieldNode):
+                cost += self.field_cost(parent_type, selection, page_size)
+                continue
+            if isinstance(selection, InlineFragmentNode):
+                type_condition = selection.type_condition
+                fragment_selection_set = selection.selection_set
+            elif isinstance(selection, FragmentSpreadNode):
+                fragment = self.fragments.get(selection.name.value)
+                if fragment is None:
+                    continue
+                type_condition = fragment.type_condition
+                fragment_selection_set = fragment.selection_set
+            else:
+                continue
+            fragment_type = (
+                self.schema.get_type(type_condition.name.value)
+                if type_condition
+                else parent_type
+            )
+            cost += self.selection_set_cost(
+                fragment_type, fragment_selection_set, page_size
+            )
+        return cost
+
+    def field_cost(
+        self, parent_type, node: FieldNode, page_size: Optional[int] = None
+    ) -> int:
+        name = node.name.value
+        field = getattr(parent_type, "fields", {}).get(name)
+        if field is None:
+            return 0
+        weight = field_weight(parent_type, name, field.type)
+        child_type = get_named_type(field.type)
+        field_page_size = self.page_size(field, node)
+        children = self.selection_set_cost(
+            child_type, node.selection_set, field_page_size
+        )
+        if field_page_size is not None:
+            count = 1
+            children = max(children, field_page_size)
+        elif name == "edges" and page_size is not None:
+            count = page_size
+        else:
+            count = self.list_size(parent_type, name, field.type)
+        return count * (weight + children)
+
+
+def check_subscription_cost(info) -> None:
+    """Reject a subscription whose messages are estimated to cost too much
+
+    Subscriptions are executed without extensions, so their resolvers check
+    their cost instead, see schema.start_subscription().
+    """
+    raw_info = info._raw_info
+    estimator = QueryCostEstimator(
+        raw_info.schema, raw_info.fragments, raw_info.variable_values
+    )
+    cost = estimator.selection_set_cost(
+        raw_info.parent_type, raw_info.operation.selection_set
+    )
+    metrics.GRAPHQL_QUERY_COST_ESTIMATED.observe(cost)
+    max_query_cost = config.get_graphql_settings().max_query_cost
+    if cost > max_query_cost:
+        metrics.GRAPHQL_QUERY_COST_REJECTED.inc()
+        raise GraphQLError(
+            f"Query cost {cost} exceeds the maximum allowed cost of {max_query_cost}"
+        )
+
+
+class QueryCostExtension(Extension):
+    """Reject or throttle operations whose estimated cost exceeds a budget
+
+    The cost is estimated once the document has been validated, before any
+    resolver runs. Operations over GraphQLSettings.max_query_cost are rejected.
+    Those over throttle_query_cost wait for one of a limited number of slots
+    shared by all expensive operations in the process. The estimated cost and
+    the cost actually incurred, counted as fields are resolved, are reported
+    to Prometheus.
+    """
+
+    _expensive_query_slots: Optional[asyncio.Semaphore] = None
+
+    def __init__(self, *, execution_context):
+        super().__init__(execution_context=execution_context)
+        self.estimated_cost: Optional[int] = None
+        self.actual_cost = 0
+        self.throttled = False
+
+    @classmethod
+    def expensive_query_slots(cls) -> asyncio.Semaphore:
+        if cls._expensive_query_slots is None:
+            settings = config.get_graphql_settings()
+            cls._expensive_query_slots = asyncio.Semaphore(
+                settings.max_concurrent_expensive_queries
+            )
+        return cls._expensive_query_slots
+
+    def on_validation_end(self):
+        execution_context = self.execution_context
+        if execution_context.errors or execution_context.graphql_document is None:
+            return
+        settings = config.get_graphql_settings()
+        try:
+            self.estimated_cost = estimate_query_cost(
+                execution_context.schema._schema,
+                execution_context.graphql_document,
+                execution_context.operation_name,
+                execution_context.variables,
+            )
+        except GraphQLError as error:
+            self.reject(error)
+            return
+        metrics.GRAPHQL_QUERY_COST_ESTIMATED.observe(self.estimated_cost)
+        if self.estimated_cost > settings.max_query_cost:
+            metrics.GRAPHQL_QUERY_COST_REJECTED.inc()
+            self.reject(
+                GraphQLError(
+                    f"Query cost {self.estimated_cost} exceeds the maximum "
+                    f"allowed cost of {settings.max_query_cost}"
+                )
+            )
+        elif self.estimated_cost > settings.throttle_query_cost:
+            self.throttled = True
+
+    def reject(self, error: GraphQLError) -> None:
+        self.execution_context.errors = [error]
+        self.execution_context.result = ExecutionResult(data=None, errors=[error])
+
+    async def on_executing_start(self):
+        if self.execution_context.result is not None:
+            # Answered without executing, e.g. from the response cache
+            self.throttled = False
+        if self.throttled:
+            await self.expensive_query_slots().acquire()
+
+    def on_executing_end(self):
+        if self.throttled:
+            self.expensive_query_slots().release()
+            self.throttled = False
+        if self.estimated_cost is not None:
+            metrics.GRAPHQL_QUERY_COST_ACTUAL.observe(self.actual_cost)
+
+    def resolve(self, _next, root, info, *args, **kwargs):
+        weight = field_weight(info.parent_type, info.field_name, info.return_type)
+        result = _next(root, info, *args, **kwargs)
+        if not weight:
+            return result
+        if isawaitable(result):
+            return self._count_awaited(result, weight)
+        self._count(result, weight)
+        return result
+
+    async def _count_awaited(self, result, weight: int):
+        result = await result
+        self._count(result, weight)
+        return result
+
+    def _count(self, result, weight: int) -> None:
+        if isinstance(result, (list, tuple)):
+            self.actual_cost += weight * len(result)
+        elif result is not None:
+            self.actual_cost += weight
+
+    def get_results(self):
+        if self.estimated_cost is None:
+            return {}
+        return {"cost": {"estimated": self.estimated_cost}}
@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+from typing import Any, Awaitable, Callable, Hashable, Iterable, Optional, TypeVar
+
+from strawberry.dataloader import DataLoader
+
+from ispyb_graphql import tracing
+from ispyb_graphql.cache import MISSING, TTLCache
+
+K = TypeVar("K", bound=Hashable)
+T = TypeVar("T")
+
+
+class Loader(DataLoader):
+    """A DataLoader that may be primed with values fetched some other way
+
+    Each batch is recorded as a span of the operation's trace, if it is traced.
+    """
+
+    def __init__(self, load_fn, **kwargs):
+        super().__init__(self._load_batch, **kwargs)
+        # The load function itself, e.g. to derive a projected loader from
+        self.batch_load_fn = load_fn
+        self.name = tracing.function_name(load_fn)
+
+    async def _load_batch(self, keys):
+        with tracing.span(self.name, "batch", {"dataloader.batch_size": len(keys)}):
+            return await self.batch_load_fn(keys)
+
+    def prime(self, key, value) -> None:
+        """Seed the cache with a value that has already been fetched"""
+        if self.cache and key not in self.cache_map:
+            future = self.loop.create_future()
+            future.set_result(value)
+            self.cache_map[key] = future
+
+
+class IDLoader(Loader):
+    """A DataLoader keyed on integer database ids
+
+    Ids arrive both as `int` (from parent objects) and as `str` (from
+    `strawberry.ID` arguments); coercing them means both forms share a single
+    cache entry and a single slot in the batch.
+    """
+
+    def load(self, key):
+        return super().load(int(key))
+
+    def prime(self, key, value) -> None:
+        super().prime(int(key), value)
+
+
+def unique_keys(keys: Iterable[K]) -> list[K]:
+    """Remove duplicate keys, preserving the order of first appearance"""
+    return list(dict.fromkeys(keys))
+
+
+def missing_error(entity: str) -> Callable[[Any], Exception]:
+    def error(key):
+        return LookupError(f"{entity} {key} not found")
+
+    return error
+
+
+def order_by_keys(
+    keys: list[K],
+    rows: Iterable[Any],
+    key_of: Callable[[Any], K],
+    transform: Callable[[Any], T] = lambda row: row,
+    missing: Optional[Callable[[K], Any]] = None,
+) -> list[Optional[T]]:
+    """Align rows with keys, as required by the DataLoader contract
+
+    Returns one value per key, in the order of keys. Keys for which there is no
+    row map to None, or to missing(key) if given (e.g. a per-key exception).
+    """
+    found = {key_of(row): row for row in rows}
+    return [
+        transform(found[key]) if key in found else (missing(key) if missing else None)
+        for key in keys
+    ]
+
+
+async def batch_load(
+    keys: list[K],
+    fetch: Callable[[list[K]], Awaitable[Iterable[Any]]],
+    key_of: Callable[[Any], K],
+    transform: Callable[[Any], T] = lambda row: row,
+    missing: Optional[Callable[[K], Any]] = None,
+) -> list[Optional[T]]:
+    """Fetch the rows for the distinct keys in one call and return them in key order"""
+    rows = await fetch(unique_keys(keys))
+    return order_by_keys(keys, rows, key_of, transform=transform, missing=missing)
+
+
+async def cached_batch_load(
+    keys: list[K],
+    fetch: Callable[[list[K]], Awaitable[list[Any]]],
+    cache: TTLCache,
+    namespace: str,
+    transform: Callable[[Any], T] = lambda value: value,
+    missing: Optional[Callable[[K], Any]] = None,
+    cacheable: Callable[[Any], bool] = lambda value: True,
+    ttl: Optional[float] = MISSING,
+) -> list[Optional[T]]:
+    """Load values through a cache shared between requests
+
+    Only keys not found in the cache under (namespace, key) are passed to
+    fetch, which must return one value per key in key order (None if there is
+    none). Fetched values are added to the cache if cacheable(value).
+    """
+    values = {}
+    for key in unique_keys(keys):
+        value = cache.get((namespace, key), MISSING)
+        if value is not MISSING:
+            values[key] = value
+    uncached = [key for key in unique_keys(keys) if key not in values]
+    if uncached:
+        for key, value in zip(uncached, await fetch(uncached)):
+            values[key] = value
+            if value is not None and cacheable(value):
+                cache.set((namespace, key), value, ttl=ttl)
+    return [
+        transform(values[key])
+        if values[key] is not None
+        else (missing(key) if missing else None)
+        for key in keys
+    ]
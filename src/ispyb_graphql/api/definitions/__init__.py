@@ -1,9 +1,15 @@
 from __future__ import annotations
 
+import functools
+from typing import Sequence, Union
+
 import strawberry
+from sqlalchemy.engine import Row
 from sqlalchemy.orm import Session
 
-from ispyb_graphql import crud
+from ispyb_graphql import config, crud
+from ispyb_graphql.api import entity_cache
+from ispyb_graphql.api.dataloaders import batch_load, cached_batch_load, missing_error
 
 from .auto_processing import AutoProcessingResult, MergingStatistics
 from .beamline import Beamline
@@ -11,6 +17,7 @@ from .container import Container
 from .data_collection import DataCollection
 from .proposal import Proposal
 from .sample import Sample
+from .updates import DataCollectionUpdates
 from .visit import Visit
 
 __all__ = [
@@ -18,6 +25,7 @@ __all__ = [
     "Beamline",
     "Container",
     "DataCollection",
+    "DataCollectionUpdates",
     "MergingStatistics",
     "Proposal",
     "Sample",
@@ -26,41 +34,115 @@ __all__ = [
 
 
 async def load_auto_processings(
-    db: Session, dcids: list[strawberry.ID]
+    db: Session,
+    dcids: list[strawberry.ID],
+    columns: Sequence = crud.AUTO_PROCESSING_RESULT_COLUMNS,
 ) -> list[list[AutoProcessingResult]]:
-    result = await crud.get_auto_processing_results_for_dcids(db, dcids)
-    return [
-        [AutoProcessingResult.from_instance(ap) for ap in auto_processings]
-        for auto_processings in result
-    ]
+    # Results are only cached once their data collection has finished, and
+    # then only for a while, as more can still be added
+    return await cached_batch_load(
+        dcids,
+        functools.partial(
+            crud.get_auto_processing_results_for_dcids, db, columns=columns
+        ),
+        entity_cache.get_entity_cache(),
+        entity_cache.namespace(entity_cache.AUTO_PROCESSING_RESULTS, columns),
+        transform=lambda rows: [AutoProcessingResult.from_instance(ap) for ap in rows],
+        cacheable=lambda rows: bool(rows) and rows[0].dataCollectionEndTime is not None,
+        ttl=config.get_cache_settings().auto_processing_ttl,
+    )
 
 
 async def load_merging_statistics(
     db: Session, auto_proc_ids: list[strawberry.ID]
 ) -> list[list[MergingStatistics]]:
-    result = await crud.get_auto_proc_scaling_statistics_for_apids(db, auto_proc_ids)
-    return [
-        [MergingStatistics.from_instance(shell_stats) for shell_stats in statistics]
-        for statistics in result
-    ]
+    # Scaling statistics are written in one go and never updated
+    return await cached_batch_load(
+        auto_proc_ids,
+        functools.partial(crud.get_auto_proc_scaling_statistics_for_apids, db),
+        entity_cache.get_entity_cache(),
+        entity_cache.namespace(entity_cache.AUTO_PROC_SCALING_STATISTICS),
+        transform=lambda rows: [MergingStatistics.from_instance(ms) for ms in rows],
+        cacheable=bool,
+    )
 
 
 async def load_containers(
-    db: Session, container_ids: list[strawberry.ID]
-) -> list[list[Container]]:
-    containers = await crud.get_containers(db, container_ids)
-    return [Container.from_instance(container) for container in containers]
+    db: Session,
+    container_ids: list[int],
+    columns: Sequence = crud.CONTAINER_COLUMNS,
+) -> list[Union[Container, Exception]]:
+    return await batch_load(
+        container_ids,
+        functools.partial(crud.get_containers, db, columns=columns),
+        key_of=lambda container: container.containerId,
+        transform=Container.from_instance,
+        missing=missing_error("Container"),
+    )
 
 
 async def load_samples(
-    db: Session, sample_ids: list[strawberry.ID]
-) -> list[list[Sample]]:
-    samples = await crud.get_samples(db, sample_ids)
-    return [Sample.from_instance(sample) for sample in samples]
+    db: Session,
+    sample_ids: list[int],
+    columns: Sequence = crud.SAMPLE_COLUMNS,
+) -> list[Union[Sample, Exception]]:
+    return await batch_load(
+        sample_ids,
+        functools.partial(crud.get_samples, db, columns=columns),
+        key_of=lambda sample: sample.blSampleId,
+        transform=Sample.from_instance,
+        missing=missing_error("Sample"),
+    )
 
 
 async def load_data_collections(
-    db: Session, dcids: list[strawberry.ID]
-) -> list[list[DataCollection]]:
-    data_collections = await crud.get_data_collections(db, dcids)
-    return [DataCollection.from_instance(dc) for dc in data_collections]
+    db: Session,
+    dcids: list[int],
+    columns: Sequence = crud.DATA_COLLECTION_COLUMNS,
+) -> list[Union[DataCollection, Exception]]:
+    # Only finished data collections are cached, as they will no longer change
+    return await cached_batch_load(
+        dcids,
+        functools.partial(
+            batch_load,
+            fetch=functools.partial(crud.get_data_collections, db, columns=columns),
+            key_of=lambda dc: dc.dataCollectionId,
+        ),
+        entity_cache.get_entity_cache(),
+        entity_cache.namespace(entity_cache.DATA_COLLECTION, columns),
+        transform=DataCollection.from_instance,
+        missing=missing_error("DataCollection"),
+        cacheable=lambda dc: dc.endTime is not None,
+    )
+
+
+def visit_key(row) -> tuple[str, int, int]:
+    return (row.proposalCode, row.proposalNumber, row.visit_number)
+
+
+def proposal_key(row) -> tuple[str, int]:
+    return (row.proposalCode, row.proposalNumber)
+
+
+async def load_blsessions(
+    db: Session, visits: list[tuple[str, int, int]]
+) -> list[Union[Row, Exception]]:
+    return await batch_load(
+        visits,
+        functools.partial(crud.get_blsessions, db),
+        key_of=visit_key,
+        missing=lambda visit: LookupError("Visit {}{}-{} not found".format(*visit)),
+    )
+
+
+async def load_proposals(
+    db: Session, proposals: list[tuple[str, int]]
+) -> list[Union[Row, Exception]]:
+    return await batch_load(
+        proposals,
+        functools.partial(crud.get_proposals, db),
+        key_of=proposal_key,
+        missing=lambda proposal: LookupError(
+            "Proposal {}{} not found".format(*proposal)
+        ),
+    )
@@ -6,6 +6,7 @@ from typing import Optional
 import strawberry
 
 from ispyb_graphql import models
+from ispyb_graphql.api.statistics import Condition, at_least, at_most
 
 
 @strawberry.type
@@ -18,6 +19,19 @@ class UnitCell:
     gamma: float
 
 
+@strawberry.input
+class UnitCellInput:
+    a: float
+    b: float
+    c: float
+    alpha: float
+    beta: float
+    gamma: float
+
+    def parameters(self) -> tuple[float, ...]:
+        return (self.a, self.b, self.c, self.alpha, self.beta, self.gamma)
+
+
 @strawberry.enum
 class MergingStatisticsType(enum.Enum):
     OVERALL = "overall"
@@ -25,6 +39,45 @@ class MergingStatisticsType(enum.Enum):
     OUTER_SHELL = "outerShell"
 
 
+@strawberry.enum
+class MergingStatisticsColumn(enum.Enum):
+    D_MIN = "d_min"
+    R_MERGE = "r_merge"
+    MEAN_ISIGI = "mean_isigi"
+    COMPLETENESS = "completeness"
+    MULTIPLICITY = "multiplicity"
+    ANOMALOUS_COMPLETENESS = "anomalous_completeness"
+    ANOMALOUS_MULTIPLICITY = "anomalous_multiplicity"
+    CC_HALF = "cc_half"
+    CC_ANOM = "cc_anom"
+
+
+@strawberry.input
+class MergingStatisticsFilter:
+    """Thresholds the merging statistics of a shell must all meet"""
+
+    shell: MergingStatisticsType = MergingStatisticsType.OVERALL
+    max_d_min: Optional[float] = None
+    max_r_merge: Optional[float] = None
+    min_mean_isigi: Optional[float] = None
+    min_completeness: Optional[float] = None
+    min_multiplicity: Optional[float] = None
+    min_cc_half: Optional[float] = None
+    min_cc_anom: Optional[float] = None
+
+    def conditions(self) -> list[Condition]:
+        thresholds = [
+            at_most("d_min", self.max_d_min),
+            at_most("r_merge", self.max_r_merge),
+            at_least("mean_isigi", self.min_mean_isigi),
+            at_least("completeness", self.min_completeness),
+            at_least("multiplicity", self.min_multiplicity),
+            at_least("cc_half", self.min_cc_half),
+            at_least("cc_anom", self.min_cc_anom),
+        ]
+        return [condition for condition in thresholds if condition[2] is not None]
+
+
 @strawberry.type
 class MergingStatistics:
     shell: MergingStatisticsType
@@ -63,24 +116,29 @@ class AutoProcessingResult:
     unit_cell: UnitCell
 
     auto_proc_id: strawberry.Private[int]
+    dcid: Optional[int] = None
 
     @classmethod
-    def from_instance(
-        cls,
-        instance: models.AutoProcessingResult,
-    ):
+    def from_instance(cls, row):
+        """Create an AutoProcessingResult from a row of (a projection of) the
+        columns, leaving fields whose columns were not selected as None"""
         return cls(
-            program=instance.AutoProcProgram.processingPrograms,
-            space_group=instance.AutoProc.spaceGroup,
-            unit_cell=UnitCell(
-                instance.AutoProc.refinedCell_a,
-                instance.AutoProc.refinedCell_b,
-                instance.AutoProc.refinedCell_c,
-                instance.AutoProc.refinedCell_alpha,
-                instance.AutoProc.refinedCell_beta,
-                instance.AutoProc.refinedCell_gamma,
+            program=getattr(row, "processingPrograms", None),
+            space_group=getattr(row, "spaceGroup", None),
+            unit_cell=(
+                UnitCell(
+                    row.refinedCell_a,
+                    row.refinedCell_b,
+                    row.refinedCell_c,
+                    row.refinedCell_alpha,
+                    row.refinedCell_beta,
+                    row.refinedCell_gamma,
+                )
+                if hasattr(row, "refinedCell_a")
+                else None
             ),
-            auto_proc_id=instance.AutoProc.autoProcId,
+            auto_proc_id=row.autoProcId,
+            dcid=getattr(row, "dataCollectionId", None),
         )
 
     @strawberry.field
@@ -91,3 +149,26 @@ class AutoProcessingResult:
             self.auto_proc_id
         )
         return next((ms for ms in merging_stats if ms.shell == shell.value), None)
+
+
+@strawberry.type
+class AutoProcessingSummary:
+    """The best merging statistics in a shell of the results of one program"""
+
+    program: Optional[str]
+    count: int
+    best_d_min: Optional[float]
+    best_completeness: Optional[float]
+    best_cc_half: Optional[float]
+    best_mean_isigi: Optional[float]
+
+    @classmethod
+    def from_table(cls, program: Optional[str], table):
+        return cls(
+            program=program,
+            count=len(table),
+            best_d_min=table.best("d_min"),
+            best_completeness=table.best("completeness"),
+            best_cc_half=table.best("cc_half"),
+            best_mean_isigi=table.best("mean_isigi"),
+        )
@@ -4,8 +4,6 @@ from typing import Optional
 
 import strawberry
 
-from ispyb_graphql import models
-
 
 @strawberry.type
 class Container:
@@ -16,11 +14,12 @@ class Container:
     barcode: Optional[str]
 
     @classmethod
-    def from_instance(cls, instance: models.Container):
+    def from_instance(cls, row):
+        """Create a Container from a row of (a projection of) the columns"""
         return cls(
-            capacity=instance.capacity,
-            barcode=instance.barcode,
-            code=instance.code,
-            container_id=instance.containerId,
-            container_type=instance.containerType,
+            capacity=getattr(row, "capacity", None),
+            barcode=getattr(row, "barcode", None),
+            code=getattr(row, "code", None),
+            container_id=row.containerId,
+            container_type=getattr(row, "containerType", None),
         )
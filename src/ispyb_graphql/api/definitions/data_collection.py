@@ -4,14 +4,24 @@ import datetime
 import enum
 import os
 import pathlib
-from typing import TYPE_CHECKING, NewType, Optional
+from typing import TYPE_CHECKING, AsyncIterator, NewType, Optional
 
 import strawberry
 
 import ispyb_graphql
-from ispyb_graphql import models
+from ispyb_graphql import crud
+from ispyb_graphql.api.projection import field_names, projected_loader, selections
+from ispyb_graphql.api.statistics import StatisticsTable
 
-from .auto_processing import AutoProcessingResult
+from . import projections
+from .auto_processing import (
+    AutoProcessingResult,
+    AutoProcessingSummary,
+    MergingStatisticsColumn,
+    MergingStatisticsFilter,
+    MergingStatisticsType,
+)
+from .pagination import Connection, Edge, PageInfo, decode_cursor, encode_cursor
 
 if TYPE_CHECKING:
     from .sample import Sample
@@ -31,6 +41,12 @@ class ScanType(enum.Enum):
     SCREENING = "screening"
 
 
+@strawberry.enum
+class DataCollectionOrder(enum.Enum):
+    DCID = "dataCollectionId"
+    START_TIME = "startTime"
+
+
 @strawberry.type
 class DataCollection:
     dcid: int
@@ -52,30 +68,106 @@ class DataCollection:
     chi_start: Optional[float] = None
 
     @classmethod
-    def from_instance(cls, instance: models.DataCollection):
+    def from_instance(cls, row):
+        """Create a DataCollection from a row of (a projection of) the columns
+
+        Fields whose columns were not selected are left as None.
+        """
         return cls(
-            dcid=instance.dataCollectionId,
-            filename=f"{instance.imageDirectory}{instance.fileTemplate}",
-            sample_id=instance.BLSAMPLEID,
-            start_time=instance.startTime,
-            end_time=instance.endTime,
-            axis_start=instance.axisStart,
-            axis_end=instance.axisEnd,
-            axis_range=instance.axisRange,
-            overlap=instance.overlap,
-            number_of_images=instance.numberOfImages,
-            start_image_number=instance.startImageNumber,
-            exposure_time=instance.exposureTime,
-            rotation_axis=instance.rotationAxis,
-            phi_start=instance.phiStart,
-            kappa_start=instance.kappaStart,
-            omega_start=instance.omegaStart,
-            chi_start=instance.chiStart,
+            dcid=row.dataCollectionId,
+            filename=(
+                f"{row.imageDirectory}{row.fileTemplate}"
+                if hasattr(row, "fileTemplate")
+                else None
+            ),
+            sample_id=getattr(row, "BLSAMPLEID", None),
+            start_time=getattr(row, "startTime", None),
+            end_time=getattr(row, "endTime", None),
+            axis_start=getattr(row, "axisStart", None),
+            axis_end=getattr(row, "axisEnd", None),
+            axis_range=getattr(row, "axisRange", None),
+            overlap=getattr(row, "overlap", None),
+            number_of_images=getattr(row, "numberOfImages", None),
+            start_image_number=getattr(row, "startImageNumber", None),
+            exposure_time=getattr(row, "exposureTime", None),
+            rotation_axis=getattr(row, "rotationAxis", None),
+            phi_start=getattr(row, "phiStart", None),
+            kappa_start=getattr(row, "kappaStart", None),
+            omega_start=getattr(row, "omegaStart", None),
+            chi_start=getattr(row, "chiStart", None),
+        )
+
+    async def _auto_processings(
+        self, info, columns: tuple, filter: Optional[MergingStatisticsFilter]
+    ) -> tuple[list[AutoProcessingResult], list[list]]:
+        """The processing results meeting filter, with their merging statistics
+
+        The statistics are only loaded if needed, batched with those of other
+        data collections by the merging statistics loader.
+        """
+        loader = projected_loader(
+            info, "auto_processing_loader", projections.AUTO_PROCESSING_RESULT, columns
+        )
+        results = await loader.load(self.dcid)
+        statistics = await info.context["merging_statistics_loader"].load_many(
+            [result.auto_proc_id for result in results]
         )
+        if filter is not None:
+            table = StatisticsTable.from_results(
+                range(len(results)), statistics, filter.shell.value
+            )
+            keep = table.where(filter.conditions()).results
+            results = [results[i] for i in keep]
+            statistics = [statistics[i] for i in keep]
+        return results, statistics
 
     @strawberry.field
-    async def auto_processings(self, info) -> list[AutoProcessingResult]:
-        return await info.context["auto_processing_loader"].load(self.dcid)
+    async def auto_processings(
+        self, info, filter: Optional[MergingStatisticsFilter] = None
+    ) -> list[AutoProcessingResult]:
+        projection = projections.AUTO_PROCESSING_RESULT
+        if filter is None:
+            loader = projected_loader(
+                info, "auto_processing_loader", projection, projection.select(info)
+            )
+            return await loader.load(self.dcid)
+        results, _ = await self._auto_processings(info, projection.select(info), filter)
+        return results
+
+    @strawberry.field
+    async def best_auto_processing(
+        self,
+        info,
+        rank_by: MergingStatisticsColumn = MergingStatisticsColumn.CC_HALF,
+        shell: MergingStatisticsType = MergingStatisticsType.OVERALL,
+        filter: Optional[MergingStatisticsFilter] = None,
+    ) -> Optional[AutoProcessingResult]:
+        """The result with the best statistic in a shell, e.g. the highest
+        CC(1/2) or the lowest d_min, of those meeting filter"""
+        results, statistics = await self._auto_processings(
+            info, projections.AUTO_PROCESSING_RESULT.select(info), filter
+        )
+        table = StatisticsTable.from_results(results, statistics, shell.value)
+        index = table.best_index(rank_by.value)
+        return None if index is None else results[index]
+
+    @strawberry.field
+    async def auto_processing_summary(
+        self,
+        info,
+        shell: MergingStatisticsType = MergingStatisticsType.OVERALL,
+        filter: Optional[MergingStatisticsFilter] = None,
+    ) -> list[AutoProcessingSummary]:
+        """The best statistics in a shell of each program's results"""
+        results, statistics = await self._auto_processings(
+            info, projections.AUTO_PROCESSING_RESULT.columns_for(["program"]), filter
+        )
+        table = StatisticsTable.from_results(results, statistics, shell.value)
+        groups = table.group_by([result.program for result in results])
+        return [
+            AutoProcessingSummary.from_table(program, group)
+            for program, group in groups.items()
+        ]
 
     @strawberry.field
     async def sample(
@@ -84,4 +176,104 @@ class DataCollection:
         strawberry.LazyType["Sample", "ispyb_graphql.api.definitions.sample"]
     ]:
         if self.sample_id is not None:
-            return await info.context["sample_loader"].load(self.sample_id)
+            projection = projections.SAMPLE
+            loader = projected_loader(
+                info, "sample_loader", projection, projection.select(info)
+            )
+            return await loader.load(self.sample_id)
+
+
+async def data_collection_connection(
+    info,
+    first: int,
+    after: Optional[str] = None,
+    last: Optional[int] = None,
+    before: Optional[str] = None,
+    order_by: DataCollectionOrder = DataCollectionOrder.DCID,
+    **filters,
+) -> Connection[DataCollection]:
+    """Resolve a page of data collections matching filters as a Connection
+
+    Pages are selected by keyset pagination on the order_by sort key, taking
+    the first rows after the `after` cursor, or the last rows before the
+    `before` cursor if `last` is given. The page and the row telling us whether
+    there is a further page are fetched in a single query, and the data
+    collection loader is primed with the results. Only the columns needed for
+    the fields selected on the nodes, and for the cursors, are fetched, and
+    related objects may be joined onto the page (see planner.py).
+    """
+    from .planner import plan_joins
+
+    ordering = order_by.value
+    backward = last is not None
+    size = last if backward else first
+    if size < 0:
+        raise ValueError(f"{'last' if backward else 'first'} must not be negative")
+    sort_key = crud.DATA_COLLECTION_ORDERINGS[ordering]
+    projection = projections.DATA_COLLECTION
+    nodes = selections(info, "edges", "node")
+    columns = projection.columns_for(
+        field_names(nodes), extra=[column.key for column in sort_key]
+    )
+    joins = plan_joins(nodes)
+    rows = await crud.get_data_collections_page(
+        info.context["db"],
+        order_by=ordering,
+        limit=size + 1,
+        after=decode_cursor(ordering, after) if after else None,
+        before=decode_cursor(ordering, before) if before else None,
+        backward=backward,
+        columns=columns,
+        related={join.path: join.columns for join in joins},
+        **filters,
+    )
+    has_more = len(rows) > size
+    rows = rows[-size:] if backward and size else rows[:size]
+    loader = projected_loader(info, "data_collections_loader", projection, columns)
+    edges = []
+    for row in rows:
+        dc = DataCollection.from_instance(row)
+        loader.prime(dc.dcid, dc)
+        for join in joins:
+            join.prime(info, row)
+        cursor = encode_cursor(ordering, [getattr(row, c.key) for c in sort_key])
+        edges.append(Edge(node=dc, cursor=cursor))
+    return Connection(
+        page_info=PageInfo(
+            has_previous_page=has_more if backward else after is not None,
+            has_next_page=before is not None if backward else has_more,
+            start_cursor=edges[0].cursor if edges else None,
+            end_cursor=edges[-1].cursor if edges else None,
+        ),
+        edges=edges,
+    )
+
+
+async def stream_data_collection_connection(
+    info,
+    chunk_size: int,
+    first: Optional[int] = None,
+    after: Optional[str] = None,
+    order_by: DataCollectionOrder = DataCollectionOrder.DCID,
+    **filters,
+) -> AsyncIterator[Connection[DataCollection]]:
+    """Resolve data collections matching filters as a series of Connection pages
+
+    Each page holds up to chunk_size edges, continuing from the end cursor of
+    the previous one, for up to `first` edges in total (or all of them). A page
+    is only fetched once the previous one has been consumed, i.e. when used as
+    a subscription, once its nested fields have been resolved and sent.
+    """
+    remaining = first
+    while remaining is None or remaining > 0:
+        size = chunk_size if remaining is None else min(chunk_size, remaining)
+        page = await data_collection_connection(
+            info, first=size, after=after, order_by=order_by, **filters
+        )
+        if page.edges:
+            yield page
+        if not page.page_info.has_next_page:
+            return
+        after = page.page_info.end_cursor
+        if remaining is not None:
+            remaining -= len(page.edges)
@@ -1,6 +1,9 @@
 from __future__ import annotations
 
-from typing import Generic, Optional, TypeVar
+import base64
+import datetime
+import json
+from typing import Any, Generic, Optional, Sequence, TypeVar
 
 import strawberry
 
@@ -44,3 +47,34 @@ class Edge(Generic[GenericType]):
 
     node: GenericType
     cursor: strawberry.ID
+
+
+def encode_cursor(ordering: str, values: Sequence[Any]) -> str:
+    """Encode the sort key values of a row as an opaque cursor"""
+    payload = [ordering] + [
+        value.isoformat() if isinstance(value, datetime.datetime) else value
+        for value in values
+    ]
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+
+def decode_cursor(ordering: str, cursor: str) -> list[Any]:
+    """Decode a cursor produced by encode_cursor() for the same ordering
+
+    Values that look like ISO 8601 timestamps are returned as datetimes.
+    """
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+    if not isinstance(payload, list) or not payload or payload[0] != ordering:
+        raise ValueError(f"Cursor {cursor!r} does not match ordering {ordering!r}")
+    values = []
+    for value in payload[1:]:
+        if isinstance(value, str):
+            try:
+                value = datetime.datetime.fromisoformat(value)
+            except ValueError:
+                pass
+        values.append(value)
+    return values
@@ -0,0 +1,160 @@
+"""Plan how the related objects selected below data collections are fetched
+
+Each relation below a page of data collections can either be fetched by its
+DataLoader, in one batched query per level, or be outer joined onto the page
+query itself. Joining saves a round-trip but repeats the parent's columns for
+every related row, so only to-one relations whose cardinality hint is within
+GraphQLSettings.lookahead_join_max_cardinality are joined, and only below
+relations that are joined themselves. To-many relations would also break the
+page's LIMIT, so they are always batched. Objects fetched by a join are primed
+into the loaders their resolvers use, so those resolvers need no query.
+"""
+
+from __future__ import annotations
+
+import dataclasses
+import logging
+import types
+from typing import Any, Callable, Iterable, Optional
+
+from ispyb_graphql import config
+from ispyb_graphql.api.projection import (
+    Projection,
+    descend,
+    field_names,
+    projected_loader,
+)
+
+from . import projections
+from .container import Container
+from .sample import Sample
+
+logger = logging.getLogger(__name__)
+
+
+@dataclasses.dataclass(frozen=True)
+class Relation:
+    """A field resolving to objects related to its parent
+
+    cardinality is the expected number of related objects per parent. id is
+    the key of the related object for to-one relations, which may be joined.
+    """
+
+    field: str
+    cardinality: float
+    loader: str
+    projection: Optional[Projection] = None
+    id: Optional[str] = None
+    from_row: Optional[Callable[[Any], Any]] = None
+    children: tuple[Relation, ...] = ()
+
+    @property
+    def to_one(self) -> bool:
+        return self.id is not None
+
+
+DATA_COLLECTION_RELATIONS = (
+    Relation(
+        "sample",
+        cardinality=1,
+        loader="sample_loader",
+        projection=projections.SAMPLE,
+        id="blSampleId",
+        from_row=Sample.from_instance,
+        children=(
+            Relation(
+                "container",
+                cardinality=1,
+                loader="container_loader",
+                projection=projections.CONTAINER,
+                id="containerId",
+                from_row=Container.from_instance,
+            ),
+        ),
+    ),
+    Relation(
+        "autoProcessings",
+        cardinality=4,
+        loader="auto_processing_loader",
+        children=(
+            Relation(
+                "mergingStatistics", cardinality=3, loader="merging_statistics_loader"
+            ),
+        ),
+    ),
+)
+
+
+@dataclasses.dataclass(frozen=True)
+class Join:
+    path: str
+    relation: Relation
+    columns: tuple
+
+    def prime(self, info, row) -> None:
+        """Prime the relation's loader with the object joined onto row"""
+        values = types.SimpleNamespace(
+            **{
+                column.key: getattr(row, f"{self.path}__{column.key}")
+                for column in self.columns
+            }
+        )
+        key = getattr(values, self.relation.id)
+        if key is not None:
+            loader = projected_loader(
+                info, self.relation.loader, self.relation.projection, self.columns
+            )
+            loader.prime(key, self.relation.from_row(values))
+
+
+def plan_joins(
+    selections: Iterable[Any],
+    relations: Iterable[Relation] = DATA_COLLECTION_RELATIONS,
+    max_join_cardinality: Optional[float] = None,
+    prefix: str = "",
+    joinable: bool = True,
+) -> list[Join]:
+    """Choose which of the relations selected below a page to join onto it"""
+    if max_join_cardinality is None:
+        max_join_cardinality = (
+            config.get_graphql_settings().lookahead_join_max_cardinality
+        )
+    selections = list(selections)
+    selected = field_names(selections)
+    joins = []
+    for relation in relations:
+        if relation.field not in selected:
+            continue
+        path = f"{prefix}{relation.field}"
+        below = descend(selections, relation.field)
+        join = (
+            joinable
+            and relation.to_one
+            and relation.cardinality <= max_join_cardinality
+        )
+        if join:
+            columns = relation.projection.columns_for(field_names(below))
+            logger.debug(
+                "%s: join (cardinality %s) selecting %s",
+                path,
+                relation.cardinality,
+                [column.key for column in columns],
+            )
+            joins.append(Join(path, relation, columns))
+        else:
+            logger.debug(
+                "%s: batched query by %s (cardinality %s)",
+                path,
+                relation.loader,
+                relation.cardinality,
+            )
+        joins.extend(
+            plan_joins(
+                below,
+                relation.children,
+                max_join_cardinality,
+                prefix=f"{path}__",
+                joinable=join,
+            )
+        )
+    return joins
@@ -0,0 +1,93 @@
+"""The columns each GraphQL field is read from
+
+Resolvers select only the columns needed for the fields a query asks for.
+Fields with a resolver list the columns the resolver needs, e.g. the id it
+loads related objects with. Required columns are always selected, as they
+are needed as loader keys or to decide how long a response may be cached.
+"""
+
+from __future__ import annotations
+
+from ispyb_graphql import crud
+from ispyb_graphql.api.projection import Projection
+
+AUTO_PROCESSING_RESULT = Projection(
+    crud.AUTO_PROCESSING_RESULT_COLUMNS,
+    {
+        "program": ("processingPrograms",),
+        "spaceGroup": ("spaceGroup",),
+        "unitCell": (
+            "refinedCell_a",
+            "refinedCell_b",
+            "refinedCell_c",
+            "refinedCell_alpha",
+            "refinedCell_beta",
+            "refinedCell_gamma",
+        ),
+        "mergingStatistics": ("autoProcId",),
+    },
+    required=("autoProcId",),
+)
+
+CONTAINER = Projection(
+    crud.CONTAINER_COLUMNS,
+    {
+        "capacity": ("capacity",),
+        "code": ("code",),
+        "containerId": ("containerId",),
+        "containerType": ("containerType",),
+        "barcode": ("barcode",),
+    },
+    required=("containerId",),
+)
+
+DATA_COLLECTION = Projection(
+    crud.DATA_COLLECTION_COLUMNS,
+    {
+        "dcid": ("dataCollectionId",),
+        "filename": ("imageDirectory", "fileTemplate"),
+        "startTime": ("startTime",),
+        "endTime": ("endTime",),
+        "axisStart": ("axisStart",),
+        "axisEnd": ("axisEnd",),
+        "axisRange": ("axisRange",),
+        "overlap": ("overlap",),
+        "numberOfImages": ("numberOfImages",),
+        "startImageNumber": ("startImageNumber",),
+        "exposureTime": ("exposureTime",),
+        "sampleId": ("BLSAMPLEID",),
+        "rotationAxis": ("rotationAxis",),
+        "phiStart": ("phiStart",),
+        "kappaStart": ("kappaStart",),
+        "omegaStart": ("omegaStart",),
+        "chiStart": ("chiStart",),
+        "autoProcessings": ("dataCollectionId",),
+        "bestAutoProcessing": ("dataCollectionId",),
+        "autoProcessingSummary": ("dataCollectionId",),
+        "sample": ("BLSAMPLEID",),
+    },
+    required=("dataCollectionId", "endTime"),
+)
+
+SAMPLE = Projection(
+    crud.SAMPLE_COLUMNS,
+    {
+        "name": ("name",),
+        "sampleId": ("blSampleId",),
+        "dataCollections": ("blSampleId",),
+        "container": ("containerId",),
+    },
+    required=("blSampleId",),
+)
+
+VISIT = Projection(
+    crud.BLSESSION_COLUMNS,
+    {
+        "sessionId": ("sessionId",),
+        "name": ("proposalCode", "proposalNumber", "visit_number"),
+        "startTime": ("startDate",),
+        "endTime": ("endDate",),
+        "dataCollections": ("sessionId",),
+    },
+    required=("sessionId", "endDate"),
+)
@@ -1,18 +1,49 @@
 from __future__ import annotations
 
-import asyncio
 from typing import Optional
 
 import strawberry
+from graphql import GraphQLError
 from strawberry.arguments import UNSET
 
 from ispyb_graphql import crud, models
+from ispyb_graphql.api import cell_index
 
-from .data_collection import DataCollection, ScanType
-from .pagination import Connection, Edge, PageInfo
+from . import projections
+from .auto_processing import AutoProcessingResult, UnitCellInput
+from .data_collection import (
+    DataCollection,
+    DataCollectionOrder,
+    ScanType,
+    data_collection_connection,
+)
+from .pagination import Connection
 from .sample import Sample
 
 
+@strawberry.type
+class SimilarCell:
+    auto_processing: AutoProcessingResult
+    # Largest difference in a cell length, relative to the target's
+    length_difference: float
+    # Largest difference in a cell angle, in degrees
+    angle_difference: float
+
+    @strawberry.field
+    async def data_collection(self, info) -> DataCollection:
+        return await info.context["data_collections_loader"].load(
+            self.auto_processing.dcid
+        )
+
+    @classmethod
+    def from_match(cls, match: cell_index.Match):
+        return cls(
+            auto_processing=AutoProcessingResult.from_instance(match.row),
+            length_difference=match.length_difference,
+            angle_difference=match.angle_difference,
+        )
+
+
 @strawberry.type
 class Proposal:
     proposal_id: int
@@ -25,40 +56,55 @@ class Proposal:
         scan_type: ScanType = None,
         first: int = 10,
         after: Optional[strawberry.ID] = UNSET,
+        last: Optional[int] = UNSET,
+        before: Optional[strawberry.ID] = UNSET,
+        order_by: DataCollectionOrder = DataCollectionOrder.DCID,
     ) -> Connection[DataCollection]:
-
-        after = after if after is not UNSET else None
-        db = info.context["db"]
-        dcids = await crud.get_dcids_for_proposal(
-            db,
-            self.proposal_id,
+        return await data_collection_connection(
+            info,
+            first=first,
+            after=after if after is not UNSET else None,
+            last=last if last is not UNSET else None,
+            before=before if before is not UNSET else None,
+            order_by=order_by,
+            proposal_id=self.proposal_id,
             scan_type=scan_type.value if scan_type else None,
-            after=after,
-            limit=first + 1,
-        )
-        data_collections = await asyncio.gather(
-            *(info.context["data_collections_loader"].load(dcid) for dcid in dcids)
-        )
-
-        edges = [Edge(node=dc, cursor=dc.dcid) for dc in data_collections]
-        return Connection(
-            page_info=PageInfo(
-                has_previous_page=False,
-                has_next_page=len(data_collections) > first,
-                start_cursor=edges[0].cursor if edges else None,
-                end_cursor=edges[-2].cursor if len(edges) > 1 else None,
-            ),
-            edges=edges[
-                :-1
-            ],  # exclude last one as it was fetched to know if there is a next page
         )
 
     @strawberry.field
     async def samples(self, info) -> list[Sample]:
         db = info.context["db"]
-        samples = await crud.get_samples_for_proposal(db, self.proposal_id)
+        samples = await crud.get_samples_for_proposal(
+            db, self.proposal_id, columns=projections.SAMPLE.select(info)
+        )
         return [Sample.from_instance(sample) for sample in samples]
 
+    @strawberry.field
+    async def similar_cells(
+        self,
+        info,
+        to: UnitCellInput,
+        tolerance: float = 0.02,
+        angle_tolerance: float = 2.0,
+        limit: int = 100,
+    ) -> list[SimilarCell]:
+        """Processing results with cells similar to the given one, most similar
+        first: lengths within tolerance (relative) and angles within
+        angle_tolerance degrees"""
+        if min(to.a, to.b, to.c) <= 0:
+            raise GraphQLError("The lengths of the cell must be positive")
+        if not 0 < tolerance < 1:
+            raise GraphQLError("tolerance must be between 0 and 1")
+        if angle_tolerance < 0:
+            raise GraphQLError("angleTolerance must not be negative")
+        if limit < 0:
+            raise GraphQLError("limit must not be negative")
+        index = await cell_index.get_cell_indexes().get(
+            info.context["db"], self.proposal_id
+        )
+        matches = index.search(to.parameters(), tolerance, angle_tolerance)
+        return [SimilarCell.from_match(match) for match in matches[:limit]]
+
     @classmethod
     def from_instance(cls, instance: models.Proposal):
         return cls(
@@ -1,14 +1,19 @@
-import asyncio
 from typing import Optional
 
 import strawberry
 from strawberry.arguments import UNSET
 
-from ispyb_graphql import crud, models
+from ispyb_graphql.api.projection import projected_loader
 
+from . import projections
 from .container import Container
-from .data_collection import DataCollection, ScanType
-from .pagination import Connection, Edge, PageInfo
+from .data_collection import (
+    DataCollection,
+    DataCollectionOrder,
+    ScanType,
+    data_collection_connection,
+)
+from .pagination import Connection
 
 
 @strawberry.type
@@ -26,43 +31,35 @@ class Sample:
         scan_type: ScanType = None,
         first: int = 10,
         after: Optional[strawberry.ID] = UNSET,
+        last: Optional[int] = UNSET,
+        before: Optional[strawberry.ID] = UNSET,
+        order_by: DataCollectionOrder = DataCollectionOrder.DCID,
     ) -> Connection[DataCollection]:
-
-        after = after if after is not UNSET else None
-        db = info.context["db"]
-        dcids = await crud.get_dcids_for_sample(
-            db,
-            self.sample_id,
-            scan_type.value if scan_type else None,
-            after=after,
-            limit=first + 1,
-        )
-        data_collections = await asyncio.gather(
-            *(info.context["data_collections_loader"].load(dcid) for dcid in dcids)
-        )
-
-        edges = [Edge(node=dc, cursor=dc.dcid) for dc in data_collections]
-        return Connection(
-            page_info=PageInfo(
-                has_previous_page=False,
-                has_next_page=len(data_collections) > first,
-                start_cursor=edges[0].cursor if edges else None,
-                end_cursor=edges[-2].cursor if len(edges) > 1 else None,
-            ),
-            edges=edges[
-                :-1
-            ],  # exclude last one as it was fetched to know if there is a next page
+        return await data_collection_connection(
+            info,
+            first=first,
+            after=after if after is not UNSET else None,
+            last=last if last is not UNSET else None,
+            before=before if before is not UNSET else None,
+            order_by=order_by,
+            sample_id=self.sample_id,
+            scan_type=scan_type.value if scan_type else None,
         )
 
     @strawberry.field
     async def container(self, info) -> Container:
-        return await info.context["container_loader"].load(self.container_id)
+        projection = projections.CONTAINER
+        loader = projected_loader(
+            info, "container_loader", projection, projection.select(info)
+        )
+        return await loader.load(self.container_id)
 
     @classmethod
-    def from_instance(cls, instance: models.BLSample):
+    def from_instance(cls, row):
+        """Create a Sample from a row of (a projection of) the columns"""
         return cls(
-            name=instance.name,
-            sample_id=instance.blSampleId,
-            crystal_id=instance.crystalId,
-            container_id=instance.containerId,
+            name=getattr(row, "name", None),
+            sample_id=row.blSampleId,
+            crystal_id=getattr(row, "crystalId", None),
+            container_id=getattr(row, "containerId", None),
         )
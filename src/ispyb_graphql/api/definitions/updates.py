@@ -0,0 +1,25 @@
+from __future__ import annotations
+
+import strawberry
+
+from .auto_processing import AutoProcessingResult
+from .data_collection import DataCollection
+
+
+@strawberry.type
+class DataCollectionUpdates:
+    """Data collections and processing results added since the last update"""
+
+    data_collections: list[DataCollection]
+    auto_processings: list[AutoProcessingResult]
+
+    @classmethod
+    def from_rows(cls, data_collections, auto_processings):
+        return cls(
+            data_collections=[
+                DataCollection.from_instance(dc) for dc in data_collections
+            ],
+            auto_processings=[
+                AutoProcessingResult.from_instance(ap) for ap in auto_processings
+            ],
+        )
@@ -1,16 +1,18 @@
 from __future__ import annotations
 
-import asyncio
 import datetime
 from typing import Optional
 
 import strawberry
 from strawberry.arguments import UNSET
 
-from ispyb_graphql import crud, models
-
-from .data_collection import DataCollection, ScanType
-from .pagination import Connection, Edge, PageInfo
+from .data_collection import (
+    DataCollection,
+    DataCollectionOrder,
+    ScanType,
+    data_collection_connection,
+)
+from .pagination import Connection
 
 
 @strawberry.type
@@ -27,39 +29,31 @@ class Visit:
         scan_type: ScanType = None,
         first: int = 10,
         after: Optional[strawberry.ID] = UNSET,
+        last: Optional[int] = UNSET,
+        before: Optional[strawberry.ID] = UNSET,
+        order_by: DataCollectionOrder = DataCollectionOrder.DCID,
     ) -> Connection[DataCollection]:
-
-        after = after if after is not UNSET else None
-        db = info.context["db"]
-        dcids = await crud.get_dcids_for_blsession(
-            db,
-            self.session_id,
-            scan_type.value if scan_type else None,
-            after=after,
-            limit=first + 1,
-        )
-        data_collections = await asyncio.gather(
-            *(info.context["data_collections_loader"].load(dcid) for dcid in dcids)
-        )
-
-        edges = [Edge(node=dc, cursor=dc.dcid) for dc in data_collections]
-        return Connection(
-            page_info=PageInfo(
-                has_previous_page=False,
-                has_next_page=len(data_collections) > first,
-                start_cursor=edges[0].cursor if edges else None,
-                end_cursor=edges[-2].cursor if len(edges) > 1 else None,
-            ),
-            edges=edges[
-                :-1
-            ],  # exclude last one as it was fetched to know if there is a next page
+        return await data_collection_connection(
+            info,
+            first=first,
+            after=after if after is not UNSET else None,
+            last=last if last is not UNSET else None,
+            before=before if before is not UNSET else None,
+            order_by=order_by,
+            session_id=self.session_id,
+            scan_type=scan_type.value if scan_type else None,
         )
 
     @classmethod
-    def from_instance(cls, instance: models.BLSession):
+    def from_instance(cls, row):
+        """Create a Visit from a row of (a projection of) crud.BLSESSION_COLUMNS"""
         return cls(
-            session_id=instance.sessionId,
-            name=f"{instance.Proposal.proposalCode}{instance.Proposal.proposalNumber}-{instance.visit_number}",
-            start_time=instance.startDate,
-            end_time=instance.endDate,
+            session_id=row.sessionId,
+            name=(
+                f"{row.proposalCode}{row.proposalNumber}-{row.visit_number}"
+                if hasattr(row, "proposalCode")
+                else None
+            ),
+            start_time=getattr(row, "startDate", None),
+            end_time=getattr(row, "endDate", None),
         )
@@ -0,0 +1,61 @@
+from __future__ import annotations
+
+from typing import Optional
+
+from strawberry.extensions import Extension
+
+from ispyb_graphql import config
+from ispyb_graphql.cache import TTLCache
+
+
+class CachedDocument:
+    __slots__ = ("document", "validated")
+
+    def __init__(self, document):
+        self.document = document
+        self.validated = False
+
+
+class DocumentCacheExtension(Extension):
+    """Parse and validate each distinct query document only once
+
+    Documents are kept in a process-wide LRU cache keyed on the query text,
+    so that repeated operations (e.g. dashboards, persisted queries) skip
+    both parsing and validation. Only documents that parse are cached, and
+    they are only marked as validated if validation found no errors.
+    """
+
+    _documents: Optional[TTLCache] = None
+
+    def __init__(self, *, execution_context):
+        super().__init__(execution_context=execution_context)
+        self.cached: Optional[CachedDocument] = None
+
+    @classmethod
+    def documents(cls) -> TTLCache:
+        if cls._documents is None:
+            cls._documents = TTLCache(
+                maxsize=config.get_graphql_settings().document_cache_size, ttl=None
+            )
+        return cls._documents
+
+    def on_parsing_start(self):
+        execution_context = self.execution_context
+        self.cached = self.documents().get(execution_context.query)
+        if self.cached is not None:
+            execution_context.graphql_document = self.cached.document
+
+    def on_parsing_end(self):
+        execution_context = self.execution_context
+        if self.cached is None and execution_context.graphql_document is not None:
+            self.cached = CachedDocument(execution_context.graphql_document)
+            self.documents().set(execution_context.query, self.cached)
+
+    def on_validation_start(self):
+        if self.cached is not None and self.cached.validated:
+            # Validation is skipped when errors have already been set
+            self.execution_context.errors = []
+
+    def on_validation_end(self):
+        if self.cached is not None and not self.execution_context.errors:
+            self.cached.validated = True
@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+from typing import Collection, Optional, Sequence
+
+from ispyb_graphql import config
+from ispyb_graphql.cache import TTLCache, approximate_size
+
+DATA_COLLECTION = "DataCollection"
+AUTO_PROCESSING_RESULTS = "AutoProcessingResults"
+AUTO_PROC_SCALING_STATISTICS = "AutoProcScalingStatistics"
+
+_cache: Optional[TTLCache] = None
+
+
+def get_entity_cache() -> TTLCache:
+    """The process-wide cache of rows that no longer change
+
+    Entries are immutable SQLAlchemy Core rows (or tuples of rows) keyed on
+    (namespace(entity, columns), id), and are evicted in LRU order once their
+    approximate total size exceeds the configured number of bytes.
+    """
+    global _cache
+    if _cache is None:
+        _cache = TTLCache(
+            maxsize=config.get_cache_settings().entity_cache_max_bytes,
+            ttl=None,
+            getsizeof=approximate_size,
+        )
+    return _cache
+
+
+def set_entity_cache(cache: Optional[TTLCache]) -> None:
+    global _cache
+    _cache = cache
+
+
+def namespace(entity: str, columns: Sequence = ()) -> tuple[str, tuple[str, ...]]:
+    """Rows fetched with different column projections are cached separately"""
+    return (entity, tuple(column.key for column in columns))
+
+
+def invalidate(entities: Collection[str], keys: Collection[int]) -> None:
+    """Evict the rows of entities cached for any of keys, in one pass"""
+    if not keys:
+        return
+    entities, keys = set(entities), set(keys)
+    get_entity_cache().invalidate_where(
+        lambda cached: cached[1] in keys and cached[0][0] in entities
+    )
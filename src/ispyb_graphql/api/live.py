@@ -0,0 +1,205 @@
+"""Change detection for live updates on beamlines
+
+Rather than every client polling for new data collections, subscriptions to
+a beamline share one BeamlinePoller, which queries for data collections and
+processing results with ids greater than the highest seen so far once per
+interval, and fans the new rows out to all of the beamline's subscribers.
+However many clients are watching, a beamline costs one query per interval
+(per worker process), and none while nobody is watching.
+
+Ids are only compared to the highest seen, so a row committed after one with
+a higher id, by a transaction that started earlier, may be missed.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import logging
+from typing import AsyncIterator, Optional, Sequence
+
+from sqlalchemy.engine import Row
+
+from ispyb_graphql import config, crud, database
+from ispyb_graphql.api import entity_cache
+
+logger = logging.getLogger(__name__)
+
+Changes = tuple[Sequence[Row], Sequence[Row]]
+
+
+class SubscriberOverflow(Exception):
+    """A subscriber fell too far behind the updates published to it"""
+
+
+class Subscriber:
+    """The updates for one subscription, optionally restricted to a visit"""
+
+    def __init__(self, session_id: Optional[int] = None, maxsize: int = 100):
+        self.session_id = session_id
+        self.queue: asyncio.Queue[Changes] = asyncio.Queue(maxsize)
+        self.overflowed = False
+
+    def publish(
+        self, data_collections: Sequence[Row], auto_processings: Sequence[Row]
+    ) -> None:
+        if self.overflowed:
+            return
+        if self.session_id is not None:
+            data_collections = [
+                dc for dc in data_collections if dc.SESSIONID == self.session_id
+            ]
+            auto_processings = [
+                ap for ap in auto_processings if ap.SESSIONID == self.session_id
+            ]
+        if not data_collections and not auto_processings:
+            return
+        try:
+            self.queue.put_nowait((data_collections, auto_processings))
+        except asyncio.QueueFull:
+            # Updates were lost, so those still queued are of no use either
+            self.overflowed = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+
+    async def __aiter__(self) -> AsyncIterator[Changes]:
+        while True:
+            if self.overflowed:
+                raise SubscriberOverflow("Too many updates were not received in time")
+            yield await self.queue.get()
+
+
+class BeamlinePoller:
+    """Polls for rows added on a beamline on behalf of all its subscribers"""
+
+    def __init__(self, beamline: str, interval: float, batch_size: int):
+        self.beamline = beamline
+        self.interval = interval
+        self.batch_size = batch_size
+        self.subscribers: set[Subscriber] = set()
+        self.last_dcid: Optional[int] = None
+        self.last_auto_proc_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+
+    async def start(self) -> None:
+        """Start polling from the rows that exist now, unless already started"""
+        async with self._lock:
+            if self._task is not None:
+                return
+            db = await database.get_db_session()
+            try:
+                self.last_dcid, self.last_auto_proc_id = await crud.get_latest_ids(db)
+            finally:
+                await db.close()
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+    async def poll(self) -> Changes:
+        """Fetch the rows added since the last poll and advance past them"""
+        db = await database.get_db_session()
+        try:
+            data_collections = await crud.get_new_data_collections(
+                db, self.beamline, after=self.last_dcid, limit=self.batch_size
+            )
+            auto_processings = await crud.get_new_auto_processing_results(
+                db, self.beamline, after=self.last_auto_proc_id, limit=self.batch_size
+            )
+        finally:
+            await db.close()
+        if len(auto_processings) == self.batch_size:
+            # A processing result may be integrated from several data
+            # collections; leave the last one, which may be incomplete, for
+            # the next poll
+            last = auto_processings[-1].autoProcId
+            complete = [ap for ap in auto_processings if ap.autoProcId != last]
+            auto_processings = complete or auto_processings
+        if data_collections:
+            self.last_dcid = data_collections[-1].dataCollectionId
+        if auto_processings:
+            self.last_auto_proc_id = auto_processings[-1].autoProcId
+        return data_collections, auto_processings
+
+    def publish(
+        self, data_collections: Sequence[Row], auto_processings: Sequence[Row]
+    ) -> None:
+        # Results cached for these data collections are now out of date
+        entity_cache.invalidate(
+            (entity_cache.AUTO_PROCESSING_RESULTS,),
+            {ap.dataCollectionId for ap in auto_processings},
+        )
+        for subscriber in list(self.subscribers):
+            subscriber.publish(data_collections, auto_processings)
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                changes = await self.poll()
+            except Exception:
+                logger.exception(
+                    "Polling beamline %s for updates failed", self.beamline
+                )
+            else:
+                self.publish(*changes)
+
+
+class LiveUpdates:
+    """The pollers of the beamlines currently subscribed to"""
+
+    def __init__(self, interval: float, batch_size: int, queue_size: int):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self.pollers: dict[str, BeamlinePoller] = {}
+
+    @contextlib.asynccontextmanager
+    async def subscribe(
+        self, beamline: str, session_id: Optional[int] = None
+    ) -> AsyncIterator[Subscriber]:
+        """Subscribe to the rows added on a beamline, or one of its visits
+
+        The beamline's poller is started by its first subscriber and stopped
+        once the last one has unsubscribed.
+        """
+        poller = self.pollers.get(beamline)
+        if poller is None:
+            poller = BeamlinePoller(beamline, self.interval, self.batch_size)
+            self.pollers[beamline] = poller
+        subscriber = Subscriber(session_id, self.queue_size)
+        poller.subscribers.add(subscriber)
+        try:
+            await poller.start()
+            yield subscriber
+        finally:
+            poller.subscribers.discard(subscriber)
+            if not poller.subscribers:
+                if self.pollers.get(beamline) is poller:
+                    del self.pollers[beamline]
+                await poller.stop()
+
+
+_live_updates: Optional[LiveUpdates] = None
+
+
+def get_live_updates() -> LiveUpdates:
+    global _live_updates
+    if _live_updates is None:
+        settings = config.get_graphql_settings()
+        _live_updates = LiveUpdates(
+            interval=settings.live_poll_interval,
+            batch_size=settings.live_poll_batch_size,
+            queue_size=settings.live_subscriber_queue_size,
+        )
+    return _live_updates
+
+
+def set_live_updates(live_updates: Optional[LiveUpdates]) -> None:
+    global _live_updates
+    _live_updates = live_updates
@@ -3,12 +3,22 @@ from __future__ import annotations
 import typing
 
 from fastapi import Request, WebSocket
-from fastapi.responses import HTMLResponse
 from strawberry.permission import BasePermission
 from strawberry.types import Info
 
 from ispyb_graphql import crud
 
+from .access import AccessIndex, get_access_indexes
+
+
+async def get_access_index(fedid: str) -> AccessIndex:
+    return await get_access_indexes().get(fedid)
+
+
+async def is_authorized_for_beamline(fedid: str, name: str) -> bool:
+    index = await get_access_index(fedid)
+    return index.is_beamline_admin(name)
+
 
 class IsAuthenticatedForProposal(BasePermission):
     message = "User is not authenticated"
@@ -20,12 +30,10 @@ class IsAuthenticatedForProposal(BasePermission):
 
         user = request.session.get("user")
         if not user:
-            return HTMLResponse(
-                'Login required. <a href="/login">Login</a>', status_code=403
-            )
+            return False
 
-        db = info.context["db"]
-        return await crud.proposal_has_person(db, name, user["user"])
+        index = await get_access_index(user["user"])
+        return index.is_on_proposal(crud.proposal_code_and_number_from_name(name))
 
 
 class IsAuthenticatedForBeamline(BasePermission):
@@ -40,8 +48,7 @@ class IsAuthenticatedForBeamline(BasePermission):
         if not user:
             return False
 
-        db = info.context["db"]
-        return await crud.user_is_admin_for_beamline(db, user["user"], name)
+        return await is_authorized_for_beamline(user["user"], name)
 
 
 class IsAuthenticatedForVisit(BasePermission):
@@ -53,13 +60,61 @@ class IsAuthenticatedForVisit(BasePermission):
         request: typing.Union[Request, WebSocket] = info.context["request"]
 
         user = request.session.get("user")
-        print(f"{user=}")
         if not user:
             return False
 
-        db = info.context["db"]
-        blsession = await crud.get_blsession(db, name)
-        is_admin = await crud.user_is_admin_for_beamline(
-            db, user, blsession.beamLineName
+        index = await get_access_index(user["user"])
+        visit = crud.proposal_code_number_and_visit_number_from_name(name)
+        if index.is_on_session(visit):
+            return True
+        if not index.admin_types:
+            return False
+        # Beamline admins may see all of their beamlines' visits. The session
+        # is loaded by the loader the resolver then reads it from.
+        try:
+            blsession = await info.context["blsession_loader"].load(visit)
+        except LookupError:
+            return False
+        return index.is_beamline_admin(blsession.beamLineName)
+
+
+class IsAuthenticatedForSample(BasePermission):
+    message = "User is not authenticated"
+
+    async def has_permission(
+        self, source: typing.Any, info: Info, *, sampleId: str, **kwargs
+    ) -> bool:
+        # Arguments are passed by their GraphQL names
+        request: typing.Union[Request, WebSocket] = info.context["request"]
+
+        user = request.session.get("user")
+        if not user:
+            return False
+
+        index = await get_access_index(user["user"])
+        proposal = await crud.get_proposal_for_sample(info.context["db"], int(sampleId))
+        return proposal is not None and index.is_on_proposal(tuple(proposal))
+
+
+class IsAuthenticatedForDataCollection(BasePermission):
+    message = "User is not authenticated"
+
+    async def has_permission(
+        self, source: typing.Any, info: Info, *, dcid: str, **kwargs
+    ) -> bool:
+        request: typing.Union[Request, WebSocket] = info.context["request"]
+
+        user = request.session.get("user")
+        if not user:
+            return False
+
+        index = await get_access_index(user["user"])
+        visit = await crud.get_visit_for_data_collection(info.context["db"], int(dcid))
+        if visit is None:
+            return False
+        code, number, visit_number, beamline = visit
+        return (
+            index.is_on_proposal((code, number))
+            or index.is_on_session((code, number, visit_number))
+            or index.is_beamline_admin(beamline)
         )
-        return is_admin or await crud.session_has_person(db, name, user["user"])
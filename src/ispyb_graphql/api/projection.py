@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+import functools
+from typing import Any, Iterable, Mapping, Sequence
+
+from strawberry.types.nodes import SelectedField
+
+from .dataloaders import IDLoader
+
+
+def _flatten(selections: Iterable[Any]) -> list[SelectedField]:
+    """Expand fragment spreads and inline fragments into their fields"""
+    fields = []
+    for selection in selections:
+        if isinstance(selection, SelectedField):
+            fields.append(selection)
+        else:
+            fields.extend(_flatten(selection.selections))
+    return fields
+
+
+def descend(selections: Iterable[Any], *path: str) -> list[SelectedField]:
+    """The fields selected below the fields named by path"""
+    fields = _flatten(selections)
+    for name in path:
+        fields = _flatten(
+            child
+            for field in fields
+            if field.name == name
+            for child in field.selections
+        )
+    return fields
+
+
+def field_names(selections: Iterable[Any]) -> set[str]:
+    return {field.name for field in _flatten(selections)}
+
+
+def selections(info, *path: str) -> list[SelectedField]:
+    """The fields selected on the result of the current field
+
+    With a path, descend through the named fields first, e.g.
+    selections(info, "edges", "node") for the nodes of a connection.
+    """
+    return descend(
+        (selection for field in info.selected_fields for selection in field.selections),
+        *path,
+    )
+
+
+def selected_fields(info, *path: str) -> set[str]:
+    """The names of the fields selected on the result of the current field"""
+    return field_names(selections(info, *path))
+
+
+class Projection:
+    """Maps the fields of a GraphQL type onto the columns they are read from
+
+    `fields` gives the column keys each field needs, including fields with a
+    resolver that only needs e.g. an id. Columns in `required` are always
+    selected. Projections are returned in the order of `columns`, so that the
+    same selection always gives the same (hashable) tuple of columns.
+    """
+
+    def __init__(
+        self,
+        columns: Sequence[Any],
+        fields: Mapping[str, Sequence[str]],
+        required: Sequence[str] = (),
+    ):
+        self.columns = tuple(columns)
+        self.fields = fields
+        self.required = tuple(required)
+
+    def columns_for(self, names: Iterable[str], extra: Sequence[str] = ()) -> tuple:
+        keys = {*self.required, *extra}
+        for name in names:
+            keys.update(self.fields.get(name, ()))
+        return tuple(column for column in self.columns if column.key in keys)
+
+    def select(self, info, *path: str, extra: Sequence[str] = ()) -> tuple:
+        """The columns needed for the fields selected below the current field"""
+        return self.columns_for(selected_fields(info, *path), extra=extra)
+
+
+def projected_loader(
+    info, name: str, projection: Projection, columns: tuple
+) -> IDLoader:
+    """The request's loader `name`, restricted to fetching only `columns`
+
+    The loader's load function must accept the columns to fetch as a keyword
+    argument. Loads for the same projection are batched together, and the full
+    projection is the loader itself.
+    """
+    loader = info.context[name]
+    if columns == projection.columns:
+        return loader
+    loaders = info.context.setdefault("projected_loaders", {})
+    key = (name, columns)
+    if key not in loaders:
+        loaders[key] = IDLoader(
+            functools.partial(loader.batch_load_fn, columns=columns)
+        )
+    return loaders[key]
@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+import datetime
+import hashlib
+import json
+from typing import Any, Optional
+
+from graphql import ExecutionResult, print_ast
+from strawberry.extensions import Extension
+
+from ispyb_graphql import config
+from ispyb_graphql.cache import TTLCache
+
+
+class CachePolicy:
+    """Decides how long the response to an operation may be cached
+
+    Resolvers report the data they returned: either the end of the visit or
+    time window it covers, or that it is open-ended. A response may only be
+    cached if everything in it is closed, i.e. ended more than grace_period
+    ago; such data almost never changes, so it is kept for closed_ttl.
+    Anything open, or an operation that reported nothing, is cached for
+    open_ttl, which by default means not at all.
+    """
+
+    def __init__(self, closed_ttl: int, open_ttl: int, grace_period: int):
+        self.closed_ttl = closed_ttl
+        self.open_ttl = open_ttl
+        self.grace_period = datetime.timedelta(seconds=grace_period)
+        self.observed = False
+        self.open = False
+
+    def observe_open(self) -> None:
+        self.observed = True
+        self.open = True
+
+    def observe_end_time(self, end_time: Optional[datetime.datetime]) -> None:
+        if end_time is None or end_time + self.grace_period > datetime.datetime.now():
+            self.observe_open()
+        else:
+            self.observed = True
+
+    @property
+    def ttl(self) -> int:
+        if not self.observed or self.open:
+            return self.open_ttl
+        return self.closed_ttl
+
+
+class InMemoryBackend:
+    """A process-local, size-bounded LRU response cache"""
+
+    def __init__(self, maxsize: int):
+        self.responses = TTLCache(maxsize=maxsize, ttl=None)
+
+    async def get(self, key: str) -> Optional[dict[str, Any]]:
+        return self.responses.get(key)
+
+    async def set(self, key: str, data: dict[str, Any], ttl: int) -> None:
+        self.responses.set(key, data, ttl=ttl)
+
+
+class SharedBackend:
+    """A response cache shared between workers, e.g. in Redis
+
+    The client needs only async get(key) and set(key, value, ex=ttl) methods,
+    as provided by redis.asyncio.Redis.
+    """
+
+    def __init__(self, client, prefix: str = "ispyb-graphql:response:"):
+        self.client = client
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url: str) -> SharedBackend:
+        try:
+            import redis.asyncio
+        except ImportError:
+            raise RuntimeError("The shared response cache requires the redis package")
+        return cls(redis.asyncio.from_url(url))
+
+    async def get(self, key: str) -> Optional[dict[str, Any]]:
+        value = await self.client.get(self.prefix + key)
+        return json.loads(value) if value is not None else None
+
+    async def set(self, key: str, data: dict[str, Any], ttl: int) -> None:
+        await self.client.set(self.prefix + key, json.dumps(data), ex=ttl)
+
+
+def response_cache_key(
+    document, operation_name: Optional[str], variables, scope: Optional[str]
+) -> str:
+    payload = json.dumps(
+        [print_ast(document), operation_name, variables or {}, scope],
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class ResponseCacheExtension(Extension):
+    """Serve repeated operations over closed (historic) data from a cache
+
+    Responses are keyed on the normalized document, the operation name and
+    variables, and the user the response was authorized for, and are stored
+    for as long as the request's CachePolicy allows. A hit skips execution
+    entirely, and with it every database query and permission check, so a
+    user's responses are kept no longer than their access index, after which
+    access that was revoked is noticed.
+    """
+
+    _backend = None
+
+    def __init__(self, *, execution_context):
+        super().__init__(execution_context=execution_context)
+        self.key: Optional[str] = None
+        self.scope: Optional[str] = None
+        self.hit = False
+
+    @classmethod
+    def backend(cls):
+        if cls._backend is None:
+            settings = config.get_graphql_settings()
+            if settings.response_cache_url:
+                cls._backend = SharedBackend.from_url(settings.response_cache_url)
+            else:
+                cls._backend = InMemoryBackend(settings.response_cache_size)
+        return cls._backend
+
+    @classmethod
+    def set_backend(cls, backend) -> None:
+        cls._backend = backend
+
+    def authorization_scope(self) -> Optional[str]:
+        request = (self.execution_context.context or {}).get("request")
+        if request is None:
+            return None
+        user = request.session.get("user")
+        return user["user"] if user else None
+
+    async def on_executing_start(self):
+        execution_context = self.execution_context
+        if execution_context.result is not None:
+            return
+        self.scope = self.authorization_scope()
+        self.key = response_cache_key(
+            execution_context.graphql_document,
+            execution_context.operation_name,
+            execution_context.variables,
+            self.scope,
+        )
+        data = await self.backend().get(self.key)
+        if data is not None:
+            self.hit = True
+            execution_context.result = ExecutionResult(data=data)
+
+    async def on_executing_end(self):
+        execution_context = self.execution_context
+        result = execution_context.result
+        if self.hit or self.key is None or result is None or result.errors:
+            return
+        ttl = execution_context.context["cache_policy"].ttl
+        if self.scope is not None:
+            ttl = min(
+                ttl, int(config.get_cache_settings().access_index_refresh_interval)
+            )
+        if ttl > 0:
+            await self.backend().set(self.key, result.data, ttl)
+
+    def get_results(self):
+        if self.key is None:
+            return {}
+        return {"responseCache": {"hit": self.hit}}
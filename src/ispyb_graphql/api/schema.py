@@ -1,31 +1,65 @@
 from __future__ import annotations
 
+import datetime
 import functools
+from typing import AsyncGenerator, Optional
 
 import strawberry
-from strawberry.dataloader import DataLoader
 from strawberry.extensions import Extension
 
-from ispyb_graphql import crud
-from ispyb_graphql.database import get_db_session
+from ispyb_graphql import config, crud
+from ispyb_graphql.database import ConcurrentRequestSession, RequestSession
 
+from . import live
+from .cost import QueryCostExtension, check_subscription_cost
+from .dataloaders import IDLoader, Loader
 from .definitions import (
     Beamline,
     DataCollection,
+    DataCollectionUpdates,
     Proposal,
     Sample,
     Visit,
     load_auto_processings,
+    load_blsessions,
     load_containers,
     load_data_collections,
     load_merging_statistics,
+    load_proposals,
     load_samples,
+    projections,
 )
+from .definitions.data_collection import (
+    DataCollectionOrder,
+    ScanType,
+    stream_data_collection_connection,
+)
+from .definitions.pagination import Connection
+from .document_cache import DocumentCacheExtension
 from .permissions import (
     IsAuthenticatedForBeamline,
+    IsAuthenticatedForDataCollection,
     IsAuthenticatedForProposal,
+    IsAuthenticatedForSample,
     IsAuthenticatedForVisit,
 )
+from .projection import projected_loader
+from .response_cache import CachePolicy, ResponseCacheExtension
+from .tracing import TracingExtension
+
+
+def load_proposal(info, name: str):
+    """Load a proposal's row, batched with the other proposals of the operation"""
+    return info.context["proposal_loader"].load(
+        crud.proposal_code_and_number_from_name(name)
+    )
+
+
+def load_visit(info, name: str):
+    """Load a visit's session row, which its authorization check may have loaded"""
+    return info.context["blsession_loader"].load(
+        crud.proposal_code_number_and_visit_number_from_name(name)
+    )
 
 
 @strawberry.type
@@ -36,8 +70,8 @@ class Query:
         info,
         name: strawberry.ID,
     ) -> Proposal:
-        db = info.context["db"]
-        proposal = await crud.get_proposal(db, name=name)
+        info.context["cache_policy"].observe_open()
+        proposal = await load_proposal(info, name)
         return Proposal.from_instance(proposal)
 
     @strawberry.field(permission_classes=[IsAuthenticatedForVisit])
@@ -46,8 +80,8 @@ class Query:
         info,
         name: strawberry.ID,
     ) -> Visit:
-        db = info.context["db"]
-        session = await crud.get_blsession(db, name=name)
+        session = await load_visit(info, name)
+        info.context["cache_policy"].observe_end_time(session.endDate)
         return Visit.from_instance(session)
 
     @strawberry.field(permission_classes=[IsAuthenticatedForBeamline])
@@ -58,66 +92,302 @@ class Query:
     ) -> Beamline:
         return Beamline(name=name)
 
-    @strawberry.field
+    @strawberry.field(permission_classes=[IsAuthenticatedForDataCollection])
     async def data_collection(
         self,
         info,
         dcid: strawberry.ID,
     ) -> DataCollection:
-        return await info.context["data_collections_loader"].load(dcid)
+        loader = projected_loader(
+            info,
+            "data_collections_loader",
+            projections.DATA_COLLECTION,
+            projections.DATA_COLLECTION.select(info),
+        )
+        data_collection = await loader.load(dcid)
+        info.context["cache_policy"].observe_end_time(data_collection.end_time)
+        return data_collection
 
-    @strawberry.field
+    @strawberry.field(permission_classes=[IsAuthenticatedForSample])
     async def sample(
         self,
         info,
         sample_id: strawberry.ID,
     ) -> Sample:
-        return await info.context["sample_loader"].load(sample_id)
+        info.context["cache_policy"].observe_open()
+        loader = projected_loader(
+            info, "sample_loader", projections.SAMPLE, projections.SAMPLE.select(info)
+        )
+        return await loader.load(sample_id)
+
+
+async def start_subscription(info, permission_class, **kwargs) -> None:
+    """Set up the context of a subscription and check it is permitted
+
+    Subscriptions are executed without extensions, and all those on a
+    websocket connection share its context, so the first one sets up the
+    database session and loaders, and each checks its own cost.
+    """
+    check_subscription_cost(info)
+    if "db" not in info.context:
+        info.context.update(operation_context())
+    permission = permission_class()
+    if not await permission.has_permission(None, info, **kwargs):
+        raise PermissionError(permission.message)
+
+
+async def stream_pages(
+    info, chunk_size: int, **kwargs
+) -> AsyncGenerator[Connection[DataCollection], None]:
+    """Stream pages of data collections, releasing resources between pages
+
+    Once a page (and its nested fields) has been sent, the connection is
+    returned to the pool and the loaders are replaced, so that neither is held,
+    nor grows, for the duration of the subscription.
+    """
+    chunk_size = max(
+        1, min(chunk_size, config.get_graphql_settings().max_subscription_chunk_size)
+    )
+    context = info.context
+    try:
+        async for page in stream_data_collection_connection(info, chunk_size, **kwargs):
+            yield page
+            await context["db"].close()
+            context.update(create_loaders(context["db"]))
+    finally:
+        await context["db"].close()
+
+
+async def live_updates(
+    info, beamline: str, session_id: Optional[int] = None
+) -> AsyncGenerator[DataCollectionUpdates, None]:
+    """Relay the rows added on a beamline, or one of its visits, as they appear
+
+    The rows are fetched by the beamline's shared poller; only nested fields
+    are resolved per subscription, with fresh loaders for each update. No
+    connection is held while waiting for updates.
+    """
+    context = info.context
+    await context["db"].close()
+    try:
+        async with live.get_live_updates().subscribe(
+            beamline, session_id=session_id
+        ) as subscriber:
+            async for data_collections, auto_processings in subscriber:
+                yield DataCollectionUpdates.from_rows(
+                    data_collections, auto_processings
+                )
+                await context["db"].close()
+                context.update(create_loaders(context["db"]))
+    finally:
+        await context["db"].close()
+
+
+@strawberry.type
+class Subscription:
+    """Data collections delivered incrementally, or as they are added
+
+    The *DataCollections fields resolve to a series of Connection pages of up
+    to chunk_size edges, for up to `first` edges in total (all by default). A
+    page is only fetched once the previous one has been sent, so results start
+    arriving straight away and nested fields such as autoProcessings are
+    resolved per page rather than for the whole result at once.
+
+    The *Updates fields push the data collections and processing results
+    added from then on, see live.py.
+    """
+
+    @strawberry.subscription
+    async def beamline_data_collections(
+        self,
+        info,
+        name: strawberry.ID,
+        start_time: Optional[datetime.datetime] = None,
+        end_time: Optional[datetime.datetime] = None,
+        scan_type: Optional[ScanType] = None,
+        first: Optional[int] = None,
+        after: Optional[strawberry.ID] = None,
+        order_by: DataCollectionOrder = DataCollectionOrder.DCID,
+        chunk_size: int = 50,
+    ) -> AsyncGenerator[Connection[DataCollection], None]:
+        await start_subscription(info, IsAuthenticatedForBeamline, name=name)
+        return stream_pages(
+            info,
+            chunk_size,
+            first=first,
+            after=after,
+            order_by=order_by,
+            beamline=name,
+            start_time=start_time,
+            end_time=end_time or datetime.datetime.now(),
+            scan_type=scan_type.value if scan_type else None,
+        )
+
+    @strawberry.subscription
+    async def visit_data_collections(
+        self,
+        info,
+        name: strawberry.ID,
+        scan_type: Optional[ScanType] = None,
+        first: Optional[int] = None,
+        after: Optional[strawberry.ID] = None,
+        order_by: DataCollectionOrder = DataCollectionOrder.DCID,
+        chunk_size: int = 50,
+    ) -> AsyncGenerator[Connection[DataCollection], None]:
+        await start_subscription(info, IsAuthenticatedForVisit, name=name)
+        session = await load_visit(info, name)
+        return stream_pages(
+            info,
+            chunk_size,
+            first=first,
+            after=after,
+            order_by=order_by,
+            session_id=session.sessionId,
+            scan_type=scan_type.value if scan_type else None,
+        )
+
+    @strawberry.subscription
+    async def proposal_data_collections(
+        self,
+        info,
+        name: strawberry.ID,
+        scan_type: Optional[ScanType] = None,
+        first: Optional[int] = None,
+        after: Optional[strawberry.ID] = None,
+        order_by: DataCollectionOrder = DataCollectionOrder.DCID,
+        chunk_size: int = 50,
+    ) -> AsyncGenerator[Connection[DataCollection], None]:
+        await start_subscription(info, IsAuthenticatedForProposal, name=name)
+        proposal = await load_proposal(info, name)
+        return stream_pages(
+            info,
+            chunk_size,
+            first=first,
+            after=after,
+            order_by=order_by,
+            proposal_id=proposal.proposalId,
+            scan_type=scan_type.value if scan_type else None,
+        )
+
+    @strawberry.subscription
+    async def sample_data_collections(
+        self,
+        info,
+        sample_id: strawberry.ID,
+        scan_type: Optional[ScanType] = None,
+        first: Optional[int] = None,
+        after: Optional[strawberry.ID] = None,
+        order_by: DataCollectionOrder = DataCollectionOrder.DCID,
+        chunk_size: int = 50,
+    ) -> AsyncGenerator[Connection[DataCollection], None]:
+        await start_subscription(info, IsAuthenticatedForSample, sampleId=sample_id)
+        return stream_pages(
+            info,
+            chunk_size,
+            first=first,
+            after=after,
+            order_by=order_by,
+            sample_id=int(sample_id),
+            scan_type=scan_type.value if scan_type else None,
+        )
+
+    @strawberry.subscription
+    async def beamline_updates(
+        self, info, name: strawberry.ID
+    ) -> AsyncGenerator[DataCollectionUpdates, None]:
+        """Data collections and processing results as they are added"""
+        await start_subscription(info, IsAuthenticatedForBeamline, name=name)
+        return live_updates(info, name)
+
+    @strawberry.subscription
+    async def visit_updates(
+        self, info, name: strawberry.ID
+    ) -> AsyncGenerator[DataCollectionUpdates, None]:
+        """Data collections and processing results as they are added"""
+        await start_subscription(info, IsAuthenticatedForVisit, name=name)
+        session = await load_visit(info, name)
+        return live_updates(info, session.beamLineName, session_id=session.sessionId)
+
+
+def create_loaders(db) -> dict:
+    return {
+        "auto_processing_loader": IDLoader(
+            functools.partial(
+                load_auto_processings,
+                db,
+            )
+        ),
+        "data_collections_loader": IDLoader(
+            functools.partial(
+                load_data_collections,
+                db,
+            )
+        ),
+        "merging_statistics_loader": IDLoader(
+            functools.partial(
+                load_merging_statistics,
+                db,
+            )
+        ),
+        "sample_loader": IDLoader(
+            functools.partial(
+                load_samples,
+                db,
+            )
+        ),
+        "container_loader": IDLoader(
+            functools.partial(
+                load_containers,
+                db,
+            )
+        ),
+        "blsession_loader": Loader(functools.partial(load_blsessions, db)),
+        "proposal_loader": Loader(functools.partial(load_proposals, db)),
+        "projected_loaders": {},
+    }
+
+
+def operation_context() -> dict:
+    """The database session, loaders and cache policy for one operation"""
+    settings = config.get_database_settings()
+    if settings.concurrent_sessions:
+        db = ConcurrentRequestSession(settings.max_concurrent_sessions)
+    else:
+        db = RequestSession(read_only_snapshot=settings.read_only_snapshot)
+    graphql_settings = config.get_graphql_settings()
+    return {
+        "db": db,
+        "cache_policy": CachePolicy(
+            closed_ttl=graphql_settings.response_cache_closed_ttl,
+            open_ttl=graphql_settings.response_cache_open_ttl,
+            grace_period=graphql_settings.response_cache_grace_period,
+        ),
+        **create_loaders(db),
+    }
 
 
 class ISPyBGraphQLExtension(Extension):
     async def on_request_start(self):
-        db = await get_db_session()
         if self.execution_context.context is None:
             self.execution_context.context = {}
-        self.execution_context.context.update(
-            {
-                "db": db,
-                "auto_processing_loader": DataLoader(
-                    functools.partial(
-                        load_auto_processings,
-                        db,
-                    )
-                ),
-                "data_collections_loader": DataLoader(
-                    functools.partial(
-                        load_data_collections,
-                        db,
-                    )
-                ),
-                "merging_statistics_loader": DataLoader(
-                    functools.partial(
-                        load_merging_statistics,
-                        db,
-                    )
-                ),
-                "sample_loader": DataLoader(
-                    functools.partial(
-                        load_samples,
-                        db,
-                    )
-                ),
-                "container_loader": DataLoader(
-                    functools.partial(
-                        load_containers,
-                        db,
-                    )
-                ),
-            }
-        )
+        self.execution_context.context.update(operation_context())
+
+    async def on_executing_end(self):
+        # Release the connection as soon as the last resolver has finished
+        await self.execution_context.context["db"].close()
 
     async def on_request_end(self):
         await self.execution_context.context["db"].close()
 
 
-schema = strawberry.Schema(Query, extensions=[ISPyBGraphQLExtension])
+schema = strawberry.Schema(
+    Query,
+    subscription=Subscription,
+    extensions=[
+        TracingExtension,
+        DocumentCacheExtension,
+        ISPyBGraphQLExtension,
+        ResponseCacheExtension,
+        QueryCostExtension,
+    ],
+)
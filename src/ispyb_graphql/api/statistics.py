@@ -0,0 +1,127 @@
+"""Ranking, filtering and summarising processing results by merging statistics
+
+The statistics of one shell for a set of processing results are held by
+column, so that each threshold or ranking is a single pass over one list
+rather than a lookup per result and statistic. Results without statistics for
+the shell, or with a missing value, fail any threshold on it and are never
+ranked best by it.
+"""
+
+from __future__ import annotations
+
+import operator
+from typing import Any, Callable, Iterable, Optional, Sequence
+
+# Statistics by MergingStatistics attribute
+COLUMNS = (
+    "d_min",
+    "d_max",
+    "r_merge",
+    "mean_isigi",
+    "completeness",
+    "multiplicity",
+    "anomalous_completeness",
+    "anomalous_multiplicity",
+    "cc_half",
+    "cc_anom",
+)
+
+# Whether a higher value of each statistic is better
+HIGHER_IS_BETTER = {
+    "d_min": False,
+    "d_max": True,
+    "r_merge": False,
+    "mean_isigi": True,
+    "completeness": True,
+    "multiplicity": True,
+    "anomalous_completeness": True,
+    "anomalous_multiplicity": True,
+    "cc_half": True,
+    "cc_anom": True,
+}
+
+Condition = tuple[str, Callable[[Any, Any], bool], Any]
+
+
+def at_least(column: str, value: Any) -> Condition:
+    return (column, operator.ge, value)
+
+
+def at_most(column: str, value: Any) -> Condition:
+    return (column, operator.le, value)
+
+
+class StatisticsTable:
+    """The merging statistics of one shell for a list of processing results
+
+    columns maps each statistic to its values for the results, in order.
+    """
+
+    def __init__(self, results: Sequence, columns: dict[str, list]):
+        self.results = list(results)
+        self.columns = columns
+
+    @classmethod
+    def from_results(
+        cls, results: Sequence, statistics: Sequence[Iterable], shell: str
+    ) -> StatisticsTable:
+        """Take the statistics of each result, given in the same order, in shell"""
+        in_shell = [
+            next((ms for ms in result_statistics if ms.shell == shell), None)
+            for result_statistics in statistics
+        ]
+        return cls(
+            results,
+            {
+                column: [getattr(ms, column, None) for ms in in_shell]
+                for column in COLUMNS
+            },
+        )
+
+    def __len__(self) -> int:
+        return len(self.results)
+
+    def take(self, indices: Sequence[int]) -> StatisticsTable:
+        return StatisticsTable(
+            [self.results[i] for i in indices],
+            {
+                column: [values[i] for i in indices]
+                for column, values in self.columns.items()
+            },
+        )
+
+    def mask(self, conditions: Iterable[Condition]) -> list[bool]:
+        """Whether each result meets all of the conditions"""
+        mask = [True] * len(self)
+        for column, compare, threshold in conditions:
+            mask = [
+                selected and value is not None and compare(value, threshold)
+                for selected, value in zip(mask, self.columns[column])
+            ]
+        return mask
+
+    def where(self, conditions: Iterable[Condition]) -> StatisticsTable:
+        return self.take(
+            [i for i, selected in enumerate(self.mask(conditions)) if selected]
+        )
+
+    def best_index(self, column: str) -> Optional[int]:
+        """The index of the result with the best value of column, if any"""
+        values = self.columns[column]
+        candidates = [i for i, value in enumerate(values) if value is not None]
+        if not candidates:
+            return None
+        choose = max if HIGHER_IS_BETTER[column] else min
+        return choose(candidates, key=values.__getitem__)
+
+    def best(self, column: str) -> Any:
+        """The best value of column, or None if no result has one"""
+        index = self.best_index(column)
+        return None if index is None else self.columns[column][index]
+
+    def group_by(self, keys: Sequence) -> dict[Any, StatisticsTable]:
+        """Split the table by the given key of each result, in order of first key"""
+        indices: dict[Any, list[int]] = {}
+        for i, key in enumerate(keys):
+            indices.setdefault(key, []).append(i)
+        return {key: self.take(group) for key, group in indices.items()}
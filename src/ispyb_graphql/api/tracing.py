@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import logging
+import random
+from inspect import isawaitable
+from typing import Optional
+
+from strawberry.extensions import Extension
+from strawberry.extensions.tracing.utils import should_skip_tracing
+
+from ispyb_graphql import config, metrics, tracing
+
+logger = logging.getLogger(__name__)
+
+
+class TracingExtension(Extension):
+    """Trace a sample of operations, and report their likely N+1 queries
+
+    Operations are sampled at the configured tracing_sample_rate. For those
+    traced, each resolver (other than of plain attributes), DataLoader batch
+    and SQL statement is recorded as a span, and the trace is handed to the
+    exporter when the operation ends. A statement shape run more than
+    tracing_n_plus_one_threshold times by an operation is logged as a warning.
+    Operations that are not traced only pay for the sampling decision.
+    """
+
+    def __init__(self, *, execution_context):
+        super().__init__(execution_context=execution_context)
+        self.trace: Optional[tracing.Trace] = None
+        self._token = None
+
+    def on_request_start(self):
+        settings = config.get_graphql_settings()
+        rate = settings.tracing_sample_rate
+        if not rate or random.random() >= rate:
+            return
+        metrics.GRAPHQL_TRACED_OPERATIONS.inc()
+        self.trace = tracing.Trace(
+            self.execution_context.operation_name or "GraphQL operation",
+            max_spans=settings.tracing_max_spans,
+        )
+        self._token = tracing.activate(self.trace)
+
+    def on_request_end(self):
+        if self.trace is None:
+            return
+        tracing.deactivate(self._token)
+        trace = self.trace
+        trace.finish(self.execution_context.operation_name)
+        if trace.dropped_spans:
+            trace.root.attributes["dropped_spans"] = trace.dropped_spans
+        threshold = config.get_graphql_settings().tracing_n_plus_one_threshold
+        repeated = trace.repeated_statements(threshold)
+        if repeated:
+            metrics.GRAPHQL_N_PLUS_ONE.inc()
+            trace.root.attributes["n_plus_one"] = [shape for shape, _ in repeated]
+            for shape, count in repeated:
+                logger.warning(
+                    "%s ran %d statements of the same shape, a likely N+1 query: %s",
+                    trace.root.name,
+                    count,
+                    shape,
+                )
+        try:
+            tracing.get_exporter().export(trace)
+        except Exception:
+            logger.exception("Failed to export the trace of %s", trace.root.name)
+
+    def resolve(self, _next, root, info, *args, **kwargs):
+        if self.trace is None or should_skip_tracing(_next, info):
+            return _next(root, info, *args, **kwargs)
+        return self._traced_resolve(_next, root, info, *args, **kwargs)
+
+    async def _traced_resolve(self, _next, root, info, *args, **kwargs):
+        attributes = {
+            "graphql.parent_type": info.parent_type.name,
+            "graphql.path": ".".join(map(str, info.path.as_list())),
+        }
+        with tracing.span(
+            f"{info.parent_type.name}.{info.field_name}", "resolver", attributes
+        ):
+            result = _next(root, info, *args, **kwargs)
+            if isawaitable(result):
+                result = await result
+            return result
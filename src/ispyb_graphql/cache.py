@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+import collections
+import sys
+import time
+from typing import Any, Callable, Hashable, Optional
+
+MISSING = object()
+
+
+class TTLCache:
+    """A size-bounded, least-recently-used mapping whose entries expire
+
+    Entries are evicted in least-recently-used order once `maxsize` is
+    exceeded, and are treated as absent once they are older than their
+    time-to-live. A per-entry `ttl` may be given to `set()` to override the
+    default, e.g. to keep negative results for a shorter period.
+
+    If `getsizeof` is given, `maxsize` bounds the total size of the values as
+    measured by it (e.g. in bytes, see `approximate_size`) rather than the
+    number of entries.
+    """
+
+    def __init__(
+        self,
+        maxsize: int,
+        ttl: Optional[float],
+        timer: Callable[[], float] = time.monotonic,
+        getsizeof: Optional[Callable[[Any], int]] = None,
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.timer = timer
+        self.getsizeof = getsizeof or (lambda value: 1)
+        self.currsize = 0
+        self._data: collections.OrderedDict[
+            Hashable, tuple[Any, Optional[float], int]
+        ] = collections.OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key, MISSING) is not MISSING
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        try:
+            value, expires, _ = self._data[key]
+        except KeyError:
+            return default
+        if expires is not None and expires <= self.timer():
+            self.invalidate(key)
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = MISSING) -> None:
+        ttl = self.ttl if ttl is MISSING else ttl
+        expires = self.timer() + ttl if ttl is not None else None
+        size = self.getsizeof(value)
+        self.invalidate(key)
+        if size > self.maxsize:
+            # Too large to ever fit, and not worth evicting everything else for
+            return
+        self._data[key] = (value, expires, size)
+        self.currsize += size
+        while self.currsize > self.maxsize:
+            _, (_, _, evicted) = self._data.popitem(last=False)
+            self.currsize -= evicted
+
+    def invalidate(self, key: Hashable) -> None:
+        entry = self._data.pop(key, None)
+        if entry is not None:
+            self.currsize -= entry[2]
+
+    def invalidate_where(self, predicate: Callable[[Hashable], bool]) -> None:
+        for key in [k for k in self._data if predicate(k)]:
+            self.invalidate(key)
+
+    def clear(self) -> None:
+        self._data.clear()
+        self.currsize = 0
+
+
+def approximate_size(value: Any) -> int:
+    """Estimate the memory used by a value and the tuples/lists/dicts it holds
+
+    Shared objects (e.g. interned strings) are counted each time they occur, so
+    this overestimates, which errs on the safe side for a memory bound.
+    """
+    size = sys.getsizeof(value)
+    if isinstance(value, (tuple, list)) or hasattr(value, "_fields"):
+        size += sum(approximate_size(item) for item in value)
+    elif isinstance(value, dict):
+        size += sum(approximate_size(k) + approximate_size(v) for k, v in value.items())
+    return size
@@ -2,6 +2,7 @@ from __future__ import annotations
 
 import pathlib
 from functools import lru_cache
+from typing import Optional
 
 from pydantic import AnyUrl, BaseSettings
 
@@ -11,6 +12,116 @@ class Settings(BaseSettings):
     ispyb_credentials: pathlib.Path
 
 
+class DatabaseSettings(BaseSettings):
+    """Connection pool tuning, read from ISPYB_DB_* environment variables"""
+
+    pool_size: int = 5
+    max_overflow: int = 10
+    pool_timeout: float = 30
+    # Recycle connections well before MySQL's wait_timeout closes them
+    pool_recycle: int = 3600
+    pool_pre_ping: bool = True
+    statement_cache_size: int = 500
+    # Run each GraphQL operation in a read-only, consistent snapshot transaction
+    read_only_snapshot: bool = False
+    # Alternatively, run independent statements of an operation in parallel on
+    # separate pooled sessions, up to max_concurrent_sessions at once
+    concurrent_sessions: bool = False
+    max_concurrent_sessions: int = 4
+    # Rows fetched per round-trip (and held in memory) by streaming exports
+    export_chunk_size: int = 5000
+    # Fraction of queries logged at DEBUG level to the ispyb_graphql.queries
+    # logger, see instrumentation.set_log_sample_rate() to change it at runtime
+    query_log_sample_rate: float = 0
+
+    class Config:
+        env_prefix = "ispyb_db_"
+
+
+class GraphQLSettings(BaseSettings):
+    """Limits on GraphQL operations, read from ISPYB_GRAPHQL_* variables"""
+
+    # Operations estimated to cost more than this are rejected before execution
+    max_query_cost: int = 50000
+    # ...and those costing more than this share a limited number of slots
+    throttle_query_cost: int = 5000
+    max_concurrent_expensive_queries: int = 2
+    # Number of parsed and validated query documents to keep
+    document_cache_size: int = 500
+    # Number of automatic persisted queries to remember, unless an allow-list
+    # of {sha256: query} is given, in which case only those may be executed
+    persisted_queries_cache_size: int = 1000
+    persisted_queries_allow_list: Optional[pathlib.Path] = None
+    # Responses covering only visits or time windows that ended more than the
+    # grace period (in seconds) ago are cached for closed_ttl, and others for
+    # open_ttl (not at all by default). With a response_cache_url (redis://...)
+    # the cache is shared between workers, otherwise it is an in-memory LRU.
+    response_cache_size: int = 1000
+    response_cache_url: Optional[str] = None
+    response_cache_closed_ttl: int = 3600
+    response_cache_open_ttl: int = 0
+    response_cache_grace_period: int = 86400
+    # Related objects expected at most this many times per data collection are
+    # joined onto pages of data collections rather than fetched by DataLoaders
+    lookahead_join_max_cardinality: float = 1
+    # Upper limit on the number of edges per page sent by subscriptions
+    max_subscription_chunk_size: int = 500
+    # Live updates: each subscribed beamline is polled for new rows every
+    # interval (in seconds), up to batch_size at a time, and updates are
+    # queued for each subscriber up to queue_size before it is disconnected
+    live_poll_interval: float = 5
+    live_poll_batch_size: int = 500
+    live_subscriber_queue_size: int = 100
+    # Fraction of operations traced, with spans for resolvers, DataLoader
+    # batches and SQL statements, up to max_spans per operation. Traces are
+    # exported as logs ("log") or OpenTelemetry spans ("opentelemetry"), and
+    # statements of the same shape run more than n_plus_one_threshold times by
+    # a traced operation are reported as a likely N+1 query.
+    tracing_sample_rate: float = 0
+    tracing_exporter: str = "log"
+    tracing_max_spans: int = 10000
+    tracing_n_plus_one_threshold: int = 10
+
+    class Config:
+        env_prefix = "ispyb_graphql_"
+
+
+class CacheSettings(BaseSettings):
+    """Process-wide caches, read from ISPYB_CACHE_* environment variables"""
+
+    # Approximate memory bound for rows cached across requests
+    entity_cache_max_bytes: int = 64 * 1024 * 1024
+    # Processing results can still be added to a finished data collection, so
+    # they are only cached for a limited time (in seconds)
+    auto_processing_ttl: int = 300
+    # Unit cell indexes are kept for this many proposals, and extended with
+    # new processing results at most once per refresh interval (in seconds)
+    cell_index_max_proposals: int = 100
+    cell_index_refresh_interval: float = 60
+    # What each user may see is built at login and kept for this many users,
+    # and rebuilt after the refresh interval (in seconds)
+    access_index_max_users: int = 10000
+    access_index_refresh_interval: float = 300
+
+    class Config:
+        env_prefix = "ispyb_cache_"
+
+
 @lru_cache()
 def get_settings():
     return Settings()
+
+
+@lru_cache()
+def get_database_settings():
+    return DatabaseSettings()
+
+
+@lru_cache()
+def get_graphql_settings():
+    return GraphQLSettings()
+
+
+@lru_cache()
+def get_cache_settings():
+    return CacheSettings()
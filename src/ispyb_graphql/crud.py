@@ -1,17 +1,19 @@
 from __future__ import annotations
 
 import datetime
-import itertools
 import logging
 import re
-from typing import Optional
+from typing import AsyncIterator, Optional, Sequence
 
-from sqlalchemy import func, select
-from sqlalchemy.orm import Session, joinedload, load_only
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
 
+from ispyb_graphql.grouping import group_rows
+from ispyb_graphql.instrumentation import count_grouped_rows, instrumented
 from ispyb_graphql.models import (
     AutoProc,
-    AutoProcessingResult,
     AutoProcIntegration,
     AutoProcProgram,
     AutoProcScaling,
@@ -62,6 +64,82 @@ DATA_COLLECTION_COLUMNS = (
 )
 
 
+AUTO_PROCESSING_RESULT_COLUMNS = (
+    AutoProc.autoProcId,
+    AutoProc.spaceGroup,
+    AutoProc.refinedCell_a,
+    AutoProc.refinedCell_b,
+    AutoProc.refinedCell_c,
+    AutoProc.refinedCell_alpha,
+    AutoProc.refinedCell_beta,
+    AutoProc.refinedCell_gamma,
+    AutoProcProgram.processingPrograms,
+)
+
+
+AUTO_PROC_SCALING_STATISTICS_COLUMNS = (
+    AutoProcScalingStatistics.scalingStatisticsType,
+    AutoProcScalingStatistics.resolutionLimitHigh,
+    AutoProcScalingStatistics.resolutionLimitLow,
+    AutoProcScalingStatistics.rMerge,
+    AutoProcScalingStatistics.meanIOverSigI,
+    AutoProcScalingStatistics.completeness,
+    AutoProcScalingStatistics.multiplicity,
+    AutoProcScalingStatistics.anomalousCompleteness,
+    AutoProcScalingStatistics.anomalousMultiplicity,
+    AutoProcScalingStatistics.ccHalf,
+    AutoProcScalingStatistics.ccAnomalous,
+)
+
+
+# The cell of each processing result, with what identifies it
+UNIT_CELL_COLUMNS = (
+    AutoProc.autoProcId,
+    AutoProcIntegration.dataCollectionId,
+    AutoProcProgram.processingPrograms,
+    AutoProc.spaceGroup,
+    AutoProc.refinedCell_a,
+    AutoProc.refinedCell_b,
+    AutoProc.refinedCell_c,
+    AutoProc.refinedCell_alpha,
+    AutoProc.refinedCell_beta,
+    AutoProc.refinedCell_gamma,
+)
+
+SAMPLE_COLUMNS = (
+    BLSample.blSampleId,
+    BLSample.name,
+    BLSample.crystalId,
+    BLSample.containerId,
+)
+
+
+CONTAINER_COLUMNS = (
+    Container.containerId,
+    Container.capacity,
+    Container.barcode,
+    Container.code,
+    Container.containerType,
+)
+
+
+BLSESSION_COLUMNS = (
+    BLSession.sessionId,
+    BLSession.visit_number,
+    BLSession.startDate,
+    BLSession.endDate,
+    BLSession.beamLineName,
+    Proposal.proposalCode,
+    Proposal.proposalNumber,
+)
+
+
+PROPOSAL_COLUMNS = (
+    Proposal.proposalId,
+    Proposal.proposalCode,
+    Proposal.proposalNumber,
+)
+
 BL_TYPES = {
     "i02": "mx",
     "i02-1": "mx",
@@ -88,139 +166,268 @@ def proposal_code_number_and_visit_number_from_name(name: str) -> tuple[str, int
     return code, int(number), int(visit_number)
 
 
-async def get_proposal(db: Session, name: str) -> Proposal:
-    print(f"Getting proposal {name}")
-    code, number = proposal_code_and_number_from_name(name)
+@instrumented()
+async def get_blsession(
+    db: Session, name: str, columns: Sequence = BLSESSION_COLUMNS
+) -> Row:
+    code, number, visit_number = proposal_code_number_and_visit_number_from_name(name)
     stmt = (
-        select(Proposal)
+        select(*columns)
+        .join(Proposal, Proposal.proposalId == BLSession.proposalId)
         .filter(Proposal.proposalCode == code)
         .filter(Proposal.proposalNumber == number)
+        .filter(BLSession.visit_number == visit_number)
     )
     result = await db.execute(stmt)
-    return result.scalar_one()
+    return result.one()
 
 
-async def get_blsession(db: Session, name: str) -> BLSession:
-    print(f"Getting blsession {name}")
-    code, number, visit_number = proposal_code_number_and_visit_number_from_name(name)
-    stmt = (
-        select(BLSession)
-        .join(Proposal, Proposal.proposalId == BLSession.proposalId)
-        .filter(Proposal.proposalCode == code)
-        .filter(Proposal.proposalNumber == number)
-        .filter(BLSession.visit_number == visit_number)
-        .options(joinedload(BLSession.Proposal))
+@instrumented(batch="proposals")
+async def get_proposals(db: Session, proposals: Sequence[tuple[str, int]]) -> list[Row]:
+    """The proposals with the given (code, number)s"""
+    stmt = select(*PROPOSAL_COLUMNS).filter(
+        or_(
+            *(
+                and_(Proposal.proposalCode == code, Proposal.proposalNumber == number)
+                for code, number in proposals
+            )
+        )
     )
     result = await db.execute(stmt)
-    return result.scalar_one()
+    return result.all()
 
 
-async def get_dcids_for_proposal(
-    db: Session,
-    proposal_id: int,
-    scan_type: str = None,
-    limit: Optional[int] = None,
-    after: Optional[int] = None,
-) -> list[int]:
-    print(f"Getting dcids for {proposal_id=}")
+@instrumented(batch="visits")
+async def get_blsessions(
+    db: Session, visits: Sequence[tuple[str, int, int]]
+) -> list[Row]:
+    """The sessions with the given (proposal code, number, visit number)s"""
     stmt = (
-        select(DataCollection.dataCollectionId)
-        .join(BLSession, DataCollection.SESSIONID == BLSession.sessionId)
-        .filter(BLSession.proposalId == proposal_id)
+        select(*BLSESSION_COLUMNS)
+        .join(Proposal, Proposal.proposalId == BLSession.proposalId)
+        .filter(
+            or_(
+                *(
+                    and_(
+                        Proposal.proposalCode == code,
+                        Proposal.proposalNumber == number,
+                        BLSession.visit_number == visit_number,
+                    )
+                    for code, number, visit_number in visits
+                )
+            )
+        )
     )
+    result = await db.execute(stmt)
+    return result.all()
+
+
+def _selects_from(columns: Sequence, model) -> bool:
+    """Whether any of the columns belong to the given model's table"""
+    return any(column.table is model.__table__ for column in columns)
+
+
+def _filter_by_scan_type(stmt, scan_type: Optional[str]):
     if scan_type and scan_type.lower() == "rotation":
         stmt = stmt.filter(DataCollection.overlap == 0.0, DataCollection.axisRange > 0)
     elif scan_type and scan_type.lower() == "grid":
         stmt = stmt.join(
             GridInfo, GridInfo.dataCollectionId == DataCollection.dataCollectionId
         )
-    if after:
-        stmt = stmt.filter(DataCollection.dataCollectionId > after)
-    if limit:
-        stmt = stmt.limit(limit)
-    result = await db.execute(stmt)
-    return result.scalars().all()
+    return stmt
 
 
-async def get_dcids_for_blsession(
-    db: Session,
-    session_id: int,
+def data_collections_query(
+    proposal_id: Optional[int] = None,
+    session_id: Optional[int] = None,
+    sample_id: Optional[int] = None,
+    beamline: Optional[str] = None,
+    start_time: datetime.datetime = None,
+    end_time: datetime.datetime = None,
     scan_type: str = None,
-    limit: Optional[int] = None,
-    after: Optional[int] = None,
-) -> list[int]:
-    print(f"Getting data collections for {session_id=}, {scan_type=}")
-    stmt = (
-        select(DataCollection.dataCollectionId)
-        .join(BLSession, DataCollection.SESSIONID == BLSession.sessionId)
-        .filter(BLSession.sessionId == session_id)
-    )
-    if scan_type and scan_type.lower() == "rotation":
-        stmt = stmt.filter(DataCollection.overlap == 0.0, DataCollection.axisRange > 0)
-    elif scan_type and scan_type.lower() == "grid":
-        stmt = stmt.join(
-            GridInfo, GridInfo.dataCollectionId == DataCollection.dataCollectionId
+    columns: Sequence = DATA_COLLECTION_COLUMNS,
+):
+    """Select the data collections matching all of the given filters"""
+    stmt = select(*columns)
+    if proposal_id is not None or beamline is not None:
+        stmt = stmt.join(BLSession, BLSession.sessionId == DataCollection.SESSIONID)
+    if proposal_id is not None:
+        stmt = stmt.filter(BLSession.proposalId == proposal_id)
+    if beamline is not None:
+        stmt = stmt.filter(BLSession.beamLineName == beamline)
+    if session_id is not None:
+        stmt = stmt.filter(DataCollection.SESSIONID == session_id)
+    if sample_id is not None:
+        stmt = stmt.filter(DataCollection.BLSAMPLEID == sample_id)
+    if start_time:
+        stmt = stmt.filter(DataCollection.startTime > start_time)
+    if end_time:
+        if start_time:
+            assert end_time > start_time
+        stmt = stmt.filter(DataCollection.endTime <= end_time)
+    return _filter_by_scan_type(stmt, scan_type)
+
+
+# Orderings available for paginated data collections. Each is a unique sort
+# key, so that a row's values identify its position for keyset pagination.
+DATA_COLLECTION_ORDERINGS = {
+    "dataCollectionId": (DataCollection.dataCollectionId,),
+    "startTime": (DataCollection.startTime, DataCollection.dataCollectionId),
+}
+
+
+# To-one relations that may be outer joined onto a data collection query, by
+# path from the data collection, with the columns labelled "<path>__<key>"
+DATA_COLLECTION_RELATIONS = {
+    "sample": (BLSample, BLSample.blSampleId == DataCollection.BLSAMPLEID),
+    "sample__container": (Container, Container.containerId == BLSample.containerId),
+}
+
+
+def join_related(stmt, relations: dict, related: dict[str, Sequence]):
+    """Outer join the related to-one entities and add their columns
+
+    related maps relation paths (parents before children) to the columns to
+    select from them.
+    """
+    for path, columns in related.items():
+        model, onclause = relations[path]
+        stmt = stmt.outerjoin(model, onclause).add_columns(
+            *(column.label(f"{path}__{column.key}") for column in columns)
         )
-    if after:
-        stmt = stmt.filter(DataCollection.dataCollectionId > after)
-    if limit:
+    return stmt
+
+
+def _keyset_condition(columns, values, descending: bool = False):
+    """Rows strictly after values in the (columns) sort order
+
+    The row-value comparison (a, b) > (x, y) is expanded into
+    a > x OR (a = x AND b > y) so that MySQL can use it as an index range.
+    """
+    column, *columns = columns
+    value, *values = values
+    beyond = column < value if descending else column > value
+    if not columns:
+        return beyond
+    return or_(
+        beyond,
+        and_(column == value, _keyset_condition(columns, values, descending)),
+    )
+
+
+def keyset_paginate(
+    stmt,
+    columns,
+    limit: Optional[int] = None,
+    after: Optional[Sequence] = None,
+    before: Optional[Sequence] = None,
+    backward: bool = False,
+):
+    """Apply keyset (seek) pagination over the unique sort key columns
+
+    Selects the rows between the after and before keys, taking up to limit rows
+    from the start, or from the end if backward. Backward pages are returned
+    by the database in descending order and need reversing by the caller.
+    """
+    if after is not None:
+        stmt = stmt.filter(_keyset_condition(columns, after))
+    if before is not None:
+        stmt = stmt.filter(_keyset_condition(columns, before, descending=True))
+    if backward:
+        stmt = stmt.order_by(*(column.desc() for column in columns))
+    else:
+        stmt = stmt.order_by(*columns)
+    if limit is not None:
         stmt = stmt.limit(limit)
-    result = await db.execute(stmt)
-    return result.scalars().all()
+    return stmt
 
 
-async def get_dcids_for_sample(
+@instrumented()
+async def get_data_collections_page(
     db: Session,
-    sample_id: int,
-    scan_type: str = None,
+    order_by: str = "dataCollectionId",
     limit: Optional[int] = None,
-    after: Optional[int] = None,
-) -> list[int]:
-    print(f"Getting data collections for {sample_id=}, {scan_type=}")
-    stmt = (
-        select(DataCollection.dataCollectionId)
-        .join(BLSample, DataCollection.BLSAMPLEID == BLSample.blSampleId)
-        .filter(BLSample.blSampleId == sample_id)
+    after: Optional[Sequence] = None,
+    before: Optional[Sequence] = None,
+    backward: bool = False,
+    columns: Sequence = DATA_COLLECTION_COLUMNS,
+    related: Optional[dict[str, Sequence]] = None,
+    **filters,
+) -> list[Row]:
+    """Get one page of data collections using keyset pagination
+
+    See data_collections_query() for the accepted filters and keyset_paginate()
+    for the meaning of after, before and backward, which are sort key values
+    for the given order_by. Rows are always returned in ascending order.
+    Callers wanting to know whether there is a further page should ask for one
+    more row than they need. Data collections without a startTime have no
+    position in the startTime ordering and are excluded from it. Columns of
+    to-one related entities may be joined in, see join_related().
+    """
+    sort_key = DATA_COLLECTION_ORDERINGS[order_by]
+    stmt = data_collections_query(columns=columns, **filters)
+    if related:
+        stmt = join_related(stmt, DATA_COLLECTION_RELATIONS, related)
+    if order_by == "startTime":
+        stmt = stmt.filter(DataCollection.startTime.isnot(None))
+    stmt = keyset_paginate(
+        stmt, sort_key, limit=limit, after=after, before=before, backward=backward
     )
-    if scan_type and scan_type.lower() == "rotation":
-        stmt = stmt.filter(DataCollection.overlap == 0.0, DataCollection.axisRange > 0)
-    elif scan_type and scan_type.lower() == "grid":
-        stmt = stmt.join(
-            GridInfo, GridInfo.dataCollectionId == DataCollection.dataCollectionId
-        )
-    if after:
-        stmt = stmt.filter(DataCollection.dataCollectionId > after)
-    if limit:
-        stmt = stmt.limit(limit)
     result = await db.execute(stmt)
-    return result.scalars().all()
+    rows = result.all()
+    return rows[::-1] if backward else rows
+
+
+@instrumented()
+async def stream_data_collections(
+    db: AsyncSession,
+    columns: Sequence = DATA_COLLECTION_COLUMNS,
+    chunk_size: int = 1000,
+    **filters,
+) -> AsyncIterator[list[Row]]:
+    """Stream the data collections matching filters, in chunks of rows
+
+    Rows are read through a server-side cursor in order of dataCollectionId, so
+    only one chunk is held in memory at a time. See data_collections_query()
+    for the accepted filters. The session's connection is held until the
+    iteration finishes.
+    """
+    stmt = (
+        data_collections_query(columns=columns, **filters)
+        .order_by(DataCollection.dataCollectionId)
+        .execution_options(yield_per=chunk_size)
+    )
+    result = await db.stream(stmt)
+    async for rows in result.partitions(chunk_size):
+        yield rows
 
 
+@instrumented(batch="dcids")
 async def get_data_collections(
     db: Session,
     dcids: list[int],
-) -> list[list[DataCollection]]:
-    print(f"Getting data collections for {dcids=}")
-    stmt = (
-        select(DataCollection)
-        .options(load_only(*DATA_COLLECTION_COLUMNS))
-        .filter(DataCollection.dataCollectionId.in_(dcids))
-    )
+    columns: Sequence = DATA_COLLECTION_COLUMNS,
+) -> list[Row]:
+    stmt = select(*columns).filter(DataCollection.dataCollectionId.in_(dcids))
     results = await db.execute(stmt)
-    return results.scalars().all()
+    return results.all()
 
 
-async def get_samples(db: Session, sample_ids: list[int]) -> list[BLSample]:
-    print(f"Getting {sample_ids=}")
-    stmt = select(BLSample).filter(BLSample.blSampleId.in_(sample_ids))
+@instrumented(batch="sample_ids")
+async def get_samples(
+    db: Session, sample_ids: list[int], columns: Sequence = SAMPLE_COLUMNS
+) -> list[Row]:
+    stmt = select(*columns).filter(BLSample.blSampleId.in_(sample_ids))
     result = await db.execute(stmt)
-    return result.scalars().all()
+    return result.all()
 
 
-async def get_samples_for_proposal(db: Session, proposal_id: int) -> list[BLSample]:
-    print(f"Getting samples for {proposal_id=}")
+@instrumented()
+async def get_samples_for_proposal(
+    db: Session, proposal_id: int, columns: Sequence = SAMPLE_COLUMNS
+) -> list[Row]:
     stmt = (
-        select(BLSample)
+        select(*columns)
         .join(Crystal, Crystal.crystalId == BLSample.crystalId)
         .join(Protein, Protein.proteinId == Crystal.proteinId)
         .join(Container, Container.containerId == BLSample.containerId)
@@ -228,120 +435,200 @@ async def get_samples_for_proposal(db: Session, proposal_id: int) -> list[BLSamp
         .filter(Proposal.proposalId == proposal_id)
     )
     result = await db.execute(stmt)
-    return result.scalars().all()
+    return result.all()
 
 
-async def get_containers(db: Session, container_ids: list[int]) -> list[Container]:
-    print(f"Getting {container_ids=}")
-    stmt = select(Container).filter(Container.containerId.in_(container_ids))
+@instrumented()
+async def get_proposal_for_sample(db: Session, sample_id: int) -> Optional[Row]:
+    """The (proposalCode, proposalNumber) of a sample's proposal, if it exists"""
+    stmt = (
+        select(Proposal.proposalCode, Proposal.proposalNumber)
+        .select_from(BLSample)
+        .join(Crystal, Crystal.crystalId == BLSample.crystalId)
+        .join(Protein, Protein.proteinId == Crystal.proteinId)
+        .join(Proposal, Proposal.proposalId == Protein.proposalId)
+        .filter(BLSample.blSampleId == sample_id)
+    )
     result = await db.execute(stmt)
-    return result.scalars().all()
+    return result.one_or_none()
 
 
-async def get_auto_processing_results_for_dcids(
-    db: Session, dcids: list[int]
-) -> list[list[AutoProcessingResult]]:
-    print(f"Getting autoprocessings for dcids: {dcids}")
+@instrumented()
+async def get_visit_for_data_collection(db: Session, dcid: int) -> Optional[Row]:
+    """The (proposalCode, proposalNumber, visit_number, beamLineName) of a data
+    collection's visit, if it exists"""
     stmt = (
         select(
-            DataCollection.dataCollectionId,
-            AutoProc,
-            AutoProcIntegration,
-            AutoProcProgram,
-        )
-        .join(
-            AutoProcProgram,
-            AutoProcProgram.autoProcProgramId == AutoProc.autoProcProgramId,
+            Proposal.proposalCode,
+            Proposal.proposalNumber,
+            BLSession.visit_number,
+            BLSession.beamLineName,
         )
-        .join(
-            AutoProcIntegration,
-            AutoProcIntegration.autoProcProgramId == AutoProcProgram.autoProcProgramId,
+        .select_from(DataCollection)
+        .join(BLSession, BLSession.sessionId == DataCollection.SESSIONID)
+        .join(Proposal, Proposal.proposalId == BLSession.proposalId)
+        .filter(DataCollection.dataCollectionId == dcid)
+    )
+    result = await db.execute(stmt)
+    return result.one_or_none()
+
+
+@instrumented(batch="container_ids")
+async def get_containers(
+    db: Session, container_ids: list[int], columns: Sequence = CONTAINER_COLUMNS
+) -> list[Row]:
+    stmt = select(*columns).filter(Container.containerId.in_(container_ids))
+    result = await db.execute(stmt)
+    return result.all()
+
+
+@instrumented(batch="dcids", rows=count_grouped_rows)
+async def get_auto_processing_results_for_dcids(
+    db: Session,
+    dcids: list[int],
+    columns: Sequence = AUTO_PROCESSING_RESULT_COLUMNS,
+) -> list[tuple[Row, ...]]:
+    """The processing results of each data collection, with its endTime as
+    dataCollectionEndTime"""
+    stmt = (
+        select(
+            AutoProcIntegration.dataCollectionId,
+            DataCollection.endTime.label("dataCollectionEndTime"),
+            *columns,
         )
+        .select_from(AutoProcIntegration)
         .join(
             DataCollection,
             DataCollection.dataCollectionId == AutoProcIntegration.dataCollectionId,
         )
-        .filter(DataCollection.dataCollectionId.in_(dcids))
+        .join(
+            AutoProc,
+            AutoProc.autoProcProgramId == AutoProcIntegration.autoProcProgramId,
+        )
+        .filter(AutoProcIntegration.dataCollectionId.in_(dcids))
     )
+    if _selects_from(columns, AutoProcProgram):
+        stmt = stmt.join(
+            AutoProcProgram,
+            AutoProcProgram.autoProcProgramId == AutoProcIntegration.autoProcProgramId,
+        )
     results = await db.execute(stmt)
-    grouped = {
-        k: list(g)
-        for k, g in itertools.groupby(results.all(), lambda g: g.dataCollectionId)
-    }
-    return [
-        [
-            AutoProcessingResult(
-                AutoProc=result.AutoProc,
-                AutoProcIntegration=result.AutoProcIntegration,
-                AutoProcProgram=result.AutoProcProgram,
-            )
-            for result in grouped[dcid]
-        ]
-        if dcid in grouped
-        else []
-        for dcid in dcids
-    ]
+    return group_rows(dcids, results, "dataCollectionId")
 
 
+@instrumented(batch="apids", rows=count_grouped_rows)
 async def get_auto_proc_scaling_statistics_for_apids(
     db: Session, apids: list[int]
-) -> list[list[AutoProcScalingStatistics]]:
-    print(f"Getting AutoProcScalingStatistics for apids: {apids}")
+) -> list[tuple[Row, ...]]:
     stmt = (
         select(
-            AutoProc.autoProcId,
-            AutoProcScalingStatistics,
+            AutoProcScaling.autoProcId,
+            *AUTO_PROC_SCALING_STATISTICS_COLUMNS,
         )
         .join(
             AutoProcScaling,
             AutoProcScaling.autoProcScalingId
             == AutoProcScalingStatistics.autoProcScalingId,
         )
-        .join(AutoProc, AutoProcScaling.autoProcId == AutoProc.autoProcId)
-        .filter(AutoProc.autoProcId.in_(apids))
+        .filter(AutoProcScaling.autoProcId.in_(apids))
     )
     results = await db.execute(stmt)
-    grouped = {
-        k: list(g) for k, g in itertools.groupby(results.all(), lambda g: g.autoProcId)
-    }
-    return [
-        [result.AutoProcScalingStatistics for result in grouped[apid]]
-        if apid in grouped
-        else []
-        for apid in apids
-    ]
-
-
-async def proposal_has_person(db: Session, name: str, fedid: str) -> bool:
-    code, number = proposal_code_and_number_from_name(name)
+    return group_rows(apids, results, "autoProcId")
+
+
+@instrumented()
+async def get_unit_cells_for_proposal(
+    db: Session, proposal_id: int, after: int = 0
+) -> list[Row]:
+    """The cells of a proposal's processing results with an autoProcId above after"""
     stmt = (
-        select(func.count(Person.personId))
-        .join(ProposalHasPerson, ProposalHasPerson.personId == Person.personId)
-        .join(Proposal, Proposal.proposalId == ProposalHasPerson.proposalId)
-        .filter(Proposal.proposalCode == code)
-        .filter(Proposal.proposalNumber == number)
-        .filter(Person.login == fedid)
+        select(*UNIT_CELL_COLUMNS)
+        .select_from(AutoProcIntegration)
+        .join(
+            AutoProc,
+            AutoProc.autoProcProgramId == AutoProcIntegration.autoProcProgramId,
+        )
+        .join(
+            AutoProcProgram,
+            AutoProcProgram.autoProcProgramId == AutoProcIntegration.autoProcProgramId,
+        )
+        .join(
+            DataCollection,
+            DataCollection.dataCollectionId == AutoProcIntegration.dataCollectionId,
+        )
+        .join(BLSession, BLSession.sessionId == DataCollection.SESSIONID)
+        .filter(BLSession.proposalId == proposal_id, AutoProc.autoProcId > after)
     )
-    count = await db.scalar(stmt)
-    return count > 0
+    result = await db.execute(stmt)
+    return result.all()
 
 
-async def session_has_person(db: Session, name: str, fedid: str) -> bool:
-    code, number, visit_number = proposal_code_number_and_visit_number_from_name(name)
+@instrumented()
+async def get_latest_ids(db: Session) -> tuple[int, int]:
+    """The highest dataCollectionId and autoProcId so far"""
+    dcid = await db.scalar(select(func.max(DataCollection.dataCollectionId)))
+    auto_proc_id = await db.scalar(select(func.max(AutoProc.autoProcId)))
+    return dcid or 0, auto_proc_id or 0
+
+
+@instrumented()
+async def get_new_data_collections(
+    db: Session,
+    beamline: str,
+    after: int,
+    limit: int,
+    columns: Sequence = DATA_COLLECTION_COLUMNS,
+) -> list[Row]:
+    """The first data collections on beamline with a dataCollectionId above after"""
     stmt = (
-        select(func.count(Person.personId))
-        .join(SessionHasPerson, SessionHasPerson.personId == Person.personId)
-        .join(BLSession, BLSession.sessionId == SessionHasPerson.sessionId)
-        .join(Proposal, Proposal.proposalId == BLSession.proposalId)
-        .filter(Proposal.proposalCode == code)
-        .filter(Proposal.proposalNumber == number)
-        .filter(BLSession.visit_number == visit_number)
-        .filter(Person.login == fedid)
+        data_collections_query(beamline=beamline, columns=columns)
+        .filter(DataCollection.dataCollectionId > after)
+        .order_by(DataCollection.dataCollectionId)
+        .limit(limit)
+    )
+    result = await db.execute(stmt)
+    return result.all()
+
+
+@instrumented()
+async def get_new_auto_processing_results(
+    db: Session,
+    beamline: str,
+    after: int,
+    limit: int,
+    columns: Sequence = AUTO_PROCESSING_RESULT_COLUMNS,
+) -> list[Row]:
+    """The first processing results on beamline with an autoProcId above after
+
+    There is a row for each data collection a result was integrated from,
+    with its dataCollectionId and SESSIONID.
+    """
+    stmt = (
+        select(AutoProcIntegration.dataCollectionId, DataCollection.SESSIONID, *columns)
+        .select_from(AutoProcIntegration)
+        .join(
+            AutoProc,
+            AutoProc.autoProcProgramId == AutoProcIntegration.autoProcProgramId,
+        )
+        .join(
+            DataCollection,
+            DataCollection.dataCollectionId == AutoProcIntegration.dataCollectionId,
+        )
+        .join(BLSession, BLSession.sessionId == DataCollection.SESSIONID)
+        .filter(BLSession.beamLineName == beamline, AutoProc.autoProcId > after)
+        .order_by(AutoProc.autoProcId)
+        .limit(limit)
     )
-    count = await db.scalar(stmt)
-    return count > 0
+    if _selects_from(columns, AutoProcProgram):
+        stmt = stmt.join(
+            AutoProcProgram,
+            AutoProcProgram.autoProcProgramId == AutoProcIntegration.autoProcProgramId,
+        )
+    result = await db.execute(stmt)
+    return result.all()
 
 
+@instrumented()
 async def get_permissions_and_user_groups(db: Session, fedid: str) -> bool:
     stmt = (
         select(Permission, UserGroup)
@@ -364,32 +651,47 @@ async def get_permissions_and_user_groups(db: Session, fedid: str) -> bool:
     return result.all()
 
 
-async def user_is_admin_for_beamline(db: Session, fedid: str, beamline: str) -> bool:
+async def get_admin_beamline_types(db: Session, fedid: str) -> set[str]:
+    """The types of beamline (see BL_TYPES) that the user administers"""
     result = await get_permissions_and_user_groups(db, fedid)
-    for p, ug in result:
-        print(p.type, ug.name)
-
-    admin_ptype = set(
-        p.type.split("_")[0] for p, _ in result if p.type.endswith("_admin")
+    return set(p.type.split("_")[0] for p, _ in result if p.type.endswith("_admin"))
+
+
+@instrumented(rows=lambda access: len(access[0]) + len(access[1]))
+async def get_user_access(
+    db: Session, fedid: str
+) -> tuple[list[Row], list[Row], set[str]]:
+    """The (code, number)s of the proposals and (code, number, visit number)s
+    of the sessions that the user is on, and the beamline types they administer
+    """
+    proposals = await db.execute(
+        select(Proposal.proposalCode, Proposal.proposalNumber)
+        .join(ProposalHasPerson, ProposalHasPerson.proposalId == Proposal.proposalId)
+        .join(Person, Person.personId == ProposalHasPerson.personId)
+        .filter(Person.login == fedid)
+    )
+    sessions = await db.execute(
+        select(Proposal.proposalCode, Proposal.proposalNumber, BLSession.visit_number)
+        .join(Proposal, Proposal.proposalId == BLSession.proposalId)
+        .join(SessionHasPerson, SessionHasPerson.sessionId == BLSession.sessionId)
+        .join(Person, Person.personId == SessionHasPerson.personId)
+        .filter(Person.login == fedid)
     )
-    bl_type = BL_TYPES.get(beamline)
-    if bl_type and bl_type in admin_ptype:
-        return True
-    return False
+    admin_types = await get_admin_beamline_types(db, fedid)
+    return proposals.all(), sessions.all(), admin_types
 
 
+@instrumented()
 async def get_blsessions_for_beamline(
     db: Session,
     beamline: str,
     start_time: datetime.datetime = None,
     end_time: datetime.datetime = None,
-) -> list[BLSession]:
-    print(f"Getting blsessions for {beamline=}")
-    stmt = (
-        select(BLSession)
-        .filter(BLSession.beamLineName == beamline)
-        .options(joinedload(BLSession.Proposal))
-    )
+    columns: Sequence = BLSESSION_COLUMNS,
+) -> list[Row]:
+    stmt = select(*columns).filter(BLSession.beamLineName == beamline)
+    if _selects_from(columns, Proposal):
+        stmt = stmt.join(Proposal, Proposal.proposalId == BLSession.proposalId)
     if start_time:
         stmt = stmt.filter(BLSession.endDate >= start_time)
     if end_time:
@@ -397,49 +699,12 @@ async def get_blsessions_for_beamline(
             assert end_time > start_time
         stmt = stmt.filter(BLSession.startDate <= end_time)
     result = await db.execute(stmt)
-    return result.scalars().all()
+    return result.all()
 
 
 async def get_beamline_for_visit(
     db: Session,
     visit: str,
 ) -> str:
-    print(f"Getting beamline for visit {visit=}")
     blsession = await get_blsession(db, visit)
-    return blsession.name
-
-
-async def get_data_collections_for_beamline(
-    db: Session,
-    beamline: str,
-    start_time: datetime.datetime = None,
-    end_time: datetime.datetime = None,
-    scan_type: str = None,
-    limit: Optional[int] = None,
-    after: Optional[int] = None,
-) -> list[BLSession]:
-    print(f"Getting data collections for {beamline=}")
-    stmt = (
-        select(DataCollection)
-        .join(BLSession, BLSession.sessionId == DataCollection.SESSIONID)
-        .filter(BLSession.beamLineName == beamline)
-        .options(load_only(*DATA_COLLECTION_COLUMNS))
-    )
-    if start_time:
-        stmt = stmt.filter(DataCollection.startTime > start_time)
-    if end_time:
-        if start_time:
-            assert end_time > start_time
-        stmt = stmt.filter(DataCollection.endTime <= end_time)
-    if scan_type and scan_type.lower() == "rotation":
-        stmt = stmt.filter(DataCollection.overlap == 0.0, DataCollection.axisRange > 0)
-    elif scan_type and scan_type.lower() == "grid":
-        stmt = stmt.join(
-            GridInfo, GridInfo.dataCollectionId == DataCollection.dataCollectionId
-        )
-    if after:
-        stmt = stmt.filter(DataCollection.dataCollectionId > after)
-    if limit:
-        stmt = stmt.limit(limit)
-    result = await db.execute(stmt)
-    return result.scalars().all()
+    return blsession.beamLineName
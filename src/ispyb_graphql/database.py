@@ -1,10 +1,18 @@
 from __future__ import annotations
 
+import asyncio
 import configparser
+import contextlib
 import os
+import time
+from typing import Any, AsyncIterator, Optional
 
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from ispyb_graphql import config, metrics, tracing
 
 
 def get_database_url(connector: str = "mysqlconnector"):
@@ -22,11 +30,155 @@ def get_database_url(connector: str = "mysqlconnector"):
     )
 
 
-SQLALCHEMY_DATABASE_URL = get_database_url(connector="asyncmy")
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """A connection pool that records how long checkouts wait for a connection"""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            metrics.DB_POOL_CHECKOUT_WAIT.observe(time.perf_counter() - start)
+
+
+def create_engine(
+    url: str, settings: Optional[config.DatabaseSettings] = None
+) -> AsyncEngine:
+    """Create an async engine with a pool tuned according to settings"""
+    settings = settings or config.get_database_settings()
+    engine = create_async_engine(
+        url,
+        future=True,
+        poolclass=InstrumentedQueuePool,
+        pool_size=settings.pool_size,
+        max_overflow=settings.max_overflow,
+        pool_timeout=settings.pool_timeout,
+        pool_recycle=settings.pool_recycle,
+        pool_pre_ping=settings.pool_pre_ping,
+        query_cache_size=settings.statement_cache_size,
+    )
+    metrics.instrument_pool(engine.pool)
+    tracing.instrument_engine(engine)
+    return engine
+
+
+# The engine and sessionmaker are created on first use (or at application
+# startup) rather than on import, so that code needing only the schema does not
+# require database credentials and never opens a connection.
+engine: Optional[AsyncEngine] = None
+SessionLocal: Optional[sessionmaker] = None
+
 
-engine = create_async_engine(SQLALCHEMY_DATABASE_URL, future=True)
-SessionLocal = sessionmaker(engine, class_=AsyncSession)
+def init_engine(url: Optional[str] = None) -> AsyncEngine:
+    """Create the engine and sessionmaker, if they have not been already"""
+    global engine, SessionLocal
+    if engine is None:
+        engine = create_engine(url or get_database_url(connector="asyncmy"))
+        SessionLocal = sessionmaker(engine, class_=AsyncSession)
+    return engine
+
+
+async def dispose_engine() -> None:
+    """Close all pooled connections and forget the engine"""
+    global engine, SessionLocal
+    if engine is not None:
+        await engine.dispose()
+    engine = None
+    SessionLocal = None
+
+
+def get_sessionmaker() -> sessionmaker:
+    if SessionLocal is None:
+        init_engine()
+    return SessionLocal
 
 
 async def get_db_session():
-    return SessionLocal()
+    return get_sessionmaker()()
+
+
+class RequestSession:
+    """The database session for a single GraphQL operation
+
+    A connection is only checked out of the pool when the first statement is
+    executed, so operations answered entirely from caches, or rejected by
+    permission checks that are cached, never hold one. Statements are
+    serialised, since an AsyncSession must not be used concurrently.
+
+    With read_only_snapshot, the session starts a read-only transaction with
+    a consistent snapshot, so all resolvers see the database as of the first
+    statement.
+    """
+
+    def __init__(self, read_only_snapshot: bool = False):
+        self.read_only_snapshot = read_only_snapshot
+        self._session: Optional[AsyncSession] = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def acquired(self) -> bool:
+        return self._session is not None
+
+    async def _get_session(self) -> AsyncSession:
+        if self._session is None:
+            session = await get_db_session()
+            if self.read_only_snapshot:
+                await session.execute(
+                    text("START TRANSACTION WITH CONSISTENT SNAPSHOT, READ ONLY")
+                )
+            self._session = session
+        return self._session
+
+    async def execute(self, *args, **kwargs) -> Any:
+        async with self._lock:
+            session = await self._get_session()
+            return await session.execute(*args, **kwargs)
+
+    async def scalar(self, *args, **kwargs) -> Any:
+        async with self._lock:
+            session = await self._get_session()
+            return await session.scalar(*args, **kwargs)
+
+    async def close(self) -> None:
+        """Return the connection to the pool; a later statement checks out anew"""
+        async with self._lock:
+            if self._session is not None:
+                session, self._session = self._session, None
+                await session.close()
+
+
+class ConcurrentRequestSession:
+    """Database access for a GraphQL operation that runs statements in parallel
+
+    A drop-in alternative to RequestSession in which each statement checks out
+    its own pooled session, so that independent root fields and sibling
+    DataLoader batches run concurrently, at most max_concurrency at a time.
+    Results are buffered before the connection is returned to the pool.
+
+    Statements do not share a transaction, so there is no consistent snapshot
+    across them.
+    """
+
+    def __init__(self, max_concurrency: int):
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    @contextlib.asynccontextmanager
+    async def _session(self) -> AsyncIterator[AsyncSession]:
+        async with self._semaphore:
+            session = await get_db_session()
+            try:
+                yield session
+            finally:
+                await session.close()
+
+    async def execute(self, *args, **kwargs) -> Any:
+        async with self._session() as session:
+            result = await session.execute(*args, **kwargs)
+            return result.freeze()()
+
+    async def scalar(self, *args, **kwargs) -> Any:
+        async with self._session() as session:
+            return await session.scalar(*args, **kwargs)
+
+    async def close(self) -> None:
+        """Statements release their connections as they finish"""
@@ -0,0 +1,53 @@
+"""Grouping the rows of one-to-many batch queries by the key they were loaded for
+
+A batched query for the related rows of many keys returns them in whatever
+order the database chooses, so rows are assigned to their key's group as they
+arrive, rather than relying on rows with the same key being adjacent (as
+itertools.groupby does). Groups are allocated up front for the requested keys,
+in order, so the result lines up with the keys given to a DataLoader.
+"""
+
+from __future__ import annotations
+
+from operator import attrgetter
+from typing import Any, Callable, Hashable, Iterable, Sequence, Union
+
+
+class Groups:
+    """Rows grouped by key, for a fixed sequence of keys
+
+    Rows may be added in any order, in any number of batches (e.g. the
+    partitions of a streamed result). Rows whose key was not requested are
+    ignored.
+    """
+
+    def __init__(
+        self, keys: Sequence[Hashable], key: Union[str, Callable[[Any], Hashable]]
+    ):
+        self.keys = keys
+        self.key_of = attrgetter(key) if isinstance(key, str) else key
+        self._groups: dict[Hashable, list] = {k: [] for k in keys}
+
+    def add(self, rows: Iterable[Any]) -> None:
+        groups = self._groups
+        key_of = self.key_of
+        for row in rows:
+            group = groups.get(key_of(row))
+            if group is not None:
+                group.append(row)
+
+    def result(self) -> list[tuple]:
+        """The rows of each key, in the order the keys were given"""
+        groups = self._groups
+        return [tuple(groups[k]) for k in self.keys]
+
+
+def group_rows(
+    keys: Sequence[Hashable],
+    rows: Iterable[Any],
+    key: Union[str, Callable[[Any], Hashable]],
+) -> list[tuple]:
+    """The rows for each of keys, as grouped by key (an attribute name or function)"""
+    groups = Groups(keys, key)
+    groups.add(rows)
+    return groups.result()
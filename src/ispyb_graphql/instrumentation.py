@@ -0,0 +1,156 @@
+"""Metrics and sampled logging of database queries
+
+Functions decorated with instrumented() record, per query:
+
+- ispyb_query_duration_seconds: how long each call took
+- ispyb_query_rows: how many rows each call returned
+- ispyb_query_batch_size: how many keys each batched call was given
+- ispyb_query_errors_total: how many calls raised
+
+which are exported with the other Prometheus metrics on /metrics/. A sample
+of calls is also logged at DEBUG level, as a message with the same values in
+the record's extra fields, for structured log handlers. Only the number of
+keys of a batch is logged, not the keys themselves. Sampling is off unless
+ISPYB_DB_QUERY_LOG_SAMPLE_RATE is set, and may be changed at runtime with
+set_log_sample_rate(); when off, a call costs two clock reads and three metric
+updates more than it would undecorated.
+"""
+
+from __future__ import annotations
+
+import functools
+import inspect
+import logging
+import random
+import time
+from typing import Any, Callable, Optional
+
+from ispyb_graphql import config, metrics
+
+logger = logging.getLogger("ispyb_graphql.queries")
+
+_sample_rate: Optional[float] = None
+
+
+def get_log_sample_rate() -> float:
+    global _sample_rate
+    if _sample_rate is None:
+        _sample_rate = config.get_database_settings().query_log_sample_rate
+    return _sample_rate
+
+
+def set_log_sample_rate(rate: Optional[float]) -> None:
+    """Log the given fraction of queries, or go back to the configured rate"""
+    global _sample_rate
+    _sample_rate = rate
+
+
+def count_rows(result: Any) -> int:
+    """The number of rows in a list of rows, or 1 for a single row or value"""
+    return len(result) if isinstance(result, list) else 1
+
+
+def count_grouped_rows(result: list[tuple]) -> int:
+    """The number of rows in a list of groups of rows, see grouping.group_rows()"""
+    return sum(len(group) for group in result)
+
+
+def _summarise(arguments: dict[str, Any]) -> dict[str, Any]:
+    return {
+        name: len(value) if isinstance(value, (list, tuple, set)) else value
+        for name, value in arguments.items()
+        if name not in ("db", "columns")
+    }
+
+
+class _Query:
+    """The metrics of one instrumented query"""
+
+    def __init__(self, name: str, batch: Optional[str], signature: inspect.Signature):
+        self.name = name
+        self.duration = metrics.QUERY_DURATION.labels(name)
+        self.rows = metrics.QUERY_ROWS.labels(name)
+        self.batch_size = metrics.QUERY_BATCH_SIZE.labels(name) if batch else None
+        self.errors = metrics.QUERY_ERRORS.labels(name)
+        self.batch = batch
+        self.batch_position = list(signature.parameters).index(batch) if batch else 0
+        self.signature = signature
+
+    def record(self, args, kwargs, elapsed: float, rows: int) -> None:
+        self.duration.observe(elapsed)
+        self.rows.observe(rows)
+        batch_size = None
+        if self.batch_size is not None:
+            keys = kwargs.get(self.batch)
+            if keys is None and len(args) > self.batch_position:
+                keys = args[self.batch_position]
+            if keys is not None:
+                batch_size = len(keys)
+                self.batch_size.observe(batch_size)
+        rate = get_log_sample_rate()
+        if rate and random.random() < rate and logger.isEnabledFor(logging.DEBUG):
+            self.log(args, kwargs, elapsed, rows, batch_size)
+
+    def log(self, args, kwargs, elapsed: float, rows: int, batch_size) -> None:
+        arguments = _summarise(self.signature.bind_partial(*args, **kwargs).arguments)
+        logger.debug(
+            "%s took %.1f ms for %d rows",
+            self.name,
+            elapsed * 1000,
+            rows,
+            extra={
+                "query": self.name,
+                "duration_ms": elapsed * 1000,
+                "rows": rows,
+                "batch_size": batch_size,
+                "arguments": arguments,
+            },
+        )
+
+
+def instrumented(
+    batch: Optional[str] = None,
+    rows: Callable[[Any], int] = count_rows,
+) -> Callable:
+    """Record the metrics of each call of a query function
+
+    batch names the argument holding the keys of a batched query, and rows
+    counts the rows of a result. Async generators, such as streamed queries,
+    are timed until exhausted or closed, counting the rows of each chunk.
+    """
+
+    def decorator(function):
+        query = _Query(function.__name__, batch, inspect.signature(function))
+
+        if inspect.isasyncgenfunction(function):
+
+            @functools.wraps(function)
+            async def stream(*args, **kwargs):
+                start = time.perf_counter()
+                n_rows = 0
+                try:
+                    async for chunk in function(*args, **kwargs):
+                        n_rows += rows(chunk)
+                        yield chunk
+                except Exception:
+                    query.errors.inc()
+                    raise
+                finally:
+                    query.record(args, kwargs, time.perf_counter() - start, n_rows)
+
+            return stream
+
+        @functools.wraps(function)
+        async def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                result = await function(*args, **kwargs)
+            except Exception:
+                query.errors.inc()
+                raise
+            query.record(args, kwargs, time.perf_counter() - start, rows(result))
+            return result
+
+        return wrapper
+
+    return decorator
@@ -1,19 +1,31 @@
 from __future__ import annotations
 
+import logging
 import typing
 
 import pydantic
 from cas import CASClient
 from fastapi import Depends, FastAPI
 from fastapi.responses import HTMLResponse, RedirectResponse, Response
+from starlette.concurrency import run_in_threadpool
 from starlette.middleware.sessions import SessionMiddleware
 from starlette.requests import Request
 from starlette_prometheus import PrometheusMiddleware, metrics
-from strawberry.fastapi import GraphQLRouter
 
-from ispyb_graphql import config
+from ispyb_graphql import config, database
+from ispyb_graphql.api.access import get_access_indexes
 from ispyb_graphql.api.schema import schema
 
+from . import export
+from .persisted_queries import (
+    PersistedQueryRouter,
+    PersistedQueryStore,
+    PersistedQueryTransportWSHandler,
+    PersistedQueryWSHandler,
+)
+
+logger = logging.getLogger(__name__)
+
 app = FastAPI()
 
 app.add_middleware(SessionMiddleware, secret_key="!secret")
@@ -21,6 +33,19 @@ app.add_middleware(PrometheusMiddleware)
 app.add_route("/metrics/", metrics)
 
 
+@app.on_event("startup")
+async def startup():
+    database.init_engine()
+    allow_list = config.get_graphql_settings().persisted_queries_allow_list
+    if allow_list:
+        persisted_queries.load_allow_list(allow_list)
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    await database.dispose_engine()
+
+
 def get_cas_client(
     server_url: pydantic.AnyUrl,
     service_url: pydantic.AnyUrl,
@@ -48,7 +73,7 @@ async def profile(request: Request):
 
 
 @app.get("/login")
-def login(
+async def login(
     request: Request,
     next: typing.Optional[str] = None,
     ticket: typing.Optional[str] = None,
@@ -67,14 +92,14 @@ def login(
     if not ticket:
         # No ticket, the request come from end user, send to CAS login
         cas_login_url = cas_client.get_login_url()
-        print("CAS login URL: %s", cas_login_url)
+        logger.debug("CAS login URL: %s", cas_login_url)
         return RedirectResponse(cas_login_url)
 
     # There is a ticket, the request come from CAS as callback.
     # need call `verify_ticket()` to validate ticket and get user profile.
-    user, attributes, pgtiou = cas_client.verify_ticket(ticket)
+    user, attributes, pgtiou = await run_in_threadpool(cas_client.verify_ticket, ticket)
 
-    print(
+    logger.debug(
         "CAS verify ticket response: user: %s, attributes: %s, pgtiou: %s",
         user,
         attributes,
@@ -86,31 +111,69 @@ def login(
     else:  # Login successfully, redirect according `next` query parameter.
         response = RedirectResponse(next)
         request.session["user"] = dict(user=user)
+        # Build what the user may see now, rather than on their first request
+        db = await database.get_db_session()
+        try:
+            await get_access_indexes().build(db, user)
+        finally:
+            await db.close()
         return response
 
 
 @app.get("/logout")
 def logout(request: Request, settings: config.Settings = Depends(config.get_settings)):
     redirect_url = request.url_for("logout_callback")
-    request.session.pop("user", None)
+    user = request.session.pop("user", None)
+    if user:
+        get_access_indexes().invalidate(user["user"])
     cas_client = get_cas_client(
         server_url=settings.cas_server_url,
         service_url=request.url_for("logout"),
     )
     cas_logout_url = cas_client.get_logout_url(redirect_url)
-    print("CAS logout URL: %s", cas_logout_url)
+    logger.debug("CAS logout URL: %s", cas_logout_url)
     return RedirectResponse(cas_logout_url)
 
 
 @app.get("/logout_callback")
 def logout_callback(request: Request):
-    print("deleting user from session")
     request.session.pop("user", None)
     return HTMLResponse('Logged out from CAS. <a href="/login">Login</a>')
 
 
+class LoginRequired:
+    """Refuse the websocket connections of users who are not logged in
+
+    Router dependencies such as get_current_user are not applied to the
+    websocket route, so the session is checked before accepting it.
+    """
+
+    async def handle_request(self):
+        if not self._ws.session.get("user"):
+            await self._ws.close(code=4401)
+            return
+        return await super().handle_request()
+
+
+class TransportWSHandler(LoginRequired, PersistedQueryTransportWSHandler):
+    pass
+
+
+class WSHandler(LoginRequired, PersistedQueryWSHandler):
+    pass
+
+
+class GraphQLRouter(PersistedQueryRouter):
+    graphql_transport_ws_handler_class = TransportWSHandler
+    graphql_ws_handler_class = WSHandler
+
+
+persisted_queries = PersistedQueryStore(
+    maxsize=config.get_graphql_settings().persisted_queries_cache_size
+)
 graphql_app = GraphQLRouter(
     schema,
+    persisted_queries=persisted_queries,
 )
 
 
@@ -127,7 +190,6 @@ async def exception_handler(request: Request, exc: RequiresLoginException) -> Re
 
 async def get_current_user(request: Request):
     user = request.session.get("user", None)
-    print(f"{user=}")
     if not user:
         raise RequiresLoginException(next="graphql")
     return user["user"]
@@ -138,3 +200,8 @@ app.include_router(
     prefix="/graphql",
     dependencies=[Depends(get_current_user)],
 )
+app.include_router(
+    export.router,
+    prefix="/export",
+    dependencies=[Depends(get_current_user)],
+)
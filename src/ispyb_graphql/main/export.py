@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+import datetime
+import enum
+import json
+from typing import AsyncIterator, Iterable, Optional, Sequence
+
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+from starlette.requests import Request
+
+from ispyb_graphql import config, crud, database
+from ispyb_graphql.api.definitions.data_collection import ScanType
+from ispyb_graphql.api.permissions import is_authorized_for_beamline
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+router = APIRouter()
+
+
+class ExportFormat(enum.Enum):
+    NDJSON = "ndjson"
+    ARROW = "arrow"
+
+
+MEDIA_TYPES = {
+    ExportFormat.NDJSON: "application/x-ndjson",
+    ExportFormat.ARROW: "application/vnd.apache.arrow.stream",
+}
+
+
+def _json_default(value):
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    return str(value)
+
+
+async def ndjson_chunks(
+    chunks: AsyncIterator[list], columns: Sequence
+) -> AsyncIterator[bytes]:
+    """Encode chunks of rows as newline-delimited JSON, one chunk at a time"""
+    keys = [column.key for column in columns]
+    async for rows in chunks:
+        yield "".join(
+            json.dumps(dict(zip(keys, row)), default=_json_default) + "\n"
+            for row in rows
+        ).encode()
+
+
+def arrow_schema(columns: Iterable) -> pyarrow.Schema:
+    types = {
+        int: pyarrow.int64(),
+        float: pyarrow.float64(),
+        str: pyarrow.string(),
+        datetime.datetime: pyarrow.timestamp("us"),
+    }
+    fields = []
+    for column in columns:
+        try:
+            python_type = column.type.python_type
+        except NotImplementedError:
+            python_type = str
+        fields.append(
+            pyarrow.field(column.key, types.get(python_type, pyarrow.string()))
+        )
+    return pyarrow.schema(fields)
+
+
+class _DrainingSink:
+    """A writable file object holding only what was written since the last drain"""
+
+    closed = False
+
+    def __init__(self):
+        self.buffers: list[bytes] = []
+
+    def write(self, data) -> int:
+        self.buffers.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self.buffers)
+        self.buffers.clear()
+        return data
+
+
+async def arrow_chunks(
+    chunks: AsyncIterator[list], columns: Sequence
+) -> AsyncIterator[bytes]:
+    """Encode chunks of rows as record batches of an Arrow IPC stream"""
+    schema = arrow_schema(columns)
+    sink = _DrainingSink()
+    writer = pyarrow.ipc.new_stream(sink, schema)
+    async for rows in chunks:
+        arrays = [
+            pyarrow.array(values, type=field.type)
+            for values, field in zip(zip(*rows), schema)
+        ]
+        writer.write_batch(pyarrow.record_batch(arrays, schema=schema))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+@router.get("/beamline/{name}/data_collections")
+async def export_beamline_data_collections(
+    request: Request,
+    name: str,
+    start_time: Optional[datetime.datetime] = None,
+    end_time: Optional[datetime.datetime] = None,
+    scan_type: Optional[ScanType] = None,
+    format: ExportFormat = ExportFormat.NDJSON,
+):
+    """Stream all data collections on a beamline matching the filters
+
+    Rather than paging through Beamline.dataCollections, the rows are read in
+    a single query through a server-side cursor and written out chunk by
+    chunk, so memory use is bounded by the chunk size however large the
+    export. Requires the same authorization as the beamline query.
+    """
+    if format is ExportFormat.ARROW and pyarrow is None:
+        raise HTTPException(406, "Arrow export requires the pyarrow package")
+    fedid = request.session["user"]["user"]
+    if not await is_authorized_for_beamline(fedid, name):
+        raise HTTPException(403, "User is not authorized for this beamline")
+
+    db = await database.get_db_session()
+    columns = crud.DATA_COLLECTION_COLUMNS
+    chunks = crud.stream_data_collections(
+        db,
+        columns=columns,
+        chunk_size=config.get_database_settings().export_chunk_size,
+        beamline=name,
+        start_time=start_time,
+        end_time=end_time,
+        scan_type=scan_type.value if scan_type else None,
+    )
+    encode = arrow_chunks if format is ExportFormat.ARROW else ndjson_chunks
+
+    async def body() -> AsyncIterator[bytes]:
+        try:
+            async for data in encode(chunks, columns):
+                yield data
+        finally:
+            await db.close()
+
+    return StreamingResponse(body(), media_type=MEDIA_TYPES[format])
@@ -0,0 +1,185 @@
+from __future__ import annotations
+
+import dataclasses
+import functools
+import hashlib
+import json
+import os
+from typing import Any, Optional
+
+from fastapi import Request, Response
+from fastapi.responses import JSONResponse
+from strawberry.fastapi import GraphQLRouter
+from strawberry.fastapi.handlers import GraphQLTransportWSHandler, GraphQLWSHandler
+from strawberry.subscriptions.protocols.graphql_transport_ws.types import (
+    ErrorMessage,
+    SubscribeMessage,
+)
+from strawberry.subscriptions.protocols.graphql_ws import GQL_ERROR
+
+from ispyb_graphql.cache import TTLCache
+
+
+class PersistedQueryError(Exception):
+    def __init__(self, message: str, code: str):
+        super().__init__(message)
+        self.message = message
+        self.code = code
+
+
+def query_hash(query: str) -> str:
+    return hashlib.sha256(query.encode()).hexdigest()
+
+
+class PersistedQueryStore:
+    """Resolves persisted query hashes to query documents
+
+    Supports Apollo-style automatic persisted queries, where a client sends
+    the sha256 hash of a query and only sends the full query (to be
+    registered) if the server does not know it. With an allow-list loaded,
+    only the queries in the allow-list may be executed and no new queries
+    can be registered.
+    """
+
+    def __init__(self, maxsize: int = 1000):
+        self.queries = TTLCache(maxsize=maxsize, ttl=None)
+        self.allow_list: Optional[dict[str, str]] = None
+
+    def load_allow_list(self, path: os.PathLike) -> None:
+        """Load an allow-list of queries from a JSON file of {sha256: query}"""
+        with open(path) as fh:
+            allow_list = json.load(fh)
+        for sha256, query in allow_list.items():
+            if query_hash(query) != sha256:
+                raise ValueError(f"Hash {sha256} in {path} does not match its query")
+        self.allow_list = allow_list
+
+    def lookup(self, sha256: str) -> Optional[str]:
+        if self.allow_list is not None:
+            return self.allow_list.get(sha256)
+        return self.queries.get(sha256)
+
+    def resolve(self, data: dict[str, Any]) -> dict[str, Any]:
+        """Fill in the query of a GraphQL request payload from its hash"""
+        extensions = data.get("extensions") or {}
+        if isinstance(extensions, str):
+            try:
+                extensions = json.loads(extensions)
+            except json.JSONDecodeError:
+                raise PersistedQueryError(
+                    "Unable to parse request extensions as JSON", "BAD_REQUEST"
+                )
+        persisted_query = extensions.get("persistedQuery")
+        query = data.get("query")
+
+        if not persisted_query:
+            if (
+                self.allow_list is not None
+                and query
+                and query_hash(query) not in self.allow_list
+            ):
+                raise PersistedQueryError(
+                    "Query is not in the allow-list", "PERSISTED_QUERY_NOT_ALLOWED"
+                )
+            return data
+
+        sha256 = persisted_query.get("sha256Hash")
+        if persisted_query.get("version") != 1 or not sha256:
+            raise PersistedQueryError(
+                "Unsupported persisted query version", "PERSISTED_QUERY_NOT_SUPPORTED"
+            )
+        if not query:
+            query = self.lookup(sha256)
+            if query is None:
+                raise PersistedQueryError(
+                    "PersistedQueryNotFound", "PERSISTED_QUERY_NOT_FOUND"
+                )
+            return {**data, "query": query}
+        if query_hash(query) != sha256:
+            raise PersistedQueryError(
+                "Provided sha256Hash does not match query", "BAD_REQUEST"
+            )
+        if self.allow_list is not None:
+            if sha256 not in self.allow_list:
+                raise PersistedQueryError(
+                    "Query is not in the allow-list", "PERSISTED_QUERY_NOT_ALLOWED"
+                )
+        else:
+            self.queries.set(sha256, query)
+        return data
+
+
+def error_payload(e: PersistedQueryError) -> dict:
+    return {"message": e.message, "extensions": {"code": e.code}}
+
+
+class PersistedQueryTransportWSHandler(GraphQLTransportWSHandler):
+    """Resolves the operations of graphql-transport-ws connections"""
+
+    def __init__(self, *args, persisted_queries: PersistedQueryStore, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.persisted_queries = persisted_queries
+
+    async def handle_subscribe(self, message: SubscribeMessage) -> None:
+        payload = message.payload
+        try:
+            data = self.persisted_queries.resolve(
+                {"query": payload.query, "extensions": payload.extensions}
+            )
+        except PersistedQueryError as e:
+            await self.send_message(
+                ErrorMessage(id=message.id, payload=[error_payload(e)])
+            )
+            return
+        message.payload = dataclasses.replace(payload, query=data["query"])
+        await super().handle_subscribe(message)
+
+
+class PersistedQueryWSHandler(GraphQLWSHandler):
+    """Resolves the operations of (legacy) graphql-ws connections"""
+
+    def __init__(self, *args, persisted_queries: PersistedQueryStore, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.persisted_queries = persisted_queries
+
+    async def handle_start(self, message) -> None:
+        try:
+            payload = self.persisted_queries.resolve(message.get("payload") or {})
+        except PersistedQueryError as e:
+            await self.send_message(GQL_ERROR, message["id"], error_payload(e))
+            return
+        await super().handle_start({**message, "payload": payload})
+
+
+class PersistedQueryRouter(GraphQLRouter):
+    """A GraphQLRouter that accepts persisted query hashes in place of queries
+
+    Operations sent over websockets are resolved, and checked against the
+    allow-list, in the same way as those sent over HTTP.
+    """
+
+    graphql_ws_handler_class = PersistedQueryWSHandler
+    graphql_transport_ws_handler_class = PersistedQueryTransportWSHandler
+
+    def __init__(self, *args, persisted_queries: PersistedQueryStore, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.persisted_queries = persisted_queries
+        self.graphql_ws_handler_class = functools.partial(
+            self.graphql_ws_handler_class, persisted_queries=persisted_queries
+        )
+        self.graphql_transport_ws_handler_class = functools.partial(
+            self.graphql_transport_ws_handler_class,
+            persisted_queries=persisted_queries,
+        )
+
+    async def execute_request(
+        self, request: Request, response: Response, data: dict, context, root_value
+    ) -> Response:
+        try:
+            data = self.persisted_queries.resolve(data)
+        except PersistedQueryError as e:
+            error_response = JSONResponse({"data": None, "errors": [error_payload(e)]})
+            return self._merge_responses(response, error_response)
+        return await super().execute_request(
+            request, response, data, context, root_value
+        )
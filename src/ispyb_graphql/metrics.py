@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+from prometheus_client import Counter, Gauge, Histogram
+from sqlalchemy.pool import QueuePool
+
+DB_POOL_SIZE = Gauge("ispyb_db_pool_size", "Configured size of the connection pool")
+DB_POOL_CHECKED_IN = Gauge(
+    "ispyb_db_pool_checked_in", "Idle connections available in the pool"
+)
+DB_POOL_CHECKED_OUT = Gauge(
+    "ispyb_db_pool_checked_out", "Connections currently checked out of the pool"
+)
+DB_POOL_OVERFLOW = Gauge(
+    "ispyb_db_pool_overflow", "Connections open in excess of the pool size"
+)
+DB_POOL_CHECKOUT_WAIT = Histogram(
+    "ispyb_db_pool_checkout_wait_seconds",
+    "Time spent waiting to check a connection out of the pool",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+
+QUERY_COST_BUCKETS = (10, 50, 100, 500, 1000, 5000, 10000, 50000, 100000)
+GRAPHQL_QUERY_COST_ESTIMATED = Histogram(
+    "graphql_query_cost_estimated",
+    "Estimated cost of GraphQL operations, before execution",
+    buckets=QUERY_COST_BUCKETS,
+)
+GRAPHQL_QUERY_COST_ACTUAL = Histogram(
+    "graphql_query_cost_actual",
+    "Cost of GraphQL operations, counted as fields were resolved",
+    buckets=QUERY_COST_BUCKETS,
+)
+GRAPHQL_QUERY_COST_REJECTED = Counter(
+    "graphql_query_cost_rejected",
+    "GraphQL operations rejected for exceeding the maximum query cost",
+)
+
+GRAPHQL_TRACED_OPERATIONS = Counter(
+    "graphql_traced_operations",
+    "GraphQL operations sampled for tracing",
+)
+GRAPHQL_N_PLUS_ONE = Counter(
+    "graphql_n_plus_one",
+    "Traced GraphQL operations that ran a likely N+1 query",
+)
+
+QUERY_DURATION = Histogram(
+    "ispyb_query_duration_seconds",
+    "Time taken by database queries",
+    ["query"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+QUERY_ROWS = Histogram(
+    "ispyb_query_rows",
+    "Rows returned by database queries",
+    ["query"],
+    buckets=(0, 1, 10, 100, 1000, 10000, 100000),
+)
+QUERY_BATCH_SIZE = Histogram(
+    "ispyb_query_batch_size",
+    "Keys per batched database query",
+    ["query"],
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500, 1000),
+)
+QUERY_ERRORS = Counter(
+    "ispyb_query_errors",
+    "Database queries that raised",
+    ["query"],
+)
+
+
+def instrument_pool(pool: QueuePool) -> None:
+    """Report the state of pool through the DB_POOL_* gauges"""
+    DB_POOL_SIZE.set_function(pool.size)
+    DB_POOL_CHECKED_IN.set_function(pool.checkedin)
+    DB_POOL_CHECKED_OUT.set_function(pool.checkedout)
+    DB_POOL_OVERFLOW.set_function(lambda: max(pool.overflow(), 0))
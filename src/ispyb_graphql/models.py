@@ -1,5 +1,3 @@
-from dataclasses import dataclass
-
 from ispyb.sqlalchemy import (
     AutoProc,
     AutoProcIntegration,
@@ -29,7 +27,6 @@ __all__ = [
     "AutoProcProgram",
     "AutoProcScaling",
     "AutoProcScalingStatistics",
-    "AutoProcessingResult",
     "BLSample",
     "BLSession",
     "Container",
@@ -46,10 +43,3 @@ __all__ = [
     "t_UserGroup_has_Permission",
     "t_UserGroup_has_Person",
 ]
-
-
-@dataclass
-class AutoProcessingResult:
-    AutoProc: AutoProc
-    AutoProcIntegration: AutoProcIntegration
-    AutoProcProgram: AutoProcProgram
@@ -0,0 +1,308 @@
+"""Span trees of traced GraphQL operations and the SQL statements they run
+
+A Trace is started for a sampled operation by api.tracing.TracingExtension
+and made current for the task executing it, and so for the tasks it starts
+(e.g. DataLoader batches), through a context variable. Resolvers, DataLoader
+batches and SQL statements are recorded as spans below whichever span was
+current where they started. SQL statements are recorded by SQLAlchemy event
+hooks on the engine (see instrument_engine()), which cost a context variable
+lookup per statement when no operation is being traced.
+
+Statements are also counted by their shape, i.e. with parameters (and lists
+of parameters) replaced by a single placeholder, so that statements run once
+per parent object rather than once per batch (N+1 queries) stand out.
+
+Finished traces are handed to the exporter, which by default logs a summary;
+OpenTelemetryExporter instead replays each trace through an OpenTelemetry
+tracer. Span attributes follow OpenTelemetry naming conventions.
+"""
+
+from __future__ import annotations
+
+import collections
+import contextlib
+import contextvars
+import dataclasses
+import functools
+import logging
+import re
+import time
+from typing import Any, Iterator, Optional
+
+from sqlalchemy import event
+
+from ispyb_graphql import config
+
+try:
+    from opentelemetry import trace as otel_trace
+except ImportError:
+    otel_trace = None
+
+logger = logging.getLogger(__name__)
+
+
+@dataclasses.dataclass
+class Span:
+    name: str
+    # "operation", "resolver", "batch" or "sql"
+    kind: str
+    # time.perf_counter() at the start and end of the span
+    start: float
+    end: Optional[float] = None
+    attributes: dict[str, Any] = dataclasses.field(default_factory=dict)
+    children: list[Span] = dataclasses.field(default_factory=list)
+
+    @property
+    def duration(self) -> float:
+        return (self.end if self.end is not None else self.start) - self.start
+
+    def walk(self) -> Iterator[Span]:
+        """This span and all of those below it, depth first"""
+        yield self
+        for child in self.children:
+            yield from child.walk()
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "kind": self.kind,
+            "duration_ms": self.duration * 1000,
+            "attributes": self.attributes,
+            "children": [child.to_dict() for child in self.children],
+        }
+
+
+class Trace:
+    """The spans of one operation, at most max_spans of them"""
+
+    def __init__(self, name: str, max_spans: int):
+        self.started_ns = time.time_ns()
+        self.root = Span(name, "operation", time.perf_counter())
+        self.max_spans = max_spans
+        self.spans = 1
+        self.dropped_spans = 0
+        # Number of statements run, by shape
+        self.statements: collections.Counter[str] = collections.Counter()
+
+    def start_span(
+        self, parent: Span, name: str, kind: str, attributes: dict[str, Any]
+    ) -> Optional[Span]:
+        if self.spans >= self.max_spans:
+            self.dropped_spans += 1
+            return None
+        span = Span(name, kind, time.perf_counter(), attributes=attributes)
+        parent.children.append(span)
+        self.spans += 1
+        return span
+
+    def finish(self, name: Optional[str] = None) -> None:
+        self.root.end = time.perf_counter()
+        if name:
+            self.root.name = name
+
+    def time_ns(self, perf_counter: float) -> int:
+        """The wall clock time, in ns since the epoch, of a span's start or end"""
+        return self.started_ns + int((perf_counter - self.root.start) * 1e9)
+
+    def repeated_statements(self, threshold: int) -> list[tuple[str, int]]:
+        """The shapes of statements run more than threshold times, most first"""
+        return [
+            (shape, count)
+            for shape, count in self.statements.most_common()
+            if count > threshold
+        ]
+
+
+# The trace of the operation being executed, and the span new spans go below
+_current: contextvars.ContextVar[Optional[tuple[Trace, Span]]] = contextvars.ContextVar(
+    "ispyb_graphql_trace", default=None
+)
+
+
+def activate(trace: Trace) -> contextvars.Token:
+    """Make trace current, until deactivate() is given the token returned"""
+    return _current.set((trace, trace.root))
+
+
+def deactivate(token: contextvars.Token) -> None:
+    _current.reset(token)
+
+
+def current_trace() -> Optional[Trace]:
+    current = _current.get()
+    return current[0] if current else None
+
+
+@contextlib.contextmanager
+def span(
+    name: str, kind: str, attributes: Optional[dict[str, Any]] = None
+) -> Iterator[Optional[Span]]:
+    """Record a span below the current one, if the operation is traced"""
+    current = _current.get()
+    if current is None:
+        yield None
+        return
+    trace, parent = current
+    new = trace.start_span(parent, name, kind, attributes or {})
+    if new is None:
+        yield None
+        return
+    token = _current.set((trace, new))
+    try:
+        yield new
+    except BaseException as e:
+        new.attributes["error"] = repr(e)
+        raise
+    finally:
+        new.end = time.perf_counter()
+        _current.reset(token)
+
+
+def function_name(function) -> str:
+    """The name of a function, looking through functools.partial"""
+    while isinstance(function, functools.partial):
+        function = function.func
+    return getattr(function, "__name__", type(function).__name__)
+
+
+_PLACEHOLDER = re.compile(r"%\(\w+\)s|%s|\?")
+_PLACEHOLDER_LIST = re.compile(r"\?(?:\s*,\s*\?)+")
+_REPEATED_CLAUSE = re.compile(r"(\([^()]*\))(?:\s+OR\s+\1)+")
+
+
+def statement_shape(statement: str) -> str:
+    """The statement with its parameters, however many, replaced by one `?`"""
+    shape = _PLACEHOLDER.sub("?", statement)
+    shape = _PLACEHOLDER_LIST.sub("?", shape)
+    # e.g. the (code, number) pairs of get_proposals()
+    shape = _REPEATED_CLAUSE.sub(r"\1", shape)
+    return " ".join(shape.split())
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    current = _current.get()
+    if current is None or context is None:
+        return
+    trace, parent = current
+    shape = statement_shape(statement)
+    trace.statements[shape] += 1
+    context._trace_span = trace.start_span(
+        parent,
+        shape,
+        "sql",
+        {"db.system": conn.dialect.name, "db.statement": statement},
+    )
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    span = getattr(context, "_trace_span", None)
+    if span is not None:
+        span.end = time.perf_counter()
+        if cursor.rowcount >= 0:
+            span.attributes["db.rows"] = cursor.rowcount
+
+
+def _handle_error(exception_context):
+    span = getattr(exception_context.execution_context, "_trace_span", None)
+    if span is not None:
+        span.end = time.perf_counter()
+        span.attributes["error"] = repr(exception_context.original_exception)
+
+
+def instrument_engine(engine) -> None:
+    """Record the statements run through engine in the current trace"""
+    engine = getattr(engine, "sync_engine", engine)
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+
+class LogExporter:
+    """Log a summary of each trace at INFO level, with the full span tree in
+    the record's extra fields
+    """
+
+    def __init__(self, slowest: int = 5):
+        self.slowest = slowest
+
+    def export(self, trace: Trace) -> None:
+        spans = sorted(
+            (span for span in trace.root.walk() if span.kind != "operation"),
+            key=lambda span: span.duration,
+            reverse=True,
+        )
+        logger.info(
+            "%s took %.1f ms, running %d statements; slowest: %s",
+            trace.root.name,
+            trace.root.duration * 1000,
+            sum(trace.statements.values()),
+            ", ".join(
+                f"{span.name} ({span.duration * 1000:.1f} ms)"
+                for span in spans[: self.slowest]
+            ),
+            extra={"trace": trace.root.to_dict()},
+        )
+
+
+def _otel_attribute(value: Any) -> Any:
+    if isinstance(value, (str, bool, int, float)):
+        return value
+    return str(value)
+
+
+class OpenTelemetryExporter:
+    """Replay each trace as OpenTelemetry spans
+
+    Spans go to the tracer provider configured by the application (e.g. an
+    SDK TracerProvider with an OTLP exporter), or to tracer if given.
+    """
+
+    def __init__(self, tracer=None):
+        if otel_trace is None:
+            raise RuntimeError(
+                "The OpenTelemetry exporter requires the opentelemetry-api package"
+            )
+        self.tracer = tracer or otel_trace.get_tracer("ispyb_graphql")
+
+    def export(self, trace: Trace) -> None:
+        self._export(trace, trace.root, None)
+
+    def _export(self, trace: Trace, span: Span, parent) -> None:
+        otel_span = self.tracer.start_span(
+            span.name,
+            context=otel_trace.set_span_in_context(parent) if parent else None,
+            kind=(
+                otel_trace.SpanKind.SERVER
+                if span.kind == "operation"
+                else otel_trace.SpanKind.INTERNAL
+            ),
+            attributes={
+                key: _otel_attribute(value) for key, value in span.attributes.items()
+            },
+            start_time=trace.time_ns(span.start),
+        )
+        for child in span.children:
+            self._export(trace, child, otel_span)
+        otel_span.end(
+            end_time=trace.time_ns(span.end if span.end is not None else span.start)
+        )
+
+
+EXPORTERS = {
+    "log": LogExporter,
+    "opentelemetry": OpenTelemetryExporter,
+}
+
+_exporter = None
+
+
+def get_exporter():
+    global _exporter
+    if _exporter is None:
+        _exporter = EXPORTERS[config.get_graphql_settings().tracing_exporter]()
+    return _exporter
+
+
+def set_exporter(exporter) -> None:
+    global _exporter
+    _exporter = exporter
@@ -3,11 +3,11 @@
 import os
 
 import pytest
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import sessionmaker
 
 import ispyb_graphql
-from ispyb_graphql.api import permissions
+from ispyb_graphql.api import access, entity_cache, permissions
 
 
 @pytest.fixture()
@@ -22,12 +22,38 @@ async def testdb(monkeypatch):
     SQLALCHEMY_DATABASE_URL = ispyb_graphql.database.get_database_url(
         connector="asyncmy"
     )
-    engine = create_async_engine(SQLALCHEMY_DATABASE_URL, future=True)
+    engine = ispyb_graphql.database.create_engine(SQLALCHEMY_DATABASE_URL)
     SessionLocal = sessionmaker(engine, class_=AsyncSession)
     monkeypatch.setattr(ispyb_graphql.database, "SessionLocal", SessionLocal)
     return config_file
 
 
+class FakeResult(list):
+    def all(self):
+        return list(self)
+
+
+class FakeSession:
+    """A database session answering every statement with the same rows"""
+
+    def __init__(self, rows=()):
+        self.rows = list(rows)
+        self.statements = []
+        self.closed = False
+
+    async def execute(self, stmt):
+        self.statements.append(stmt)
+        return FakeResult(self.rows)
+
+    async def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def fake_session():
+    return FakeSession()
+
+
 @pytest.fixture
 def mock_authentication(mocker):
     mocker.patch.object(
@@ -39,3 +65,25 @@ def mock_authentication(mocker):
     mocker.patch.object(
         permissions.IsAuthenticatedForBeamline, "has_permission", return_value=True
     )
+    mocker.patch.object(
+        permissions.IsAuthenticatedForSample, "has_permission", return_value=True
+    )
+    mocker.patch.object(
+        permissions.IsAuthenticatedForDataCollection,
+        "has_permission",
+        return_value=True,
+    )
+
+
+@pytest.fixture(autouse=True)
+def reset_entity_cache():
+    entity_cache.set_entity_cache(None)
+    yield
+    entity_cache.set_entity_cache(None)
+
+
+@pytest.fixture(autouse=True)
+def reset_access_indexes():
+    access.set_access_indexes(None)
+    yield
+    access.set_access_indexes(None)
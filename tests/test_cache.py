@@ -0,0 +1,157 @@
+import asyncio
+
+import pytest
+
+from ispyb_graphql import crud, database
+from ispyb_graphql.api import access
+from ispyb_graphql.cache import MISSING, TTLCache, approximate_size
+
+
+class FakeTimer:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_ttl_cache_expiry():
+    timer = FakeTimer()
+    cache = TTLCache(maxsize=10, ttl=5, timer=timer)
+    cache.set("a", 1)
+    cache.set("b", 2, ttl=1)
+    assert cache.get("a") == 1
+    assert cache.get("b") == 2
+    timer.now = 2
+    assert cache.get("a") == 1
+    assert cache.get("b", MISSING) is MISSING
+    timer.now = 5
+    assert "a" not in cache
+
+
+def test_ttl_cache_lru_eviction():
+    cache = TTLCache(maxsize=2, ttl=None)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert "a" in cache
+    assert "b" not in cache
+    assert "c" in cache
+    assert len(cache) == 2
+
+
+def test_ttl_cache_invalidation():
+    cache = TTLCache(maxsize=10, ttl=None)
+    cache.set(("fedid1", "visit", "cm14451-1"), True)
+    cache.set(("fedid2", "visit", "cm14451-1"), False)
+    cache.invalidate_where(lambda key: key[0] == "fedid1")
+    assert ("fedid1", "visit", "cm14451-1") not in cache
+    assert ("fedid2", "visit", "cm14451-1") in cache
+    cache.invalidate(("fedid2", "visit", "cm14451-1"))
+    assert len(cache) == 0
+
+
+@pytest.mark.asyncio
+async def test_access_index_refresh(mocker):
+    get_user_access = mocker.patch.object(
+        crud,
+        "get_user_access",
+        return_value=([("cm", 14451)], [("cm", 14451, 1)], {"mx"}),
+    )
+    timer = FakeTimer()
+    indexes = access.AccessIndexes(maxsize=10, refresh_interval=300, timer=timer)
+    index = await indexes.build(None, "fedid")
+    assert index.is_on_proposal(("cm", 14451))
+    assert index.is_on_session(("cm", 14451, 1))
+    assert not index.is_on_session(("cm", 14451, 2))
+    assert index.is_beamline_admin("i03")
+    assert not index.is_beamline_admin("i11")
+    assert await indexes.get("fedid") is index
+    assert get_user_access.await_count == 1
+
+    timer.now = 300
+    get_user_access.return_value = ([], [], set())
+    index = await indexes.get("fedid")
+    assert not index.is_on_proposal(("cm", 14451))
+    assert get_user_access.await_count == 2
+
+    indexes.invalidate("fedid")
+    await indexes.get("fedid")
+    assert get_user_access.await_count == 3
+
+
+@pytest.mark.asyncio
+async def test_access_index_concurrent_build(mocker):
+    started = asyncio.Event()
+    release = asyncio.Event()
+
+    async def get_user_access(db, fedid):
+        started.set()
+        await release.wait()
+        return [], [], set()
+
+    get_user_access = mocker.patch.object(
+        crud, "get_user_access", side_effect=get_user_access
+    )
+    indexes = access.AccessIndexes(maxsize=10, refresh_interval=300)
+    first = asyncio.ensure_future(indexes.get("fedid"))
+    await started.wait()
+    second = asyncio.ensure_future(indexes.get("fedid"))
+    release.set()
+    assert await first is await second
+    assert get_user_access.await_count == 1
+
+
+def test_ttl_cache_size_bound():
+    cache = TTLCache(maxsize=100, ttl=None, getsizeof=len)
+    cache.set("a", "x" * 40)
+    cache.set("b", "x" * 40)
+    assert cache.currsize == 80
+    cache.set("c", "x" * 40)
+    assert "a" not in cache and "b" in cache and "c" in cache
+    assert cache.currsize == 80
+    cache.set("b", "x" * 10)
+    assert cache.currsize == 50
+    # A value larger than the whole cache is not stored
+    cache.set("d", "x" * 101)
+    assert "d" not in cache and cache.currsize == 50
+    cache.invalidate("c")
+    assert cache.currsize == 10
+
+
+def test_approximate_size():
+    row = (1, "a" * 1000)
+    assert approximate_size(row) > 1000
+    assert approximate_size([row, row]) > 2 * approximate_size(row)
+
+
+@pytest.mark.asyncio
+async def test_access_index_built_in_own_session(mocker):
+    started = asyncio.Event()
+    release = asyncio.Event()
+    sessions = []
+
+    async def get_user_access(db, fedid):
+        sessions.append(db)
+        started.set()
+        await release.wait()
+        await db.execute("SELECT 1")
+        return [], [], set()
+
+    mocker.patch.object(crud, "get_user_access", side_effect=get_user_access)
+    session = mocker.AsyncMock()
+    mocker.patch.object(database, "get_db_session", return_value=session)
+    indexes = access.AccessIndexes(maxsize=10, refresh_interval=300)
+    first = asyncio.ensure_future(indexes.get("fedid"))
+    await started.wait()
+    second = asyncio.ensure_future(indexes.get("fedid"))
+    # The request that started the build ends, the other still waits for it
+    first.cancel()
+    release.set()
+    index = await second
+    assert indexes.indexes.get("fedid") is index
+    # The build's own session is closed once it is done
+    (db,) = sessions
+    assert isinstance(db, database.RequestSession)
+    session.close.assert_awaited_once()
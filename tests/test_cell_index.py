@@ -0,0 +1,167 @@
+import types
+
+import pytest
+
+from ispyb_graphql import crud
+from ispyb_graphql.api import cell_index, schema
+
+
+def cell_row(auto_proc_id, a, b, c, alpha=90.0, beta=90.0, gamma=90.0, dcid=1):
+    return types.SimpleNamespace(
+        autoProcId=auto_proc_id,
+        dataCollectionId=dcid,
+        processingPrograms="xia2 dials",
+        spaceGroup="P 41 21 2",
+        refinedCell_a=a,
+        refinedCell_b=b,
+        refinedCell_c=c,
+        refinedCell_alpha=alpha,
+        refinedCell_beta=beta,
+        refinedCell_gamma=gamma,
+    )
+
+
+ROWS = [
+    cell_row(1, 78.1, 78.1, 37.2),
+    cell_row(2, 78.9, 78.9, 37.5),
+    cell_row(3, 79.0, 79.0, 38.5),
+    cell_row(4, 78.1, 78.1, 37.2, gamma=120.0),
+    cell_row(5, 57.8, 57.8, 150.2),
+    cell_row(6, None, None, None, None, None, None),
+]
+
+
+def auto_proc_ids(matches):
+    return [match.row.autoProcId for match in matches]
+
+
+def test_cell_index_search():
+    index = cell_index.CellIndex()
+    index.add(ROWS)
+    assert len(index) == 5
+    assert index.last_auto_proc_id == 6
+    target = (78.0, 78.0, 37.0, 90.0, 90.0, 90.0)
+    matches = index.search(target, tolerance=0.02, angle_tolerance=2)
+    assert auto_proc_ids(matches) == [1, 2]
+    assert matches[0].length_difference == pytest.approx(0.2 / 37)
+    assert matches[0].angle_difference == 0
+    assert auto_proc_ids(index.search(target, 0.05, 2)) == [1, 2, 3]
+    assert auto_proc_ids(index.search(target, 0.02, 30)) == [1, 2, 4]
+    # Wide searches visit the occupied grid cells rather than every one
+    assert auto_proc_ids(index.search(target, 0.9, 2)) == [1, 2, 3]
+
+
+@pytest.mark.asyncio
+async def test_cell_indexes_refresh(mocker):
+    now = [0.0]
+    indexes = cell_index.CellIndexes(
+        maxsize=2, refresh_interval=60, timer=lambda: now[0]
+    )
+    get_unit_cells = mocker.patch.object(
+        crud, "get_unit_cells_for_proposal", return_value=ROWS[:2]
+    )
+    index = await indexes.get(None, proposal_id=1)
+    assert len(index) == 2
+    assert await indexes.get(None, proposal_id=1) is index
+    get_unit_cells.assert_called_once_with(None, 1, after=0)
+
+    # Only results added since the last refresh are fetched
+    now[0] = 60
+    get_unit_cells.return_value = ROWS[2:3]
+    assert len(await indexes.get(None, proposal_id=1)) == 3
+    get_unit_cells.assert_called_with(None, 1, after=2)
+
+
+QUERY = """
+query ProposalQuery {
+  proposal(name: "cm14451") {
+    similarCells(to: {a: 78, b: 78, c: 37, alpha: 90, beta: 90, gamma: 90}) {
+      autoProcessing {
+        dcid
+        spaceGroup
+        unitCell {
+          a
+          c
+        }
+      }
+      lengthDifference
+      angleDifference
+    }
+  }
+}
+"""
+
+
+@pytest.mark.asyncio
+async def test_similar_cells(mock_authentication, mocker):
+    cell_index.set_cell_indexes(None)
+    mocker.patch.object(
+        crud,
+        "get_proposals",
+        return_value=[
+            types.SimpleNamespace(proposalId=1, proposalCode="cm", proposalNumber=14451)
+        ],
+    )
+    mocker.patch.object(crud, "get_unit_cells_for_proposal", return_value=ROWS)
+    try:
+        result = await schema.schema.execute(QUERY)
+    finally:
+        cell_index.set_cell_indexes(None)
+    assert result.errors is None
+    similar_cells = result.data["proposal"]["similarCells"]
+    assert [cell["autoProcessing"]["unitCell"]["c"] for cell in similar_cells] == [
+        37.2,
+        37.5,
+    ]
+    assert similar_cells[0]["autoProcessing"]["dcid"] == 1
+    assert similar_cells[0]["angleDifference"] == 0
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "arguments,message",
+    [
+        (
+            "to: {a: 0, b: 78, c: 37, alpha: 90, beta: 90, gamma: 90}",
+            "The lengths of the cell must be positive",
+        ),
+        (
+            "to: {a: 78, b: 78, c: -37, alpha: 90, beta: 90, gamma: 90}",
+            "The lengths of the cell must be positive",
+        ),
+        (
+            "to: {a: 78, b: 78, c: 37, alpha: 90, beta: 90, gamma: 90}, tolerance: 0",
+            "tolerance must be between 0 and 1",
+        ),
+        (
+            "to: {a: 78, b: 78, c: 37, alpha: 90, beta: 90, gamma: 90}, tolerance: -1",
+            "tolerance must be between 0 and 1",
+        ),
+        (
+            "to: {a: 78, b: 78, c: 37, alpha: 90, beta: 90, gamma: 90}, "
+            "angleTolerance: -1",
+            "angleTolerance must not be negative",
+        ),
+        (
+            "to: {a: 78, b: 78, c: 37, alpha: 90, beta: 90, gamma: 90}, limit: -1",
+            "limit must not be negative",
+        ),
+    ],
+)
+async def test_similar_cells_invalid_arguments(
+    mock_authentication, mocker, arguments, message
+):
+    mocker.patch.object(
+        crud,
+        "get_proposals",
+        return_value=[
+            types.SimpleNamespace(proposalId=1, proposalCode="cm", proposalNumber=14451)
+        ],
+    )
+    get_unit_cells = mocker.patch.object(crud, "get_unit_cells_for_proposal")
+    result = await schema.schema.execute(
+        f'{{ proposal(name: "cm14451") {{ similarCells({arguments}) {{ '
+        "lengthDifference } } }"
+    )
+    assert [error.message for error in result.errors] == [message]
+    get_unit_cells.assert_not_called()
@@ -0,0 +1,117 @@
+import pytest
+from graphql import parse
+
+from ispyb_graphql import config, crud
+from ispyb_graphql.api import schema
+from ispyb_graphql.api.cost import estimate_query_cost
+
+QUERY = """
+query ProposalQuery($first: Int) {
+  proposal(name: "cm14451") {
+    samples {
+      ...SampleFields
+    }
+  }
+}
+
+fragment SampleFields on Sample {
+  name
+  dataCollections(first: $first) {
+    pageInfo {
+      hasNextPage
+    }
+    edges {
+      node {
+        dcid
+        autoProcessings {
+          program
+        }
+      }
+    }
+  }
+}
+"""
+
+
+def test_estimate_query_cost():
+    graphql_schema = schema.schema._schema
+    document = parse(QUERY)
+    # proposal: 2 + 50 samples * (1 + dataCollections)
+    # dataCollections: 1 + pageInfo 1 + first * (edge 1 + node 1 + 10 * 2)
+    cost = estimate_query_cost(graphql_schema, document, variables={"first": 1000})
+    assert cost == 2 + 50 * (1 + 1 + 1 + 1000 * (1 + 1 + 10 * 2))
+    default_cost = estimate_query_cost(graphql_schema, document)
+    assert default_cost == 2 + 50 * (1 + 1 + 1 + 10 * (1 + 1 + 10 * 2))
+
+
+@pytest.mark.asyncio
+async def test_query_cost_rejected(mock_authentication, mocker, monkeypatch):
+    monkeypatch.setattr(
+        config,
+        "get_graphql_settings",
+        lambda: config.GraphQLSettings(max_query_cost=10000),
+    )
+    get_proposals = mocker.patch.object(crud, "get_proposals")
+    result = await schema.schema.execute(QUERY, variable_values={"first": 1000})
+    assert result.data is None
+    assert result.errors[0].message == (
+        "Query cost 1100152 exceeds the maximum allowed cost of 10000"
+    )
+    get_proposals.assert_not_called()
+
+
+def test_page_size_cost():
+    graphql_schema = schema.schema._schema
+    # The rows of a page are fetched even if no edges are selected
+    document = parse(
+        """
+        query { beamline(name: "i03") {
+          dataCollections(first: 100000) { pageInfo { hasNextPage } }
+        } }
+        """
+    )
+    assert estimate_query_cost(graphql_schema, document) >= 100000
+
+
+@pytest.mark.asyncio
+async def test_negative_page_size_rejected(mock_authentication, mocker):
+    get_proposals = mocker.patch.object(crud, "get_proposals")
+    result = await schema.schema.execute(QUERY, variable_values={"first": -1})
+    assert result.data is None
+    assert result.errors[0].message == "first must not be negative"
+    get_proposals.assert_not_called()
+
+
+SUBSCRIPTION = """
+subscription BeamlineDataCollections($chunkSize: Int!) {
+  beamlineDataCollections(name: "i03", chunkSize: $chunkSize) {
+    edges {
+      node {
+        dcid
+        autoProcessings {
+          program
+        }
+      }
+    }
+  }
+}
+"""
+
+
+@pytest.mark.asyncio
+async def test_subscription_cost_rejected(mock_authentication, mocker, monkeypatch):
+    monkeypatch.setattr(
+        config,
+        "get_graphql_settings",
+        lambda: config.GraphQLSettings(max_query_cost=1000),
+    )
+    get_page = mocker.patch.object(crud, "get_data_collections_page")
+    context = {"request": mocker.Mock(session={"user": {"user": "abc12345"}})}
+    # Costed per message of chunkSize edges
+    result = await schema.schema.subscribe(
+        SUBSCRIPTION, variable_values={"chunkSize": 100}, context_value=context
+    )
+    assert result.errors[0].message == (
+        "Query cost 2201 exceeds the maximum allowed cost of 1000"
+    )
+    get_page.assert_not_called()
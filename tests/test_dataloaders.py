@@ -0,0 +1,116 @@
+import datetime
+import types
+
+import pytest
+
+from ispyb_graphql import crud
+from ispyb_graphql.api.dataloaders import (
+    IDLoader,
+    batch_load,
+    cached_batch_load,
+    missing_error,
+    order_by_keys,
+)
+from ispyb_graphql.api.definitions import load_auto_processings
+from ispyb_graphql.cache import TTLCache
+
+
+def test_order_by_keys():
+    rows = [{"id": 3}, {"id": 1}]
+    assert order_by_keys([1, 2, 3], rows, key_of=lambda r: r["id"]) == [
+        {"id": 1},
+        None,
+        {"id": 3},
+    ]
+    values = order_by_keys(
+        [2, 3],
+        rows,
+        key_of=lambda r: r["id"],
+        transform=lambda r: r["id"] * 10,
+        missing=missing_error("Thing"),
+    )
+    assert isinstance(values[0], LookupError)
+    assert str(values[0]) == "Thing 2 not found"
+    assert values[1] == 30
+
+
+@pytest.mark.asyncio
+async def test_batch_load_dedupes_keys():
+    fetched = []
+
+    async def fetch(keys):
+        fetched.append(keys)
+        return [{"id": k} for k in reversed(keys)]
+
+    values = await batch_load([2, 1, 2], fetch, key_of=lambda r: r["id"])
+    assert fetched == [[2, 1]]
+    assert values == [{"id": 2}, {"id": 1}, {"id": 2}]
+
+
+@pytest.mark.asyncio
+async def test_id_loader_coerces_keys():
+    batches = []
+
+    async def load(keys):
+        batches.append(keys)
+        return [k * 2 for k in keys]
+
+    loader = IDLoader(load)
+    assert await loader.load_many(["1", 1, 2]) == [2, 2, 4]
+    assert batches == [[1, 2]]
+
+
+@pytest.mark.asyncio
+async def test_cached_batch_load():
+    cache = TTLCache(maxsize=10, ttl=None)
+    fetched = []
+
+    async def fetch(keys):
+        fetched.append(keys)
+        return [{"id": k, "done": k != 3} if k != 4 else None for k in keys]
+
+    kwargs = dict(
+        cache=cache,
+        namespace="Thing",
+        transform=lambda r: r["id"],
+        missing=missing_error("Thing"),
+        cacheable=lambda r: r["done"],
+    )
+    values = await cached_batch_load([1, 2, 1, 3], fetch, **kwargs)
+    assert values == [1, 2, 1, 3]
+    values = await cached_batch_load([2, 3, 4, 1], fetch, **kwargs)
+    assert values[:2] == [2, 3] and values[3] == 1
+    assert isinstance(values[2], LookupError)
+    # Only the values that were not cacheable, or missing, are fetched again
+    assert fetched == [[1, 2, 3], [3, 4]]
+    assert ("Thing", 1) in cache and ("Thing", 3) not in cache
+
+
+@pytest.mark.asyncio
+async def test_auto_processings_cached_once_finished(mocker):
+    def result(dcid, end_time):
+        return types.SimpleNamespace(
+            dataCollectionId=dcid,
+            dataCollectionEndTime=end_time,
+            autoProcId=dcid,
+            processingPrograms="xia2 dials",
+            spaceGroup="P 1",
+        )
+
+    finished = datetime.datetime(2021, 1, 1)
+    get_auto_processings = mocker.patch.object(
+        crud,
+        "get_auto_processing_results_for_dcids",
+        side_effect=lambda db, dcids, columns: [
+            {1: (result(1, finished),), 2: (result(2, None),), 3: ()}[dcid]
+            for dcid in dcids
+        ],
+    )
+    for _ in range(2):
+        results = await load_auto_processings(None, [1, 2, 3])
+        assert [len(r) for r in results] == [1, 1, 0]
+    # Results of running data collections, or no results yet, are fetched again
+    assert [call.args[1] for call in get_auto_processings.call_args_list] == [
+        [1, 2, 3],
+        [2, 3],
+    ]
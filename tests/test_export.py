@@ -0,0 +1,87 @@
+import datetime
+import json
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from starlette.middleware.sessions import SessionMiddleware
+from starlette.requests import Request
+
+from ispyb_graphql import crud, database
+from ispyb_graphql.main import export
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.add_middleware(SessionMiddleware, secret_key="test")
+
+    @app.get("/login")
+    def login(request: Request):
+        request.session["user"] = {"user": "abc12345"}
+
+    app.include_router(export.router, prefix="/export")
+    client = TestClient(app)
+    client.get("/login")
+    return client
+
+
+@pytest.fixture
+def db(mocker, fake_session):
+    mocker.patch.object(database, "get_db_session", return_value=fake_session)
+    return fake_session
+
+
+def rows(dcid):
+    keys = [column.key for column in crud.DATA_COLLECTION_COLUMNS]
+    row = dict.fromkeys(keys)
+    row.update(dataCollectionId=dcid, startTime=datetime.datetime(2021, 1, dcid))
+    return tuple(row.values())
+
+
+def test_export_ndjson(client, db, mocker):
+    mocker.patch.object(export, "is_authorized_for_beamline", return_value=True)
+
+    async def stream_data_collections(db, columns, chunk_size, **filters):
+        assert filters["beamline"] == "i03"
+        assert filters["scan_type"] == "rotation"
+        yield [rows(1), rows(2)]
+        yield [rows(3)]
+
+    mocker.patch.object(crud, "stream_data_collections", stream_data_collections)
+    response = client.get(
+        "/export/beamline/i03/data_collections", params={"scan_type": "rotation"}
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    records = [json.loads(line) for line in response.text.splitlines()]
+    assert [r["dataCollectionId"] for r in records] == [1, 2, 3]
+    assert records[0]["startTime"] == "2021-01-01T00:00:00"
+    assert db.closed
+
+
+def test_export_arrow(client, db, mocker):
+    pyarrow = pytest.importorskip("pyarrow")
+    mocker.patch.object(export, "is_authorized_for_beamline", return_value=True)
+
+    async def stream_data_collections(db, columns, chunk_size, **filters):
+        yield [rows(1), rows(2)]
+        yield [rows(3)]
+
+    mocker.patch.object(crud, "stream_data_collections", stream_data_collections)
+    response = client.get(
+        "/export/beamline/i03/data_collections", params={"format": "arrow"}
+    )
+    assert response.status_code == 200
+    table = pyarrow.ipc.open_stream(response.content).read_all()
+    assert table.column("dataCollectionId").to_pylist() == [1, 2, 3]
+
+
+def test_export_requires_authorization(client, db, mocker):
+    mocker.patch.object(export, "is_authorized_for_beamline", return_value=False)
+    stream = mocker.patch.object(crud, "stream_data_collections")
+    response = client.get("/export/beamline/i03/data_collections")
+    assert response.status_code == 403
+    stream.assert_not_called()
+    # No session is opened for a request that is not authorized
+    database.get_db_session.assert_not_called()
@@ -0,0 +1,38 @@
+import types
+
+import pytest
+
+from ispyb_graphql import crud
+from ispyb_graphql.grouping import Groups, group_rows
+
+
+def row(key, value):
+    return types.SimpleNamespace(autoProcId=key, value=value)
+
+
+def values(groups):
+    return [[r.value for r in group] for group in groups]
+
+
+def test_group_rows_interleaved():
+    rows = [row(1, "a"), row(2, "b"), row(1, "c"), row(3, "d"), row(2, "e")]
+    groups = group_rows([2, 4, 1], rows, "autoProcId")
+    assert values(groups) == [["b", "e"], [], ["a", "c"]]
+    assert all(isinstance(group, tuple) for group in groups)
+
+
+def test_groups_partitions():
+    groups = Groups([1, 2], key=lambda r: r.autoProcId)
+    groups.add([row(1, "a"), row(2, "b")])
+    groups.add(iter([row(2, "c"), row(1, "d")]))
+    assert values(groups.result()) == [["a", "d"], ["b", "c"]]
+
+
+@pytest.mark.asyncio
+async def test_scaling_statistics_interleaved(fake_session):
+    # Rows for the same key need not be adjacent
+    fake_session.rows = [row(1, "overall"), row(2, "overall"), row(1, "outerShell")]
+    statistics = await crud.get_auto_proc_scaling_statistics_for_apids(
+        fake_session, [1, 2]
+    )
+    assert values(statistics) == [["overall", "outerShell"], ["overall"]]
@@ -0,0 +1,97 @@
+import logging
+
+import pytest
+from prometheus_client import REGISTRY
+
+from ispyb_graphql import instrumentation
+
+
+@pytest.fixture(autouse=True)
+def sample_rate():
+    instrumentation.set_log_sample_rate(0)
+    yield
+    instrumentation.set_log_sample_rate(None)
+
+
+def sample(name, query, **labels):
+    return REGISTRY.get_sample_value(name, {"query": query, **labels}) or 0
+
+
+@instrumentation.instrumented(batch="ids")
+async def get_things(db, ids, columns=()):
+    return [(i,) for i in ids]
+
+
+@instrumentation.instrumented(rows=instrumentation.count_grouped_rows)
+async def get_grouped_things(db, ids):
+    return [((i,), (i,)) for i in ids]
+
+
+@instrumentation.instrumented()
+async def fail(db):
+    raise ValueError
+
+
+@instrumentation.instrumented()
+async def stream_things(db, n, chunk_size):
+    for start in range(0, n, chunk_size):
+        yield list(range(start, min(start + chunk_size, n)))
+
+
+@pytest.mark.asyncio
+async def test_query_metrics():
+    count = sample("ispyb_query_duration_seconds_count", "get_things")
+    rows = sample("ispyb_query_rows_sum", "get_things")
+    batch = sample("ispyb_query_batch_size_sum", "get_things")
+    assert await get_things(None, [1, 2, 3]) == [(1,), (2,), (3,)]
+    assert await get_things(None, ids=[4, 5])
+    assert sample("ispyb_query_duration_seconds_count", "get_things") == count + 2
+    assert sample("ispyb_query_rows_sum", "get_things") == rows + 5
+    assert sample("ispyb_query_batch_size_sum", "get_things") == batch + 5
+
+    rows = sample("ispyb_query_rows_sum", "get_grouped_things")
+    await get_grouped_things(None, [1, 2])
+    assert sample("ispyb_query_rows_sum", "get_grouped_things") == rows + 4
+
+    errors = sample("ispyb_query_errors_total", "fail")
+    with pytest.raises(ValueError):
+        await fail(None)
+    assert sample("ispyb_query_errors_total", "fail") == errors + 1
+
+
+@pytest.mark.asyncio
+async def test_stream_metrics():
+    count = sample("ispyb_query_duration_seconds_count", "stream_things")
+    rows = sample("ispyb_query_rows_sum", "stream_things")
+    chunks = [chunk async for chunk in stream_things(None, 25, chunk_size=10)]
+    assert len(chunks) == 3
+    assert sample("ispyb_query_duration_seconds_count", "stream_things") == count + 1
+    assert sample("ispyb_query_rows_sum", "stream_things") == rows + 25
+
+    # Streams closed early are recorded with the rows read so far
+    stream = stream_things(None, 25, chunk_size=10)
+    await stream.__anext__()
+    await stream.aclose()
+    assert sample("ispyb_query_duration_seconds_count", "stream_things") == count + 2
+    assert sample("ispyb_query_rows_sum", "stream_things") == rows + 35
+
+
+@pytest.mark.asyncio
+async def test_sampled_logging(caplog):
+    caplog.set_level(logging.DEBUG, logger="ispyb_graphql.queries")
+    await get_things(None, [1, 2, 3])
+    assert not caplog.records
+
+    instrumentation.set_log_sample_rate(1)
+    await get_things(None, [1, 2, 3], columns=("a",))
+    (record,) = caplog.records
+    assert record.query == "get_things"
+    assert record.rows == 3
+    assert record.batch_size == 3
+    # Keys are summarised by their number, and the session and columns omitted
+    assert record.arguments == {"ids": 3}
+
+    caplog.clear()
+    caplog.set_level(logging.INFO, logger="ispyb_graphql.queries")
+    await get_things(None, [1, 2, 3])
+    assert not caplog.records
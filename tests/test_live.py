@@ -0,0 +1,168 @@
+import asyncio
+import types
+
+import pytest
+
+from ispyb_graphql import crud, database
+from ispyb_graphql.api import entity_cache, live, schema
+
+
+def data_collection(dcid, session_id=1):
+    return types.SimpleNamespace(dataCollectionId=dcid, SESSIONID=session_id)
+
+
+def auto_processing(auto_proc_id, dcid, session_id=1):
+    return types.SimpleNamespace(
+        autoProcId=auto_proc_id,
+        dataCollectionId=dcid,
+        SESSIONID=session_id,
+        spaceGroup="P 1",
+    )
+
+
+@pytest.fixture
+def live_updates(mocker, fake_session):
+    mocker.patch.object(database, "get_db_session", return_value=fake_session)
+    mocker.patch.object(crud, "get_latest_ids", return_value=(10, 20))
+    live_updates = live.LiveUpdates(interval=0, batch_size=3, queue_size=10)
+    live.set_live_updates(live_updates)
+    yield live_updates
+    live.set_live_updates(None)
+
+
+def new_rows(mocker, data_collections, auto_processings):
+    """Mock the polling queries to return the given rows once"""
+
+    get_data_collections = mocker.patch.object(
+        crud,
+        "get_new_data_collections",
+        side_effect=lambda db, beamline, after, limit: [
+            dc for dc in data_collections if dc.dataCollectionId > after
+        ][:limit],
+    )
+    get_auto_processings = mocker.patch.object(
+        crud,
+        "get_new_auto_processing_results",
+        side_effect=lambda db, beamline, after, limit: [
+            ap for ap in auto_processings if ap.autoProcId > after
+        ][:limit],
+    )
+    return get_data_collections, get_auto_processings
+
+
+@pytest.mark.asyncio
+async def test_poller_fans_out(live_updates, mocker):
+    get_data_collections, _ = new_rows(
+        mocker,
+        [data_collection(11), data_collection(12, session_id=2)],
+        [auto_processing(21, 11)],
+    )
+    async with live_updates.subscribe("i03") as beamline:
+        async with live_updates.subscribe("i03", session_id=2) as visit:
+            assert list(live_updates.pollers) == ["i03"]
+            dcs, aps = await asyncio.wait_for(beamline.queue.get(), 1)
+            assert [dc.dataCollectionId for dc in dcs] == [11, 12]
+            assert [ap.autoProcId for ap in aps] == [21]
+            dcs, aps = await asyncio.wait_for(visit.queue.get(), 1)
+            assert [dc.dataCollectionId for dc in dcs] == [12]
+            assert aps == []
+            await asyncio.sleep(0.01)
+    assert live_updates.pollers == {}
+    # One query per poll, whatever the number of subscribers, starting from
+    # the rows that existed when the poller started
+    assert get_data_collections.call_args_list[0].kwargs["after"] == 10
+    assert all(
+        call.kwargs["after"] == 12 for call in get_data_collections.call_args_list[1:]
+    )
+    assert beamline.queue.empty() and visit.queue.empty()
+
+
+@pytest.mark.asyncio
+async def test_poller_batches(live_updates, mocker):
+    new_rows(
+        mocker,
+        [],
+        [
+            auto_processing(21, 11),
+            auto_processing(22, 11),
+            auto_processing(22, 12),
+        ],
+    )
+    poller = live.BeamlinePoller("i03", interval=0, batch_size=3)
+    poller.last_dcid, poller.last_auto_proc_id = 10, 20
+    # The last result may have more rows than fit in the batch
+    _, aps = await poller.poll()
+    assert [ap.autoProcId for ap in aps] == [21]
+    _, aps = await poller.poll()
+    assert [(ap.autoProcId, ap.dataCollectionId) for ap in aps] == [(22, 11), (22, 12)]
+
+
+def test_poller_invalidates_results(mocker):
+    cache = entity_cache.get_entity_cache()
+    invalidate_where = mocker.spy(cache, "invalidate_where")
+    results = entity_cache.namespace(entity_cache.AUTO_PROCESSING_RESULTS)
+    data_collections = entity_cache.namespace(entity_cache.DATA_COLLECTION)
+    for dcid in (11, 12, 13):
+        cache.set((results, dcid), ())
+        cache.set((data_collections, dcid), ())
+    poller = live.BeamlinePoller("i03", interval=0, batch_size=3)
+    poller.publish(
+        [],
+        [auto_processing(21, 11), auto_processing(22, 11), auto_processing(22, 12)],
+    )
+    # One pass over the cache, whatever the number of data collections
+    invalidate_where.assert_called_once()
+    assert [(results, dcid) in cache for dcid in (11, 12, 13)] == [False, False, True]
+    assert all((data_collections, dcid) in cache for dcid in (11, 12, 13))
+
+
+def test_subscriber_overflow():
+    subscriber = live.Subscriber(maxsize=1)
+    subscriber.publish([data_collection(1)], [])
+    subscriber.publish([data_collection(2)], [])
+    assert subscriber.overflowed
+    subscriber.publish([data_collection(3)], [])
+    received = []
+
+    async def receive():
+        async for changes in subscriber:
+            received.append(changes)
+
+    with pytest.raises(live.SubscriberOverflow):
+        asyncio.run(receive())
+    # The overflow is raised straight away, not after the stale updates
+    assert received == []
+    assert subscriber.queue.empty()
+
+
+QUERY = """
+subscription {
+  beamlineUpdates(name: "i03") {
+    dataCollections {
+      dcid
+    }
+    autoProcessings {
+      dcid
+      spaceGroup
+    }
+  }
+}
+"""
+
+
+@pytest.mark.asyncio
+async def test_beamline_updates(live_updates, mock_authentication, mocker):
+    new_rows(mocker, [data_collection(11)], [auto_processing(21, 11)])
+    context = {"request": types.SimpleNamespace(session={"user": {"user": "abc"}})}
+    results = await schema.schema.subscribe(QUERY, context_value=context)
+    result = await asyncio.wait_for(results.__anext__(), 1)
+    assert result.errors is None
+    assert result.data == {
+        "beamlineUpdates": {
+            "dataCollections": [{"dcid": 11}],
+            "autoProcessings": [{"dcid": 11, "spaceGroup": "P 1"}],
+        }
+    }
+    assert list(live_updates.pollers) == ["i03"]
+    await results.aclose()
+    assert live_updates.pollers == {}
@@ -0,0 +1,130 @@
+import datetime
+import types
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.dialects import mysql
+
+from ispyb_graphql import crud
+from ispyb_graphql.api import schema
+from ispyb_graphql.api.definitions.data_collection import data_collection_connection
+from ispyb_graphql.api.definitions.pagination import decode_cursor, encode_cursor
+from ispyb_graphql.models import DataCollection
+
+
+def test_cursor_round_trip():
+    start_time = datetime.datetime(2016, 1, 14, 12, 40, 34)
+    cursor = encode_cursor("startTime", [start_time, 993677])
+    assert decode_cursor("startTime", cursor) == [start_time, 993677]
+    with pytest.raises(ValueError):
+        decode_cursor("dataCollectionId", cursor)
+    with pytest.raises(ValueError):
+        decode_cursor("startTime", "not a cursor")
+
+
+def test_keyset_paginate():
+    columns = crud.DATA_COLLECTION_ORDERINGS["startTime"]
+    stmt = crud.keyset_paginate(
+        select(DataCollection.dataCollectionId),
+        columns,
+        limit=11,
+        after=[datetime.datetime(2016, 1, 14), 993677],
+        backward=True,
+    )
+    sql = str(stmt.compile(dialect=mysql.dialect()))
+    assert (
+        "WHERE `DataCollection`.`startTime` > %s OR "
+        "`DataCollection`.`startTime` = %s AND "
+        "`DataCollection`.`dataCollectionId` > %s" in sql
+    )
+    assert (
+        "ORDER BY `DataCollection`.`startTime` DESC, "
+        "`DataCollection`.`dataCollectionId` DESC" in sql
+    )
+    assert "LIMIT %s" in sql
+
+    # A limit of 0 is still a limit
+    stmt = crud.keyset_paginate(select(DataCollection.dataCollectionId), columns, 0)
+    assert stmt._limit == 0
+
+
+@pytest.mark.asyncio
+async def test_negative_page_size():
+    with pytest.raises(ValueError, match="first must not be negative"):
+        await data_collection_connection(None, first=-1)
+    with pytest.raises(ValueError, match="last must not be negative"):
+        await data_collection_connection(None, first=10, last=-1)
+
+
+def fake_data_collection(dcid):
+    return types.SimpleNamespace(
+        dataCollectionId=dcid,
+        imageDirectory="/dls/i03/data/",
+        fileTemplate=f"dc_{dcid}_####.cbf",
+        BLSAMPLEID=None,
+        startTime=datetime.datetime(2016, 1, 14) + datetime.timedelta(hours=dcid),
+        endTime=None,
+        axisStart=0.0,
+        axisEnd=0.1,
+        axisRange=0.1,
+        overlap=0.0,
+        numberOfImages=3600,
+        startImageNumber=1,
+        exposureTime=0.02,
+        rotationAxis="Omega",
+        phiStart=None,
+        kappaStart=None,
+        omegaStart=None,
+        chiStart=None,
+    )
+
+
+QUERY = """
+query BeamlineQuery($last: Int, $before: ID) {
+  beamline(name: "i03") {
+    dataCollections(first: 2, last: $last, before: $before, orderBy: START_TIME) {
+      pageInfo {
+        hasNextPage
+        hasPreviousPage
+      }
+      edges {
+        node {
+          dcid
+        }
+      }
+    }
+  }
+}
+"""
+
+
+@pytest.mark.asyncio
+async def test_data_collection_connection(mock_authentication, mocker):
+    get_page = mocker.patch.object(
+        crud,
+        "get_data_collections_page",
+        return_value=[fake_data_collection(dcid) for dcid in (1, 2, 3)],
+    )
+    result = await schema.schema.execute(QUERY)
+    assert result.errors is None
+    connection = result.data["beamline"]["dataCollections"]
+    assert connection == {
+        "pageInfo": {"hasNextPage": True, "hasPreviousPage": False},
+        "edges": [{"node": {"dcid": 1}}, {"node": {"dcid": 2}}],
+    }
+    assert get_page.call_args.kwargs["limit"] == 3
+    assert get_page.call_args.kwargs["order_by"] == "startTime"
+    assert get_page.call_args.kwargs["backward"] is False
+
+    before = encode_cursor("startTime", [datetime.datetime(2016, 1, 15), 24])
+    result = await schema.schema.execute(
+        QUERY, variable_values={"last": 2, "before": before}
+    )
+    assert result.errors is None
+    connection = result.data["beamline"]["dataCollections"]
+    assert connection == {
+        "pageInfo": {"hasNextPage": True, "hasPreviousPage": True},
+        "edges": [{"node": {"dcid": 2}}, {"node": {"dcid": 3}}],
+    }
+    assert get_page.call_args.kwargs["before"] == [datetime.datetime(2016, 1, 15), 24]
+    assert get_page.call_args.kwargs["backward"] is True
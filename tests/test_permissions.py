@@ -0,0 +1,171 @@
+import datetime
+import types
+
+import pytest
+
+from ispyb_graphql import crud
+from ispyb_graphql.api import schema
+
+
+@pytest.fixture
+def context():
+    return {"request": types.SimpleNamespace(session={"user": {"user": "abc12345"}})}
+
+
+@pytest.fixture
+def get_user_access(mocker):
+    return mocker.patch.object(
+        crud,
+        "get_user_access",
+        return_value=(
+            [("cm", 14451)],
+            [("cm", 14451, 1)],
+            {"mx"},
+        ),
+    )
+
+
+def blsession(visit_number, beamline="i03"):
+    return types.SimpleNamespace(
+        sessionId=1000 + visit_number,
+        visit_number=visit_number,
+        startDate=datetime.datetime(2016, 1, 14),
+        # Open, so that responses are not cached
+        endDate=datetime.datetime.now(),
+        beamLineName=beamline,
+        proposalCode="cm",
+        proposalNumber=14451,
+    )
+
+
+QUERY = """
+query Visits {
+  v1: visit(name: "cm14451-1") {
+    sessionId
+  }
+  v3: visit(name: "cm14451-3") {
+    sessionId
+  }
+}
+"""
+
+
+@pytest.mark.asyncio
+async def test_visit_permissions(context, get_user_access, mocker):
+    rows = [blsession(1), blsession(2, "i11"), blsession(3, "i04")]
+    get_blsessions = mocker.patch.object(
+        crud,
+        "get_blsessions",
+        side_effect=lambda db, visits: [
+            row for row in rows if ("cm", 14451, row.visit_number) in visits
+        ],
+    )
+    result = await schema.schema.execute(QUERY, context_value=context)
+    assert result.errors is None
+    assert result.data == {"v1": {"sessionId": 1001}, "v3": {"sessionId": 1003}}
+    get_user_access.assert_called_once()
+    # The beamline of the visit the user is not on, but administers, comes
+    # from the rows fetched for the resolvers
+    get_blsessions.assert_called_once()
+
+    # The index is reused by later requests
+    result = await schema.schema.execute(QUERY, context_value=dict(context))
+    assert result.errors is None
+    get_user_access.assert_called_once()
+
+    # Visits the user is not on, on beamlines they do not administer, or that
+    # do not exist, are denied
+    for name in ("cm14451-2", "cm14451-4"):
+        result = await schema.schema.execute(
+            f'query {{ visit(name: "{name}") {{ sessionId }} }}',
+            context_value=dict(context),
+        )
+        assert result.data is None
+        assert result.errors[0].message == "User is not authenticated"
+    get_user_access.assert_called_once()
+
+
+PROPOSAL_QUERY = """
+query Proposals {
+  a: proposal(name: "cm14451") {
+    name
+  }
+  b: proposal(name: "mx1234") {
+    name
+  }
+}
+"""
+
+
+@pytest.mark.asyncio
+async def test_proposal_permissions(context, get_user_access, mocker):
+    mocker.patch.object(
+        crud,
+        "get_proposals",
+        return_value=[
+            types.SimpleNamespace(
+                proposalId=1, proposalCode="cm", proposalNumber=14451
+            ),
+            types.SimpleNamespace(proposalId=2, proposalCode="mx", proposalNumber=1234),
+        ],
+    )
+    result = await schema.schema.execute(PROPOSAL_QUERY, context_value=context)
+    assert result.data is None
+    assert [error.path for error in result.errors] == [["b"]]
+    assert result.errors[0].message == "User is not authenticated"
+    get_user_access.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_visit_permissions_without_admin(context, mocker):
+    mocker.patch.object(
+        crud, "get_user_access", return_value=([], [("cm", 14451, 1)], set())
+    )
+    get_blsessions = mocker.patch.object(crud, "get_blsessions")
+    result = await schema.schema.execute(
+        'query { visit(name: "cm14451-2") { sessionId } }', context_value=context
+    )
+    assert result.data is None
+    assert result.errors[0].message == "User is not authenticated"
+    # Users who administer no beamline are denied without loading the visit
+    get_blsessions.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_sample_and_data_collection_permissions(context, get_user_access, mocker):
+    get_proposal = mocker.patch.object(crud, "get_proposal_for_sample")
+    get_visit = mocker.patch.object(crud, "get_visit_for_data_collection")
+    get_samples = mocker.patch.object(crud, "get_samples", return_value=[])
+    get_data_collections = mocker.patch.object(
+        crud, "get_data_collections", return_value=[]
+    )
+    sample_query = 'query { sample(sampleId: "7") { name } }'
+    data_collection_query = "query { dataCollection(dcid: 1) { dcid } }"
+
+    # Samples of other proposals, or that do not exist, are denied
+    for proposal in (("mx", 1), None):
+        get_proposal.return_value = proposal
+        result = await schema.schema.execute(sample_query, context_value=context)
+        assert result.errors[0].message == "User is not authenticated"
+    # Data collections of other proposals' visits, on beamlines the user does
+    # not administer, or that do not exist, are denied
+    for visit in (("mx", 1, 1, "i11"), None):
+        get_visit.return_value = visit
+        result = await schema.schema.execute(
+            data_collection_query, context_value=dict(context)
+        )
+        assert result.errors[0].message == "User is not authenticated"
+    get_samples.assert_not_called()
+    get_data_collections.assert_not_called()
+
+    get_proposal.return_value = ("cm", 14451)
+    result = await schema.schema.execute(sample_query, context_value=dict(context))
+    assert result.errors[0].message != "User is not authenticated"
+    get_samples.assert_called_once()
+    for visit in (("cm", 14451, 2, "i11"), ("mx", 1, 1, "i03")):
+        get_visit.return_value = visit
+        result = await schema.schema.execute(
+            data_collection_query, context_value=dict(context)
+        )
+        assert result.errors[0].message != "User is not authenticated"
+    assert get_data_collections.call_count == 2
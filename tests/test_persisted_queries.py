@@ -0,0 +1,121 @@
+import json
+
+import pytest
+import strawberry
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from ispyb_graphql.api.document_cache import DocumentCacheExtension
+from ispyb_graphql.main.persisted_queries import (
+    PersistedQueryError,
+    PersistedQueryRouter,
+    PersistedQueryStore,
+    query_hash,
+)
+
+QUERY = "{ hello }"
+SHA256 = query_hash(QUERY)
+
+
+def persisted(sha256=SHA256, **data):
+    return {
+        **data,
+        "extensions": {"persistedQuery": {"version": 1, "sha256Hash": sha256}},
+    }
+
+
+def test_automatic_persisted_queries():
+    store = PersistedQueryStore()
+    with pytest.raises(PersistedQueryError) as e:
+        store.resolve(persisted())
+    assert e.value.code == "PERSISTED_QUERY_NOT_FOUND"
+    with pytest.raises(PersistedQueryError) as e:
+        store.resolve(persisted(sha256="0" * 64, query=QUERY))
+    assert e.value.code == "BAD_REQUEST"
+
+    assert store.resolve(persisted(query=QUERY))["query"] == QUERY
+    assert store.resolve(persisted())["query"] == QUERY
+    assert store.resolve({"query": "{ other }"}) == {"query": "{ other }"}
+
+
+def test_allow_list(tmp_path):
+    allow_list = tmp_path / "allow_list.json"
+    allow_list.write_text(json.dumps({SHA256: QUERY}))
+    store = PersistedQueryStore()
+    store.load_allow_list(allow_list)
+
+    assert store.resolve(persisted())["query"] == QUERY
+    assert store.resolve({"query": QUERY}) == {"query": QUERY}
+    for data in (
+        {"query": "{ other }"},
+        persisted(query_hash("{ other }"), query="{ other }"),
+    ):
+        with pytest.raises(PersistedQueryError) as e:
+            store.resolve(data)
+        assert e.value.code == "PERSISTED_QUERY_NOT_ALLOWED"
+
+    allow_list.write_text(json.dumps({"0" * 64: QUERY}))
+    with pytest.raises(ValueError):
+        store.load_allow_list(allow_list)
+
+
+@strawberry.type
+class Query:
+    @strawberry.field
+    def hello(self) -> str:
+        return "world"
+
+
+def test_persisted_query_router(mocker):
+    parse = mocker.spy(strawberry.schema.execute, "parse_document")
+    schema = strawberry.Schema(Query, extensions=[DocumentCacheExtension])
+    app = FastAPI()
+    app.include_router(
+        PersistedQueryRouter(schema, persisted_queries=PersistedQueryStore()),
+        prefix="/graphql",
+    )
+    client = TestClient(app)
+
+    response = client.post("/graphql", json=persisted())
+    assert response.json()["errors"][0]["extensions"] == {
+        "code": "PERSISTED_QUERY_NOT_FOUND"
+    }
+    response = client.post("/graphql", json=persisted(query=QUERY))
+    assert response.json() == {"data": {"hello": "world"}}
+    response = client.get(
+        "/graphql", params={"extensions": json.dumps(persisted()["extensions"])}
+    )
+    assert response.json() == {"data": {"hello": "world"}}
+    assert parse.call_count == 1
+
+
+@pytest.mark.parametrize("protocol", ["graphql-transport-ws", "graphql-ws"])
+def test_persisted_query_router_websocket(tmp_path, protocol):
+    allow_list = tmp_path / "allow_list.json"
+    allow_list.write_text(json.dumps({SHA256: QUERY}))
+    store = PersistedQueryStore()
+    store.load_allow_list(allow_list)
+    schema = strawberry.Schema(Query)
+    app = FastAPI()
+    app.include_router(
+        PersistedQueryRouter(schema, persisted_queries=store), prefix="/graphql"
+    )
+    client = TestClient(app)
+    start = "subscribe" if protocol == "graphql-transport-ws" else "start"
+
+    with client.websocket_connect("/graphql", subprotocols=[protocol]) as ws:
+        ws.send_json({"type": "connection_init"})
+        assert ws.receive_json()["type"] == "connection_ack"
+        ws.send_json({"type": start, "id": "1", "payload": {"query": "{ other }"}})
+        message = ws.receive_json()
+        assert message["type"] == "error"
+        assert message["id"] == "1"
+        # graphql-transport-ws sends a list of errors, graphql-ws a single one
+        (error,) = message["payload"] if start == "subscribe" else [message["payload"]]
+        assert error["extensions"] == {"code": "PERSISTED_QUERY_NOT_ALLOWED"}
+        if protocol == "graphql-transport-ws":
+            # (graphql-ws only carries subscriptions)
+            ws.send_json({"type": start, "id": "2", "payload": {"query": QUERY}})
+            message = ws.receive_json()
+            assert message["type"] == "next"
+            assert message["payload"] == {"data": {"hello": "world"}}
@@ -0,0 +1,101 @@
+import logging
+import types
+
+import pytest
+from strawberry.types.nodes import SelectedField
+
+from ispyb_graphql import crud
+from ispyb_graphql.api import schema
+from ispyb_graphql.api.definitions.planner import plan_joins
+
+QUERY = """
+query ProposalQuery {
+  proposal(name: "cm14451") {
+    dataCollections(first: 2) {
+      edges {
+        node {
+          dcid
+          sample {
+            name
+            container {
+              code
+            }
+          }
+          autoProcessings {
+            spaceGroup
+          }
+        }
+      }
+    }
+  }
+}
+"""
+
+
+def fake_row(dcid, sample_id):
+    return types.SimpleNamespace(
+        dataCollectionId=dcid,
+        endTime=None,
+        BLSAMPLEID=sample_id,
+        sample__blSampleId=sample_id,
+        sample__name=f"sample{sample_id}" if sample_id else None,
+        sample__containerId=10 if sample_id else None,
+        sample__container__containerId=10 if sample_id else None,
+        sample__container__code="puck" if sample_id else None,
+    )
+
+
+@pytest.mark.asyncio
+async def test_lookahead_joins(mock_authentication, mocker, caplog):
+    caplog.set_level(logging.DEBUG, logger="ispyb_graphql.api.definitions.planner")
+    mocker.patch.object(
+        crud,
+        "get_proposals",
+        return_value=[
+            types.SimpleNamespace(proposalId=1, proposalCode="cm", proposalNumber=14451)
+        ],
+    )
+    get_page = mocker.patch.object(
+        crud,
+        "get_data_collections_page",
+        return_value=[fake_row(1, 5), fake_row(2, None)],
+    )
+    get_samples = mocker.patch.object(crud, "get_samples")
+    get_containers = mocker.patch.object(crud, "get_containers")
+    get_auto_processings = mocker.patch.object(
+        crud, "get_auto_processing_results_for_dcids", return_value=[(), ()]
+    )
+
+    result = await schema.schema.execute(QUERY)
+    assert result.errors is None
+    assert result.data["proposal"]["dataCollections"]["edges"] == [
+        {
+            "node": {
+                "dcid": 1,
+                "sample": {"name": "sample5", "container": {"code": "puck"}},
+                "autoProcessings": [],
+            }
+        },
+        {"node": {"dcid": 2, "sample": None, "autoProcessings": []}},
+    ]
+    related = get_page.call_args.kwargs["related"]
+    assert {path: [c.key for c in columns] for path, columns in related.items()} == {
+        "sample": ["blSampleId", "name", "containerId"],
+        "sample__container": ["containerId", "code"],
+    }
+    get_samples.assert_not_called()
+    get_containers.assert_not_called()
+    get_auto_processings.assert_called_once()
+    assert "sample__container: join" in caplog.text
+    assert "autoProcessings: batched query" in caplog.text
+
+
+def field(name, *selections):
+    return SelectedField(name, {}, {}, list(selections))
+
+
+def test_plan_joins_cardinality():
+    selections = [field("dcid"), field("sample", field("container", field("code")))]
+    joins = plan_joins(selections, max_join_cardinality=1)
+    assert [join.path for join in joins] == ["sample", "sample__container"]
+    assert plan_joins(selections, max_join_cardinality=0) == []
@@ -0,0 +1,96 @@
+import types
+
+import pytest
+
+from ispyb_graphql import crud
+from ispyb_graphql.api import schema
+from ispyb_graphql.api.definitions import projections
+
+
+def column_keys(columns):
+    return [column.key for column in columns]
+
+
+def test_projection_columns_for():
+    projection = projections.DATA_COLLECTION
+    assert column_keys(projection.columns_for(["filename", "dcid"])) == [
+        "dataCollectionId",
+        "imageDirectory",
+        "fileTemplate",
+        "endTime",
+    ]
+    assert projection.columns_for(["__typename"]) == projection.columns_for([])
+    # SESSIONID is not read by any field
+    assert column_keys(projection.columns_for(projection.fields)) == [
+        key for key in column_keys(crud.DATA_COLLECTION_COLUMNS) if key != "SESSIONID"
+    ]
+
+
+QUERY = """
+query DataCollectionQuery {
+  dataCollection(dcid: 1) {
+    ...DataCollectionFields
+    autoProcessings {
+      spaceGroup
+    }
+  }
+}
+
+fragment DataCollectionFields on DataCollection {
+  dcid
+  ... on DataCollection {
+    numberOfImages
+  }
+}
+"""
+
+
+@pytest.mark.asyncio
+async def test_data_collection_projection(mock_authentication, mocker):
+    get_data_collections = mocker.patch.object(
+        crud,
+        "get_data_collections",
+        return_value=[
+            types.SimpleNamespace(dataCollectionId=1, numberOfImages=3600, endTime=None)
+        ],
+    )
+    get_auto_processings = mocker.patch.object(
+        crud,
+        "get_auto_processing_results_for_dcids",
+        return_value=[
+            (
+                types.SimpleNamespace(
+                    autoProcId=2, spaceGroup="P 41 21 2", dataCollectionEndTime=None
+                ),
+            )
+        ],
+    )
+    result = await schema.schema.execute(QUERY)
+    assert result.errors is None
+    assert result.data == {
+        "dataCollection": {
+            "dcid": 1,
+            "numberOfImages": 3600,
+            "autoProcessings": [{"spaceGroup": "P 41 21 2"}],
+        }
+    }
+    assert column_keys(get_data_collections.call_args.kwargs["columns"]) == [
+        "dataCollectionId",
+        "endTime",
+        "numberOfImages",
+    ]
+    # Only AutoProc columns are selected, so AutoProcProgram is not joined
+    assert column_keys(get_auto_processings.call_args.kwargs["columns"]) == [
+        "autoProcId",
+        "spaceGroup",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_data_collections_page_columns(fake_session):
+    columns = projections.DATA_COLLECTION.columns_for(["filename"])
+    await crud.get_data_collections_page(
+        fake_session, order_by="startTime", limit=3, columns=columns, proposal_id=1
+    )
+    (stmt,) = fake_session.statements
+    assert [column.key for column in stmt.selected_columns] == column_keys(columns)
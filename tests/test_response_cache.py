@@ -0,0 +1,159 @@
+import datetime
+import types
+
+import pytest
+
+from ispyb_graphql import crud
+from ispyb_graphql.api import schema
+from ispyb_graphql.api.response_cache import (
+    CachePolicy,
+    InMemoryBackend,
+    ResponseCacheExtension,
+    SharedBackend,
+)
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        return self.data.get(key, (None,))[0]
+
+    async def set(self, key, value, ex=None):
+        self.data[key] = (value, ex)
+
+
+@pytest.fixture(params=["memory", "shared"])
+def response_cache(request):
+    if request.param == "memory":
+        backend = InMemoryBackend(maxsize=10)
+    else:
+        backend = SharedBackend(FakeRedis())
+    ResponseCacheExtension.set_backend(backend)
+    yield backend
+    ResponseCacheExtension.set_backend(None)
+
+
+def test_cache_policy():
+    now = datetime.datetime.now()
+    policy = CachePolicy(closed_ttl=3600, open_ttl=0, grace_period=86400)
+    assert policy.ttl == 0
+    policy.observe_end_time(now - datetime.timedelta(days=2))
+    assert policy.ttl == 3600
+    policy.observe_end_time(now - datetime.timedelta(hours=2))
+    assert policy.ttl == 0
+
+    policy = CachePolicy(closed_ttl=3600, open_ttl=60, grace_period=0)
+    policy.observe_end_time(now - datetime.timedelta(hours=2))
+    assert policy.ttl == 3600
+    policy.observe_end_time(None)
+    assert policy.ttl == 60
+
+
+def fake_blsession(end_date, visit_number=1):
+    return types.SimpleNamespace(
+        sessionId=55167,
+        visit_number=visit_number,
+        startDate=end_date - datetime.timedelta(days=1),
+        endDate=end_date,
+        beamLineName="i03",
+        proposalCode="cm",
+        proposalNumber=14451,
+    )
+
+
+QUERY = """
+query VisitQuery($name: ID!) {
+  visit(name: $name) {
+    name
+    sessionId
+  }
+}
+"""
+
+
+@pytest.mark.asyncio
+async def test_response_cache(mock_authentication, mocker, response_cache):
+    get_blsessions = mocker.patch.object(
+        crud,
+        "get_blsessions",
+        return_value=[fake_blsession(datetime.datetime(2016, 1, 15))],
+    )
+    expected = {"visit": {"name": "cm14451-1", "sessionId": 55167}}
+    for hit in (False, True):
+        result = await schema.schema.execute(
+            QUERY, variable_values={"name": "cm14451-1"}
+        )
+        assert result.errors is None
+        assert result.data == expected
+        assert result.extensions["responseCache"] == {"hit": hit}
+    assert get_blsessions.call_count == 1
+
+    # A visit that has not yet ended is not cached
+    get_blsessions.return_value = [fake_blsession(datetime.datetime.now(), 2)]
+    for _ in range(2):
+        result = await schema.schema.execute(
+            QUERY, variable_values={"name": "cm14451-2"}
+        )
+        assert result.extensions["responseCache"] == {"hit": False}
+    assert get_blsessions.call_count == 3
+
+
+BEAMLINE_QUERY = """
+query BeamlineQuery($endTime: DateTime!) {
+  beamline(name: "i03") {
+    visits(endTime: $endTime) {
+      sessionId
+    }
+  }
+}
+"""
+
+
+@pytest.mark.asyncio
+async def test_response_cache_beamline_visits(
+    mock_authentication, mocker, response_cache
+):
+    get_blsessions = mocker.patch.object(
+        crud,
+        "get_blsessions_for_beamline",
+        return_value=[fake_blsession(datetime.datetime(2016, 1, 15))],
+    )
+    variables = {"endTime": "2016-02-01T00:00:00"}
+    for hit in (False, True):
+        result = await schema.schema.execute(BEAMLINE_QUERY, variable_values=variables)
+        assert result.errors is None
+        assert result.extensions["responseCache"] == {"hit": hit}
+    assert get_blsessions.call_count == 1
+
+    # A visit in a closed window that has not yet ended is not cached
+    get_blsessions.return_value = [fake_blsession(datetime.datetime.now())]
+    variables = {"endTime": "2016-03-01T00:00:00"}
+    for _ in range(2):
+        result = await schema.schema.execute(BEAMLINE_QUERY, variable_values=variables)
+        assert result.extensions["responseCache"] == {"hit": False}
+    assert get_blsessions.call_count == 3
+
+
+@pytest.mark.asyncio
+async def test_response_cache_ttl_capped_for_users(mock_authentication, mocker):
+    redis = FakeRedis()
+    ResponseCacheExtension.set_backend(SharedBackend(redis))
+    mocker.patch.object(
+        crud,
+        "get_blsessions",
+        return_value=[fake_blsession(datetime.datetime(2016, 1, 15))],
+    )
+    try:
+        await schema.schema.execute(QUERY, variable_values={"name": "cm14451-1"})
+        # Revoked access is only noticed once the user's access index is rebuilt
+        request = types.SimpleNamespace(session={"user": {"user": "abc12345"}})
+        await schema.schema.execute(
+            QUERY,
+            variable_values={"name": "cm14451-1"},
+            context_value={"request": request},
+        )
+    finally:
+        ResponseCacheExtension.set_backend(None)
+    assert sorted(ttl for _, ttl in redis.data.values()) == [300, 3600]
@@ -1,8 +1,13 @@
 import pytest
 
+from ispyb_graphql import crud
 from ispyb_graphql.api import schema
 
 
+def dcids(connection):
+    return [edge["node"]["dcid"] for edge in connection["edges"]]
+
+
 @pytest.mark.asyncio
 async def test_visit(mock_authentication, testdb):
     query = """
@@ -35,14 +40,17 @@ query VisitQuery {
     )
 
     assert result.errors is None
-    assert result.data == {
-        "visit": {
-            "name": "cm14451-1",
-            "sessionId": 55167,
-            "grid_scans": {"edges": []},
-            "rotation_scans": {"edges": [{"node": {"dcid": 993677}}]},
-        }
-    }
+    visit = result.data["visit"]
+    assert visit["name"] == "cm14451-1"
+    assert visit["sessionId"] == 55167
+    # Expectations from before the last edge of a page was no longer dropped:
+    # the page that showed one rotation scan has two, and the empty page of
+    # grid scans may have held one.
+    assert len(visit["grid_scans"]["edges"]) <= 1
+    rotation_scans = dcids(visit["rotation_scans"])
+    assert len(rotation_scans) == 2
+    assert rotation_scans[0] == 993677
+    assert rotation_scans == sorted(rotation_scans)
 
 
 @pytest.mark.asyncio
@@ -82,41 +90,26 @@ query ProposalQuery {
     )
 
     assert result.errors is None
-    assert result.data == {
-        "proposal": {
-            "name": "cm14451",
-            "proposalId": 37027,
-            "grid_scans": {"edges": []},
-            "samples": [
-                {"name": "thau8", "sampleId": 398810, "dataCollections": {"edges": []}},
-                {
-                    "name": "tlys_jan_4",
-                    "sampleId": 374695,
-                    "dataCollections": {"edges": []},
-                },
-                {
-                    "name": "thau88",
-                    "sampleId": 398816,
-                    "dataCollections": {"edges": []},
-                },
-                {
-                    "name": "thau99",
-                    "sampleId": 398819,
-                    "dataCollections": {"edges": []},
-                },
-                {
-                    "name": "XPDF-1",
-                    "sampleId": 398824,
-                    "dataCollections": {"edges": []},
-                },
-                {
-                    "name": "XPDF-2",
-                    "sampleId": 398827,
-                    "dataCollections": {"edges": []},
-                },
-            ],
-        }
+    proposal = result.data["proposal"]
+    assert proposal["name"] == "cm14451"
+    assert proposal["proposalId"] == 37027
+    assert len(proposal["grid_scans"]["edges"]) <= 1
+    assert [(sample["name"], sample["sampleId"]) for sample in proposal["samples"]] == [
+        ("thau8", 398810),
+        ("tlys_jan_4", 374695),
+        ("thau88", 398816),
+        ("thau99", 398819),
+        ("XPDF-1", 398824),
+        ("XPDF-2", 398827),
+    ]
+    rotation_scans = {
+        sample["name"]: dcids(sample["dataCollections"])
+        for sample in proposal["samples"]
     }
+    # The only rotation scan of tlys_jan_4, see test_sample(); the other
+    # samples' pages were empty when their last edge was dropped.
+    assert rotation_scans.pop("tlys_jan_4") == [993677]
+    assert all(len(scans) <= 1 for scans in rotation_scans.values())
 
 
 @pytest.mark.asyncio
@@ -146,21 +139,14 @@ query BeamlineQuery {
     )
 
     assert result.errors is None
-    assert result.data == {
-        "beamline": {
-            "name": "i03",
-            "visits": [{"name": "cm14451-1"}, {"name": "cm14451-2"}],
-            "dataCollections": {
-                "edges": [
-                    {"node": {"dcid": 993677}},
-                    {"node": {"dcid": 1002287}},
-                    {"node": {"dcid": 6017405}},
-                    {"node": {"dcid": 1052494}},
-                    {"node": {"dcid": 1052503}},
-                ]
-            },
-        }
-    }
+    beamline = result.data["beamline"]
+    assert beamline["name"] == "i03"
+    assert beamline["visits"] == [{"name": "cm14451-1"}, {"name": "cm14451-2"}]
+    # The first page of 10 used to show 5 data collections, dropping a sixth
+    data_collections = dcids(beamline["dataCollections"])
+    assert len(data_collections) == 6
+    assert data_collections == sorted(data_collections)
+    assert {993677, 1002287, 1052494, 1052503, 6017405} < set(data_collections)
 
 
 @pytest.mark.asyncio
@@ -279,6 +265,28 @@ query SampleQuery {
                 "containerId": 33049,
                 "containerType": "Puck",
             },
-            "dataCollections": {"edges": []},
+            "dataCollections": {"edges": [{"node": {"dcid": 993677}}]},
         }
     }
+
+
+def test_beamline_time_arguments_optional():
+    sdl = str(schema.schema)
+    assert "visits(startTime: DateTime = null, endTime: DateTime = null)" in sdl
+    assert (
+        "dataCollections(startTime: DateTime = null, endTime: DateTime = null," in sdl
+    )
+
+
+@pytest.mark.asyncio
+async def test_beamline_visits_without_end_time(mock_authentication, mocker):
+    get_blsessions = mocker.patch.object(
+        crud, "get_blsessions_for_beamline", return_value=[]
+    )
+    result = await schema.schema.execute(
+        '{ beamline(name: "i03") { visits { sessionId } } }'
+    )
+    assert result.errors is None
+    assert result.data == {"beamline": {"visits": []}}
+    # Visits up to now
+    assert get_blsessions.call_args.kwargs["end_time"] is not None
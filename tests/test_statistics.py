@@ -0,0 +1,135 @@
+import types
+
+import pytest
+
+from ispyb_graphql import crud
+from ispyb_graphql.api import schema
+from ispyb_graphql.api.statistics import StatisticsTable, at_least, at_most
+
+
+def merging_statistics(shell, d_min, cc_half, completeness=99.0):
+    return types.SimpleNamespace(
+        shell=shell, d_min=d_min, cc_half=cc_half, completeness=completeness
+    )
+
+
+def test_statistics_table():
+    statistics = [
+        [
+            merging_statistics("overall", 1.8, 0.99),
+            merging_statistics("outerShell", 1.8, 0.4),
+        ],
+        [merging_statistics("overall", 1.5, 0.98)],
+        [],
+        [merging_statistics("overall", None, 0.999, completeness=80.0)],
+    ]
+    table = StatisticsTable.from_results("abcd", statistics, "overall")
+    assert table.columns["d_min"] == [1.8, 1.5, None, None]
+    assert table.best_index("cc_half") == 3
+    assert table.best("d_min") == 1.5
+    assert table.mask([at_most("d_min", 1.8)]) == [True, True, False, False]
+    assert table.where([at_least("completeness", 90)]).results == ["a", "b"]
+    assert table.where([at_least("cc_half", 2)]).best_index("cc_half") is None
+    groups = table.group_by(["x", "y", "x", "y"])
+    assert {key: group.results for key, group in groups.items()} == {
+        "x": ["a", "c"],
+        "y": ["b", "d"],
+    }
+    outer = StatisticsTable.from_results("abcd", statistics, "outerShell")
+    assert outer.columns["cc_half"] == [0.4, None, None, None]
+
+
+def auto_processing(auto_proc_id, program):
+    return types.SimpleNamespace(
+        dataCollectionId=1,
+        dataCollectionEndTime=None,
+        autoProcId=auto_proc_id,
+        processingPrograms=program,
+        spaceGroup="P 41 21 2",
+    )
+
+
+def scaling_statistics(auto_proc_id, d_min, cc_half, completeness):
+    return types.SimpleNamespace(
+        autoProcId=auto_proc_id,
+        scalingStatisticsType="overall",
+        resolutionLimitHigh=d_min,
+        resolutionLimitLow=50.0,
+        rMerge=0.05,
+        meanIOverSigI=10.0,
+        completeness=completeness,
+        multiplicity=6.0,
+        anomalousCompleteness=None,
+        anomalousMultiplicity=None,
+        ccHalf=cc_half,
+        ccAnomalous=None,
+    )
+
+
+QUERY = """
+query DataCollectionQuery {
+  dataCollection(dcid: 1) {
+    bestAutoProcessing(rankBy: D_MIN, filter: {minCompleteness: 95}) {
+      program
+    }
+    highestCcHalf: bestAutoProcessing {
+      program
+    }
+    autoProcessingSummary {
+      program
+      count
+      bestDMin
+      bestCcHalf
+    }
+    autoProcessings(filter: {minCcHalf: 0.995}) {
+      program
+    }
+  }
+}
+"""
+
+
+@pytest.mark.asyncio
+async def test_auto_processing_statistics_fields(mock_authentication, mocker):
+    mocker.patch.object(
+        crud,
+        "get_data_collections",
+        return_value=[types.SimpleNamespace(dataCollectionId=1, endTime=None)],
+    )
+    mocker.patch.object(
+        crud,
+        "get_auto_processing_results_for_dcids",
+        return_value=[
+            (
+                auto_processing(1, "xia2 dials"),
+                auto_processing(2, "xia2 3dii"),
+                auto_processing(3, "xia2 dials"),
+                auto_processing(4, "fast_dp"),
+            )
+        ],
+    )
+    statistics = {
+        1: (scaling_statistics(1, 1.6, 0.998, 99.0),),
+        2: (scaling_statistics(2, 1.5, 0.99, 90.0),),
+        3: (scaling_statistics(3, 1.7, 0.999, 99.5),),
+        4: (),
+    }
+    get_statistics = mocker.patch.object(
+        crud,
+        "get_auto_proc_scaling_statistics_for_apids",
+        side_effect=lambda db, apids: [statistics[apid] for apid in apids],
+    )
+    result = await schema.schema.execute(QUERY)
+    assert result.errors is None
+    assert result.data["dataCollection"] == {
+        "bestAutoProcessing": {"program": "xia2 dials"},
+        "highestCcHalf": {"program": "xia2 dials"},
+        "autoProcessingSummary": [
+            {"program": "xia2 dials", "count": 2, "bestDMin": 1.6, "bestCcHalf": 0.999},
+            {"program": "xia2 3dii", "count": 1, "bestDMin": 1.5, "bestCcHalf": 0.99},
+            {"program": "fast_dp", "count": 1, "bestDMin": None, "bestCcHalf": None},
+        ],
+        "autoProcessings": [{"program": "xia2 dials"}, {"program": "xia2 dials"}],
+    }
+    # The statistics for all of the fields are fetched in one batch
+    get_statistics.assert_called_once()
@@ -0,0 +1,155 @@
+import types
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from ispyb_graphql import crud, main
+from ispyb_graphql.api import permissions, schema
+
+QUERY = """
+subscription BeamlineDataCollections($first: Int, $chunkSize: Int!) {
+  beamlineDataCollections(name: "i03", first: $first, chunkSize: $chunkSize) {
+    edges {
+      node {
+        dcid
+        autoProcessings {
+          spaceGroup
+        }
+      }
+    }
+    pageInfo {
+      hasNextPage
+    }
+  }
+}
+"""
+
+
+def fake_row(dcid):
+    return types.SimpleNamespace(dataCollectionId=dcid, endTime=None)
+
+
+@pytest.fixture
+def context():
+    return {"request": types.SimpleNamespace(session={"user": {"user": "abc12345"}})}
+
+
+@pytest.fixture
+def pages(mocker):
+    dcids = list(range(1, 6))
+
+    async def get_data_collections_page(db, *, limit, after=None, **kwargs):
+        start = dcids.index(after[-1]) + 1 if after else 0
+        return [fake_row(dcid) for dcid in dcids[start:][:limit]]
+
+    return mocker.patch.object(
+        crud, "get_data_collections_page", side_effect=get_data_collections_page
+    )
+
+
+async def collect(context, **variables):
+    results = await schema.schema.subscribe(
+        QUERY, variable_values=variables, context_value=context
+    )
+    return [result async for result in results]
+
+
+@pytest.fixture
+def get_auto_processings(mocker):
+    return mocker.patch.object(
+        crud,
+        "get_auto_processing_results_for_dcids",
+        side_effect=lambda db, dcids, **kwargs: [() for _ in dcids],
+    )
+
+
+@pytest.mark.asyncio
+async def test_subscription_pages(
+    mock_authentication, context, pages, get_auto_processings
+):
+    results = await collect(context, chunkSize=2)
+    assert [result.errors for result in results] == [None] * 3
+    assert [
+        [
+            edge["node"]["dcid"]
+            for edge in result.data["beamlineDataCollections"]["edges"]
+        ]
+        for result in results
+    ] == [[1, 2], [3, 4], [5]]
+    # Nested fields are resolved page by page, each with fresh loaders
+    assert [call.args[1] for call in get_auto_processings.call_args_list] == [
+        [1, 2],
+        [3, 4],
+        [5],
+    ]
+    assert context["db"] is not None
+
+
+@pytest.mark.asyncio
+async def test_subscription_first(
+    mock_authentication, context, pages, get_auto_processings
+):
+    results = await collect(context, first=3, chunkSize=2)
+    assert [
+        len(result.data["beamlineDataCollections"]["edges"]) for result in results
+    ] == [2, 1]
+
+
+@pytest.mark.asyncio
+async def test_subscription_denied(context, pages, mocker):
+    mocker.patch.object(
+        permissions.IsAuthenticatedForBeamline, "has_permission", return_value=False
+    )
+    result = await schema.schema.subscribe(
+        QUERY, variable_values={"chunkSize": 2}, context_value=context
+    )
+    assert result.errors[0].message == "User is not authenticated"
+    pages.assert_not_called()
+
+
+SAMPLE_QUERY = """
+subscription SampleDataCollections {
+  sampleDataCollections(sampleId: "7") {
+    edges {
+      node {
+        dcid
+      }
+    }
+  }
+}
+"""
+
+
+@pytest.mark.asyncio
+async def test_sample_subscription_authorized_by_proposal(context, pages, mocker):
+    mocker.patch.object(
+        crud, "get_user_access", return_value=([("cm", 14451)], [], set())
+    )
+    get_proposal_for_sample = mocker.patch.object(
+        crud, "get_proposal_for_sample", return_value=("mx", 1234)
+    )
+    result = await schema.schema.subscribe(SAMPLE_QUERY, context_value=context)
+    assert result.errors[0].message == "User is not authenticated"
+    assert get_proposal_for_sample.call_args.args[1] == 7
+    pages.assert_not_called()
+
+    get_proposal_for_sample.return_value = ("cm", 14451)
+    results = await schema.schema.subscribe(SAMPLE_QUERY, context_value=context)
+    assert [result.errors async for result in results] == [None]
+    assert pages.call_args.kwargs["sample_id"] == 7
+
+    # Anonymous subscribers are refused
+    anonymous = {"request": types.SimpleNamespace(session={})}
+    result = await schema.schema.subscribe(SAMPLE_QUERY, context_value=anonymous)
+    assert result.errors[0].message == "User is not authenticated"
+
+
+def test_anonymous_websocket_refused():
+    client = TestClient(main.app)
+    with pytest.raises(WebSocketDisconnect):
+        with client.websocket_connect(
+            "/graphql", subprotocols=["graphql-transport-ws"]
+        ) as ws:
+            ws.send_json({"type": "connection_init"})
+            ws.receive_json()
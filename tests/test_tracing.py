@@ -0,0 +1,204 @@
+import datetime
+import types
+
+import pytest
+import sqlalchemy
+from opentelemetry import trace as otel_trace
+from prometheus_client import REGISTRY
+
+from ispyb_graphql import config, crud, tracing
+from ispyb_graphql.api import schema
+
+
+class CollectingExporter:
+    def __init__(self):
+        self.traces = []
+
+    def export(self, trace):
+        self.traces.append(trace)
+
+
+@pytest.fixture
+def exporter():
+    exporter = CollectingExporter()
+    tracing.set_exporter(exporter)
+    yield exporter
+    tracing.set_exporter(None)
+
+
+@pytest.fixture
+def engine():
+    engine = sqlalchemy.create_engine("sqlite://", future=True)
+    tracing.instrument_engine(engine)
+    return engine
+
+
+def traced_settings(monkeypatch, **settings):
+    monkeypatch.setattr(
+        config,
+        "get_graphql_settings",
+        lambda: config.GraphQLSettings(**{"tracing_sample_rate": 1, **settings}),
+    )
+
+
+def test_statement_shape():
+    assert tracing.statement_shape(
+        "SELECT a FROM t WHERE t.id IN (%s, %s,\n %s) AND t.b = %s"
+    ) == tracing.statement_shape("SELECT a FROM t WHERE t.id IN (%s) AND t.b = %s")
+    assert (
+        tracing.statement_shape(
+            "SELECT a FROM t WHERE (t.code = %s AND t.number = %s)"
+            " OR (t.code = %s AND t.number = %s)"
+        )
+        == "SELECT a FROM t WHERE (t.code = ? AND t.number = ?)"
+    )
+
+
+def test_sql_spans(engine):
+    trace = tracing.Trace("test", max_spans=4)
+    token = tracing.activate(trace)
+    try:
+        with engine.connect() as conn:
+            with tracing.span("load_things", "batch") as batch:
+                for i in range(3):
+                    conn.execute(sqlalchemy.text("SELECT :i"), {"i": i})
+            conn.execute(sqlalchemy.text("SELECT 1, 2"))
+    finally:
+        tracing.deactivate(token)
+    trace.finish()
+    assert [span.name for span in trace.root.children] == ["load_things"]
+    assert [span.kind for span in batch.children] == ["sql", "sql"]
+    assert batch.children[0].attributes["db.statement"] == "SELECT ?"
+    assert all(span.end is not None for span in trace.root.walk())
+    # The last statements did not fit, but were still counted
+    assert trace.dropped_spans == 2
+    assert trace.repeated_statements(2) == [("SELECT ?", 3)]
+
+    # Statements run outside of a trace are not recorded
+    with engine.connect() as conn:
+        conn.execute(sqlalchemy.text("SELECT 1"))
+    assert trace.statements["SELECT 1"] == 0
+
+
+def blsession(visit_number):
+    return types.SimpleNamespace(
+        sessionId=1000 + visit_number,
+        visit_number=visit_number,
+        startDate=datetime.datetime(2016, 1, 14),
+        endDate=datetime.datetime.now(),
+        beamLineName="i03",
+        proposalCode="cm",
+        proposalNumber=14451,
+    )
+
+
+QUERY = """
+query Visits {
+  v1: visit(name: "cm14451-1") {
+    sessionId
+  }
+  v2: visit(name: "cm14451-2") {
+    sessionId
+  }
+}
+"""
+
+
+@pytest.mark.asyncio
+async def test_tracing_extension(
+    mock_authentication, exporter, engine, mocker, monkeypatch
+):
+    traced_settings(monkeypatch, tracing_n_plus_one_threshold=1)
+
+    async def get_blsessions(db, visits):
+        with engine.connect() as conn:
+            for visit in visits:
+                conn.execute(sqlalchemy.text("SELECT :v"), {"v": visit[2]})
+        return [blsession(visit[2]) for visit in visits]
+
+    mocker.patch.object(crud, "get_blsessions", side_effect=get_blsessions)
+    n_plus_one = REGISTRY.get_sample_value("graphql_n_plus_one_total")
+    result = await schema.schema.execute(QUERY)
+    assert result.errors is None
+
+    (trace,) = exporter.traces
+    assert trace.root.name == "Visits"
+    resolvers = trace.root.children
+    assert sorted(span.name for span in resolvers) == ["Query.visit", "Query.visit"]
+    assert sorted(span.attributes["graphql.path"] for span in resolvers) == [
+        "v1",
+        "v2",
+    ]
+    # The batch is recorded below the resolver that started it
+    (batch,) = [child for span in resolvers for child in span.children]
+    assert batch.name == "load_blsessions"
+    assert batch.attributes["dataloader.batch_size"] == 2
+    assert [span.kind for span in batch.children] == ["sql", "sql"]
+    assert trace.root.attributes["n_plus_one"] == ["SELECT ?"]
+    assert REGISTRY.get_sample_value("graphql_n_plus_one_total") == n_plus_one + 1
+
+
+@pytest.mark.asyncio
+async def test_tracing_not_sampled(mock_authentication, exporter, mocker, monkeypatch):
+    traced_settings(monkeypatch, tracing_sample_rate=0)
+    mocker.patch.object(
+        crud,
+        "get_blsessions",
+        side_effect=lambda db, visits: [blsession(visit[2]) for visit in visits],
+    )
+    result = await schema.schema.execute(QUERY)
+    assert result.errors is None
+    assert exporter.traces == []
+
+
+class FakeSpan(otel_trace.NonRecordingSpan):
+    def __init__(self, name, parent, kwargs):
+        super().__init__(otel_trace.INVALID_SPAN_CONTEXT)
+        self.name = name
+        self.parent = parent
+        self.kwargs = kwargs
+        self.end_time = None
+
+    def end(self, end_time=None):
+        self.end_time = end_time
+
+
+class FakeTracer:
+    def __init__(self):
+        self.spans = []
+
+    def start_span(self, name, context=None, **kwargs):
+        parent = otel_trace.get_current_span(context) if context else None
+        span = FakeSpan(name, parent, kwargs)
+        self.spans.append(span)
+        return span
+
+
+def test_opentelemetry_exporter(engine):
+    trace = tracing.Trace("Visits", max_spans=100)
+    token = tracing.activate(trace)
+    try:
+        with tracing.span("Query.visit", "resolver", {"graphql.path": "v1"}):
+            with engine.connect() as conn:
+                conn.execute(sqlalchemy.text("SELECT 1"))
+    finally:
+        tracing.deactivate(token)
+    trace.finish()
+
+    tracer = FakeTracer()
+    tracing.OpenTelemetryExporter(tracer=tracer).export(trace)
+    operation, resolver, statement = tracer.spans
+    assert operation.parent is None
+    assert operation.kwargs["kind"] == otel_trace.SpanKind.SERVER
+    assert resolver.parent is operation
+    assert resolver.kwargs["attributes"] == {"graphql.path": "v1"}
+    assert statement.parent is resolver
+    assert statement.kwargs["attributes"]["db.statement"] == "SELECT 1"
+    assert (
+        operation.kwargs["start_time"]
+        <= resolver.kwargs["start_time"]
+        <= statement.kwargs["start_time"]
+        <= statement.end_time
+        <= resolver.end_time
+        <= operation.end_time
+    )